@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+LLM输出清理微基准
+对比旧实现（多次正则 + 逐个前后缀比较）与 OutputNormalizer 的单次扫描：
+完整响应、界面状态文本，以及逐 token 流式输出时每次更新的开销
+"""
+
+import sys
+import os
+
+# Add project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import re
+import timeit
+
+from src.llm.normalize import OutputNormalizer, normalize_output, POLITE_PREFIXES, POLITE_SUFFIXES
+
+
+def legacy_clean_tags(text):
+    """旧版 clean_rephrase_tags（界面每次更新都会调用）"""
+    match = re.search(r'<REPHRASE[^>]*>(.*?)</REPHRASE>', text, flags=re.IGNORECASE | re.DOTALL)
+    if match:
+        return match.group(1).strip()
+    text = re.sub(r'</?REPHRASE>', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'</?REP[^>]*>', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'</?REPHRASE?[^>]*$', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'^</?REPHRASE?[^>]*', '', text, flags=re.IGNORECASE)
+    text = re.sub(r'</?REP[^>]*', '', text, flags=re.IGNORECASE)
+    return text.strip()
+
+
+def legacy_clean_output(text):
+    """旧版 PromptOptimizer._clean_output"""
+    for prefix in POLITE_PREFIXES:
+        if text.startswith(prefix):
+            text = text[len(prefix):].strip()
+    for suffix in POLITE_SUFFIXES:
+        if text.endswith(suffix):
+            text = text[:-len(suffix)].strip()
+    return text
+
+
+def legacy(text):
+    return legacy_clean_output(legacy_clean_tags(text))
+
+
+def make_response(sentences):
+    body = " ".join(f"Step {i}: refactor the parser module and add tests for edge case {i}." for i in range(sentences))
+    return f"以下是优化结果：\n<REPHRASE>\n{body}\n</REPHRASE>\n以上为优化结果。"
+
+
+def tokens(text, size=4):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def bench(label, legacy_fn, new_fn, number):
+    old = min(timeit.repeat(legacy_fn, number=number, repeat=5)) / number * 1e6
+    new = min(timeit.repeat(new_fn, number=number, repeat=5)) / number * 1e6
+    print(f"{label:<28} {old:>10.1f} {new:>10.1f} {old / new:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for LLM output normalization")
+    parser.add_argument("--sentences", type=int, nargs="+", default=[3, 30], help="Response sizes in sentences")
+    parser.add_argument("--number", type=int, default=200, help="Calls per timing run")
+    args = parser.parse_args()
+
+    status = "Transcribing audio... write a python function for bubble sort"
+    assert legacy(status) == normalize_output(status)
+    print(f"{'case':<28} {'legacy µs':>10} {'new µs':>10} {'speedup':>9}")
+    bench("status string", lambda: legacy(status), lambda: normalize_output(status), args.number * 10)
+
+    for sentences in args.sentences:
+        response = make_response(sentences)
+        assert legacy(response) == normalize_output(response)
+        bench(f"full response ({len(response)} chars)", lambda: legacy(response),
+              lambda: normalize_output(response), args.number)
+
+        chunks = tokens(response)
+
+        def legacy_stream():
+            # Before: every streamed token re-cleaned the whole accumulated text
+            text = ""
+            for chunk in chunks:
+                text += chunk
+                legacy(text)
+
+        def new_stream():
+            normalizer = OutputNormalizer()
+            for chunk in chunks:
+                normalizer.feed(chunk)
+            normalizer.finish()
+
+        bench(f"stream {len(chunks)} tokens", legacy_stream, new_stream, max(1, args.number // 20))
+
+
+if __name__ == "__main__":
+    main()
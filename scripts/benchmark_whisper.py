@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Whisper性能基准工具
+threads: 扫描 cpu_threads × num_workers 组合，测量吞吐量与延迟，用于验证自动检测的默认值
+parallel: 长录音按静音切分并行转录，与顺序分窗转录对比加速比
+"""
+
+import sys
+import os
+
+# Add project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import tempfile
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from faster_whisper import WhisperModel
+
+from src.audio import longform
+from src.audio.model_store import resolve_model
+from src.audio.cpu_tuning import core_budget, detect_cpu_topology, plan_threads, resolve_affinity, pinned_thread
+from src.audio.pcm import decode_wav, duration_seconds, WHISPER_SAMPLE_RATE
+from src.audio.whisper_transcriber import load_whisper_config
+
+
+def load_audio(path, seconds):
+    """读取测试音频；未指定时生成合成信号（只测编码器负载，结果仅供参考）"""
+    if path:
+        with open(path, "rb") as f:
+            return decode_wav(f.read())
+    print("未指定 --audio，使用合成音频（建议使用真实语音录音）")
+    t = np.arange(int(seconds * WHISPER_SAMPLE_RATE)) / WHISPER_SAMPLE_RATE
+    tone = 0.1 * np.sin(2 * np.pi * 220 * t) * (1 + np.sin(2 * np.pi * 3 * t))
+    return (tone + 0.01 * np.random.randn(len(t))).astype(np.float32)
+
+
+def default_thread_counts(physical):
+    counts = [1]
+    while counts[-1] * 2 <= physical:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != physical:
+        counts.append(physical)
+    return counts
+
+
+def run_combo(config, audio, cpu_threads, num_workers, rounds, affinity):
+    """加载模型并以 num_workers 个并发请求转录 rounds 轮"""
+    with pinned_thread(affinity):
+        model = WhisperModel(resolve_model(config), device=config["device"], compute_type=config["compute_type"],
+                             cpu_threads=cpu_threads, num_workers=num_workers)
+
+    def job():
+        start = time.perf_counter()
+        segments, _ = model.transcribe(audio, beam_size=config["beam_size"], language=config["language"] or "en")
+        for _ in segments:
+            pass
+        return time.perf_counter() - start
+
+    job()  # warm-up
+    latencies = []
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=num_workers) as pool:
+        for _ in range(rounds):
+            latencies.extend(pool.map(lambda _: job(), range(num_workers)))
+    elapsed = time.perf_counter() - start
+    audio_sec = duration_seconds(audio) * len(latencies)
+    del model
+    return {
+        "cpu_threads": cpu_threads,
+        "num_workers": num_workers,
+        "total_threads": cpu_threads * num_workers,
+        "throughput": audio_sec / elapsed,
+        "latency_p50": float(np.percentile(latencies, 50)),
+        "latency_max": max(latencies),
+    }
+
+
+def bench_threads(args):
+    config = load_whisper_config()
+    if args.model_size:
+        config["model_size"] = args.model_size
+    topology = detect_cpu_topology()
+    affinity = resolve_affinity(args.affinity or config.get("cpu_affinity"), topology)
+    auto_threads, auto_workers, _ = plan_threads(config, topology)
+    print(f"逻辑CPU: {topology['logical']}，物理核心: {topology['physical']}（可用 {topology['usable']}），NUMA节点: {len(topology['numa_nodes'])}")
+    print(f"自动检测默认值: cpu_threads={auto_threads}, num_workers={auto_workers}")
+
+    audio = load_audio(args.audio, args.seconds)
+    threads = args.threads or default_thread_counts(topology["usable"])
+    workers = args.workers or [1, 2, 4]
+    results = []
+    print(f"\n{'threads':>8} {'workers':>8} {'total':>6} {'audio s/s':>10} {'p50 (s)':>8} {'max (s)':>8}")
+    for num_workers in workers:
+        for cpu_threads in threads:
+            if cpu_threads * num_workers > topology["logical"]:
+                continue
+            r = run_combo(config, audio, cpu_threads, num_workers, args.rounds, affinity)
+            results.append(r)
+            print(f"{r['cpu_threads']:>8} {r['num_workers']:>8} {r['total_threads']:>6} "
+                  f"{r['throughput']:>10.2f} {r['latency_p50']:>8.2f} {r['latency_max']:>8.2f}")
+
+    if not results:
+        print("没有可运行的组合")
+        return
+    best = max(results, key=lambda r: r["throughput"])
+    single = [r for r in results if r["num_workers"] == 1]
+    fastest = min(single or results, key=lambda r: r["latency_p50"])
+    print(f"\n最高吞吐: cpu_threads={best['cpu_threads']}, num_workers={best['num_workers']} "
+          f"({best['throughput']:.2f} 秒音频/秒)")
+    print(f"单请求最低延迟: cpu_threads={fastest['cpu_threads']} ({fastest['latency_p50']:.2f} 秒)")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"topology": topology, "auto": [auto_threads, auto_workers], "results": results}, f, indent=2)
+        print(f"结果已保存到: {args.output}")
+
+
+def write_temp_wav(audio):
+    """把合成音频写入临时WAV文件，供长录音模式内存映射"""
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    with wave.open(path, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(WHISPER_SAMPLE_RATE)
+        f.writeframes((np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes())
+    return path
+
+
+def time_longform(config, path, cpu_threads, workers):
+    """加载模型并完整转录一次，返回 (耗时, 片段数)"""
+    model = WhisperModel(resolve_model(config), device=config["device"], compute_type=config["compute_type"],
+                         cpu_threads=cpu_threads, num_workers=workers)
+    kwargs = {"beam_size": config["beam_size"], "language": config["language"] or "en"}
+    start = time.perf_counter()
+    if workers > 1:
+        segments, _ = longform.transcribe_parallel(path, model, kwargs, workers)
+    else:
+        segments, _ = longform.transcribe_long(path, model, kwargs)
+    count = sum(1 for _ in segments)
+    elapsed = time.perf_counter() - start
+    del model
+    return elapsed, count
+
+
+def bench_parallel(args):
+    config = load_whisper_config()
+    if args.model_size:
+        config["model_size"] = args.model_size
+    topology = detect_cpu_topology()
+    budget = core_budget(config, topology)
+    print(f"可用物理核心: {topology['usable']}，可用于转录: {budget}")
+
+    path, temp = args.audio, None
+    if not path:
+        path = temp = write_temp_wav(load_audio(None, args.seconds))
+    try:
+        duration = longform.file_duration(path)
+        if duration is None:
+            print("只支持 WAV/PCM 文件")
+            return
+        print(f"音频时长: {duration:.0f} 秒")
+        base, count = time_longform(config, path, budget, 1)
+        print(f"\n{'workers':>8} {'threads':>8} {'time (s)':>9} {'RTF':>7} {'speedup':>8} {'segments':>9}")
+        print(f"{1:>8} {budget:>8} {base:>9.1f} {base / duration:>7.3f} {1.0:>8.2f} {count:>9}")
+        results = [{"workers": 1, "cpu_threads": budget, "seconds": base, "speedup": 1.0}]
+        for workers in args.workers or [2, 4, 8]:
+            if workers > budget:
+                continue
+            threads = max(1, budget // workers)
+            elapsed, count = time_longform(config, path, threads, workers)
+            print(f"{workers:>8} {threads:>8} {elapsed:>9.1f} {elapsed / duration:>7.3f} {base / elapsed:>8.2f} {count:>9}")
+            results.append({"workers": workers, "cpu_threads": threads, "seconds": elapsed, "speedup": base / elapsed})
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"duration": duration, "results": results}, f, indent=2)
+            print(f"结果已保存到: {args.output}")
+    finally:
+        if temp:
+            os.remove(temp)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Whisper performance benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    threads = sub.add_parser("threads", help="Sweep cpu_threads x num_workers")
+    threads.add_argument("--audio", help="WAV file to transcribe (default: synthetic signal)")
+    threads.add_argument("--seconds", type=float, default=20, help="Length of the synthetic signal")
+    threads.add_argument("--model-size", help="Override model_size from whisper_config.json")
+    threads.add_argument("--threads", type=int, nargs="+", help="cpu_threads values (default: powers of two up to physical cores)")
+    threads.add_argument("--workers", type=int, nargs="+", help="num_workers values (default: 1 2 4)")
+    threads.add_argument("--rounds", type=int, default=2, help="Concurrent rounds per combination")
+    threads.add_argument("--affinity", help='Pin to "numa:<node>" while benchmarking')
+    threads.add_argument("--output", help="Write results as JSON")
+    threads.set_defaults(func=bench_threads)
+
+    parallel = sub.add_parser("parallel", help="Silence-split parallel long-form transcription vs sequential windows")
+    parallel.add_argument("--audio", help="Long WAV file (default: synthetic signal)")
+    parallel.add_argument("--seconds", type=float, default=600, help="Length of the synthetic signal")
+    parallel.add_argument("--model-size", help="Override model_size from whisper_config.json")
+    parallel.add_argument("--workers", type=int, nargs="+", help="Worker counts to compare (default: 2 4 8)")
+    parallel.add_argument("--output", help="Write results as JSON")
+    parallel.set_defaults(func=bench_parallel)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
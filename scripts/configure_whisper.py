@@ -8,6 +8,11 @@ import json
 import os
 import sys
 
+# Add project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.audio.capabilities import capability_probe
+
 def load_config():
     """加载当前配置"""
     config_path = os.path.join("config", "whisper_config.json")
@@ -21,7 +26,11 @@ def load_config():
         "vad_filter": True,
         "vad_parameters": {
             "min_silence_duration_ms": 500
-        }
+        },
+        "cpu_threads": "auto",
+        "num_workers": "auto",
+        "reserved_cores": 2,
+        "cpu_affinity": None
     }
     
     if os.path.exists(config_path):
@@ -54,12 +63,8 @@ def save_config(config):
         return False
 
 def check_cuda_availability():
-    """检查CUDA是否可用"""
-    try:
-        import torch
-        return torch.cuda.is_available()
-    except ImportError:
-        return False
+    """检查CUDA是否可用（读取缓存的硬件探测结果）"""
+    return "cuda" in capability_probe.get()["compute_types"]
 
 def configure_device(config):
     """配置设备类型"""
@@ -91,19 +96,26 @@ def configure_compute_type(config):
     print("\n=== 计算类型配置 ===")
     print(f"当前计算类型: {config['compute_type']}")
     
+    descriptions = {
+        "int8": "最快，内存占用最少，精度较低",
+        "int16": "平衡速度和精度",
+        "float16": "较高精度，需要更多内存",
+        "float32": "最高精度，需要最多内存"
+    }
+    # 只列出后端在当前设备上原生支持的类型，避免选到需要模拟的慢速类型
+    supported = capability_probe.compute_types(config["device"]) or list(descriptions)
+    recommended = capability_probe.recommended_compute_type(config["device"])
     compute_types = {
-        "1": ("int8", "最快，内存占用最少，精度较低"),
-        "2": ("int16", "平衡速度和精度"),
-        "3": ("float16", "较高精度，需要更多内存"),
-        "4": ("float32", "最高精度，需要最多内存")
+        str(i): (ctype, descriptions.get(ctype, "混合精度")) for i, ctype in enumerate(supported, 1)
     }
     
     print("可用的计算类型:")
     for key, (ctype, desc) in compute_types.items():
-        print(f"{key}. {ctype} - {desc}")
+        mark = "（推荐）" if ctype == recommended else ""
+        print(f"{key}. {ctype} - {desc}{mark}")
     
     while True:
-        choice = input("请选择计算类型 (1-4): ").strip()
+        choice = input(f"请选择计算类型 (1-{len(compute_types)}): ").strip()
         if choice in compute_types:
             config["compute_type"] = compute_types[choice][0]
             break
@@ -163,6 +175,13 @@ def configure_advanced_options(config):
         config["vad_filter"] = False
     else:
         config["vad_filter"] = True
+    
+    # CPU线程配置
+    print(f"当前CPU线程数: {config['cpu_threads']}，模型worker数: {config['num_workers']}")
+    cpu_threads = input("请输入每个worker的CPU线程数 (留空为auto自动检测): ").strip()
+    config["cpu_threads"] = int(cpu_threads) if cpu_threads.isdigit() else "auto"
+    num_workers = input("请输入模型worker数 (留空为auto自动检测): ").strip()
+    config["num_workers"] = int(num_workers) if num_workers.isdigit() else "auto"
 
 def show_current_config(config):
     """显示当前配置"""
@@ -174,6 +193,8 @@ def show_current_config(config):
     print(f"语言: {config['language'] or '自动检测'}")
     print(f"VAD过滤: {'启用' if config['vad_filter'] else '禁用'}")
     print(f"任务类型: {config['task']}")
+    print(f"CPU线程数: {config['cpu_threads']}，模型worker数: {config['num_workers']}")
+    print(f"保留核心数: {config['reserved_cores']}，CPU绑定: {config['cpu_affinity'] or '无'}")
 
 def main():
     print("=== Whisper配置管理工具 ===")
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Whisper模型转换与量化工具
+把 Transformers 格式的 Whisper 检查点（官方、微调或蒸馏版本）转换为 CTranslate2 格式，
+可选量化类型和裁剪解码器层数；在评测集上测量实时率（RTF）和词错误率（WER）后登记到本地模型库
+
+示例:
+    python scripts/convert_model.py convert openai/whisper-small --name small-int8 --eval-set data/eval
+    python scripts/convert_model.py convert distil-whisper/distil-large-v3 --quantization int8_float32 --eval-set data/eval
+    python scripts/convert_model.py convert openai/whisper-small --decoder-layers 2 --name small-d2 --eval-set data/eval
+    python scripts/convert_model.py evaluate base --eval-set data/eval   # 测量已导入的模型，作为对比基线
+
+评测集: 目录中的音频文件及同名 .txt 参考文本，或 {"audio": ..., "text": ...} 的 .jsonl 清单
+"""
+
+import sys
+import os
+
+# Add project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+
+from src.audio import model_store
+from src.audio.conversion import build_variant, evaluate_model
+from src.audio.whisper_transcriber import load_whisper_config
+
+QUANTIZATIONS = ["int8", "int8_float32", "int8_float16", "int16", "float16", "float32"]
+
+
+def print_evaluation(name, evaluation):
+    print(f"{name}: RTF {evaluation['rtf']:.3f}，WER {evaluation['wer']:.1%}"
+          f"（{evaluation['clips']} 段，{evaluation['audio_seconds']:.0f} 秒音频，{evaluation['compute_type']}）")
+
+
+def cmd_convert(store, config, args):
+    name = args.name or "-".join(filter(None, [
+        args.source.rstrip("/").split("/")[-1], f"d{args.decoder_layers}" if args.decoder_layers else None,
+        args.quantization
+    ]))
+    try:
+        entry = build_variant(args.source, name, store, quantization=args.quantization,
+                              decoder_layers=args.decoder_layers, eval_set=args.eval_set, config=config)
+    except Exception as e:
+        print(f"❌ 转换失败: {e}")
+        return 1
+    print(f"✅ 已登记到模型库: {name}（{entry['total_size'] / 1024 ** 2:.1f} MB）")
+    if "evaluation" in entry:
+        print_evaluation(name, entry["evaluation"])
+    print(f"使用: 在 config/whisper_config.json 中设置 \"model_size\": \"{name}\"，"
+          f"\"compute_type\": \"{args.quantization}\"")
+    return 0
+
+
+def cmd_evaluate(store, config, args):
+    try:
+        path = store.resolve(args.name)
+        if path is None:
+            print(f"模型库中没有 {args.name}，请先导入")
+            return 1
+        evaluation = evaluate_model(path, args.eval_set, config, compute_type=args.compute_type)
+        store.annotate(args.name, evaluation=evaluation)
+    except Exception as e:
+        print(f"❌ 评测失败: {e}")
+        return 1
+    print_evaluation(args.name, evaluation)
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert, quantize and evaluate Whisper models for the local store")
+    parser.add_argument("--dir", help="Model store directory (default: model_store.directory in whisper_config.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    converter = sub.add_parser("convert", help="Convert a Transformers checkpoint and register it")
+    converter.add_argument("source", help='Hub id (e.g. "openai/whisper-small") or checkpoint directory')
+    converter.add_argument("--name", help="Name in the store (default: derived from source and options)")
+    converter.add_argument("--quantization", choices=QUANTIZATIONS, default="int8", help="Weight quantization")
+    converter.add_argument("--decoder-layers", type=int, help="Keep only this many decoder layers")
+    converter.add_argument("--eval-set", help="Measure RTF and WER on this directory or .jsonl manifest")
+
+    evaluator = sub.add_parser("evaluate", help="Measure a stored model and record RTF/WER in the index")
+    evaluator.add_argument("name", help="Model name in the store")
+    evaluator.add_argument("--eval-set", required=True, help="Directory or .jsonl manifest")
+    evaluator.add_argument("--compute-type", help="Default: compute_type from whisper_config.json")
+
+    args = parser.parse_args()
+    config = load_whisper_config()
+    store = model_store.ModelStore(args.dir or model_store.settings(config)["directory"])
+    commands = {"convert": cmd_convert, "evaluate": cmd_evaluate}
+    return commands[args.command](store, config, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+本地模型库管理工具
+导入、列出、校验和删除 Whisper 模型；程序运行时只从模型库加载，不访问网络
+
+示例:
+    python scripts/manage_models.py import --hub base --download   # 从 Hugging Face 下载一次并导入
+    python scripts/manage_models.py import /path/to/faster-whisper-small --name small
+    python scripts/manage_models.py import small.tar.gz             # 也支持 .zip/.tar 压缩包
+    python scripts/manage_models.py list --max-wer 0.1              # 列出模型，并给出满足质量要求的最快模型
+    python scripts/manage_models.py verify --full
+"""
+
+import sys
+import os
+
+# Add project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import datetime
+
+from src.audio import model_store
+from src.audio.whisper_transcriber import load_whisper_config
+
+
+def format_size(size):
+    if size < 1024 * 1024:
+        return f"{size / 1024:.1f} KB"
+    if size < 1024 ** 3:
+        return f"{size / 1024 ** 2:.1f} MB"
+    return f"{size / 1024 ** 3:.2f} GB"
+
+
+def cmd_list(store, args):
+    models = store.models()
+    if not models:
+        print(f"模型库为空: {store.directory}")
+        return 0
+    print(f"=== 模型库: {store.directory} ===")
+    for name, entry in sorted(models.items()):
+        imported = datetime.datetime.fromtimestamp(entry["imported_at"]).strftime("%Y-%m-%d %H:%M")
+        evaluation = entry.get("evaluation")
+        quality = f"  RTF {evaluation['rtf']:.3f} WER {evaluation['wer']:.1%}" if evaluation else ""
+        print(f"{name:<20} {format_size(entry['total_size']):>10}  {len(entry['files'])} 个文件  "
+              f"{imported}{quality}  来源: {entry['source']}")
+    if args.max_wer is not None:
+        fastest = store.fastest(args.max_wer)
+        print(f"\nWER ≤ {args.max_wer:.1%} 中最快的模型: {fastest}" if fastest
+              else f"\n没有已评测且 WER ≤ {args.max_wer:.1%} 的模型（见 scripts/convert_model.py evaluate）")
+    return 0
+
+
+def cmd_import(store, args):
+    if bool(args.source) == bool(args.hub):
+        print("请指定模型目录/压缩包，或使用 --hub <模型名>")
+        return 2
+    try:
+        if args.hub:
+            entry = store.import_from_hub(args.hub, allow_download=args.download)
+        else:
+            entry = store.import_model(args.source, name=args.name)
+    except Exception as e:
+        print(f"❌ 导入失败: {e}")
+        if args.hub and not args.download:
+            print("本地 Hugging Face 缓存中没有该模型，加 --download 允许下载")
+        return 1
+    name = entry["path"]
+    print(f"✅ 已导入 {name}: {format_size(entry['total_size'])}，{len(entry['files'])} 个文件")
+    print(f"在 config/whisper_config.json 中设置 \"model_size\": \"{name}\" 即可使用")
+    return 0
+
+
+def cmd_verify(store, args):
+    names = args.names or sorted(store.models())
+    failed = 0
+    for name in names:
+        problems = store.verify(name, full=args.full)
+        if problems:
+            failed += 1
+            print(f"❌ {name}: " + "; ".join(problems))
+        else:
+            print(f"✅ {name}")
+    return 1 if failed else 0
+
+
+def cmd_remove(store, args):
+    if not store.remove(args.name):
+        print(f"模型库中没有 {args.name}")
+        return 1
+    print(f"已删除 {args.name}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local Whisper model store")
+    parser.add_argument("--dir", help="Model store directory (default: model_store.directory in whisper_config.json)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    lister = sub.add_parser("list", help="List imported models")
+    lister.add_argument("--max-wer", type=float, help="Also name the fastest evaluated model with WER at most this (e.g. 0.1)")
+
+    importer = sub.add_parser("import", help="Import a model directory, archive or Hugging Face model")
+    importer.add_argument("source", nargs="?", help="CTranslate2 model directory or .zip/.tar(.gz) archive")
+    importer.add_argument("--name", help="Name in the store (default: directory or archive name)")
+    importer.add_argument("--hub", metavar="MODEL", help='faster-whisper model size or repo id, e.g. "base"')
+    importer.add_argument("--download", action="store_true", help="With --hub: download if not in the local cache")
+
+    verifier = sub.add_parser("verify", help="Check stored models against the index")
+    verifier.add_argument("names", nargs="*", help="Models to check (default: all)")
+    verifier.add_argument("--full", action="store_true", help="Recompute SHA-256 checksums instead of comparing sizes")
+
+    remover = sub.add_parser("remove", help="Delete a model from the store")
+    remover.add_argument("name")
+
+    args = parser.parse_args()
+    directory = args.dir or model_store.settings(load_whisper_config())["directory"]
+    store = model_store.ModelStore(directory)
+    commands = {"list": cmd_list, "import": cmd_import, "verify": cmd_verify, "remove": cmd_remove}
+    return commands[args.command](store, args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
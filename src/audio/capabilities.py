@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from src.audio.cpu_tuning import detect_cpu_topology
+from src.metrics import metrics
+
+CAPABILITIES_PATH = os.path.join("config", "capabilities.json")
+
+# Display order, fastest first; only types CTranslate2 reports are offered
+COMPUTE_TYPE_ORDER = ["int8", "int8_float16", "int8_bfloat16", "int8_float32", "int16",
+                      "float16", "bfloat16", "float32"]
+
+
+def _ctranslate2_version():
+    try:
+        import ctranslate2
+        return ctranslate2.__version__
+    except Exception:
+        return None
+
+
+def environment_fingerprint():
+    """
+    Hash of what the capabilities depend on
+
+    A stored probe is only trusted while OS, CPU, Python and CTranslate2 are
+    unchanged; audio devices can change between runs and are refreshed in the
+    background instead.
+    """
+    parts = [platform.platform(), platform.machine(), platform.processor(), platform.python_version(),
+             str(os.cpu_count()), str(_ctranslate2_version()), os.environ.get("CUDA_VISIBLE_DEVICES", "")]
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def _cpu_flags():
+    system = platform.system()
+    if system == "Linux":
+        try:
+            with open("/proc/cpuinfo") as f:
+                for line in f:
+                    if line.startswith(("flags", "Features")):
+                        return set(line.split(":", 1)[1].split())
+        except OSError:
+            pass
+    elif system == "Darwin":
+        try:
+            output = subprocess.check_output(
+                ["sysctl", "-n", "machdep.cpu.features", "machdep.cpu.leaf7_features"], timeout=2, text=True
+            )
+            return {flag.lower() for flag in output.split()}
+        except Exception:
+            pass
+    return set()
+
+
+def detect_cpu_features():
+    """SIMD features relevant to CTranslate2's int8/int16 kernels"""
+    flags = _cpu_flags()
+    machine = platform.machine().lower()
+    return {
+        "avx2": "avx2" in flags,
+        "avx512": "avx512f" in flags,
+        "avx512_vnni": "avx512_vnni" in flags or "avx512vnni" in flags,
+        "avx_vnni": "avx_vnni" in flags,
+        "neon": machine in ("arm64", "aarch64") or "asimd" in flags,
+    }
+
+
+def detect_compute_devices():
+    """
+    Inference devices and the compute types CTranslate2 supports on each
+
+    Returns:
+        dict: {device: [compute types, fastest first]}
+    """
+    try:
+        import ctranslate2
+    except Exception:
+        return {"cpu": ["int8", "float32"]}
+    devices = {}
+    candidates = ["cpu"]
+    try:
+        if ctranslate2.get_cuda_device_count() > 0:
+            candidates.append("cuda")
+    except Exception:
+        pass
+    for device in candidates:
+        try:
+            supported = ctranslate2.get_supported_compute_types(device)
+        except Exception:
+            continue
+        devices[device] = sorted(supported, key=lambda t: COMPUTE_TYPE_ORDER.index(t)
+                                 if t in COMPUTE_TYPE_ORDER else len(COMPUTE_TYPE_ORDER))
+    return devices or {"cpu": ["int8", "float32"]}
+
+
+def detect_input_devices():
+    """Input devices as "<name> (id=<index>)" labels, as stored in `input_device`"""
+    try:
+        import sounddevice as sd
+        devices = sd.query_devices()
+    except Exception:
+        return []
+    labels = []
+    for idx, dev in enumerate(devices):
+        if isinstance(dev, dict):
+            max_input = int(dev.get('max_input_channels', 0))
+            name = dev.get('name', str(idx))
+        else:
+            max_input = int(getattr(dev, 'max_input_channels', 0))
+            name = getattr(dev, 'name', str(idx))
+        if max_input > 0:
+            labels.append(f"{name} (id={idx})")
+    return labels
+
+
+def probe_capabilities():
+    """Run every probe once"""
+    start = time.perf_counter()
+    topology = detect_cpu_topology()
+    capabilities = {
+        "fingerprint": environment_fingerprint(),
+        "probed_at": time.time(),
+        "compute_types": detect_compute_devices(),
+        "cpu_features": detect_cpu_features(),
+        "cpu": {"logical": topology["logical"], "physical": topology["physical"],
+                "numa_nodes": len(topology["numa_nodes"])},
+        "input_devices": detect_input_devices(),
+    }
+    metrics.observe("capabilities.probe_seconds", time.perf_counter() - start)
+    return capabilities
+
+
+class CapabilityProbe:
+    """
+    Hardware capabilities, probed once and persisted
+
+    `get()` answers from memory or from the file written by the last probe when
+    its environment fingerprint still matches, so callers such as the settings
+    dialog never wait on CTranslate2 or PortAudio. `refresh()` re-probes on a
+    background thread and reports changes since the stored probe (e.g. a
+    microphone connected since the last run). PortAudio only enumerates devices
+    when it is initialised, so a device plugged in while the app is running is
+    listed after a restart.
+    """
+
+    def __init__(self, path=CAPABILITIES_PATH):
+        self.path = path
+        self._capabilities = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                capabilities = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if capabilities.get("fingerprint") != environment_fingerprint():
+            print("Environment changed, hardware capabilities will be probed again")
+            return None
+        return capabilities
+
+    def _save(self, capabilities):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(capabilities, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            print(f"Failed to save hardware capabilities: {e}")
+
+    def get(self):
+        """Cached capabilities, probing synchronously only when nothing usable is stored"""
+        with self._lock:
+            if self._capabilities is None:
+                self._capabilities = self._load()
+                if self._capabilities is None:
+                    self._capabilities = probe_capabilities()
+                    self._save(self._capabilities)
+            return self._capabilities
+
+    def refresh(self, on_change=None):
+        """
+        Re-probe in the background
+
+        Args:
+            on_change (callable): Called with the new capabilities (on the probe thread) if they differ;
+                a RuntimeError from it (deleted Qt receiver) is ignored
+        """
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                capabilities = probe_capabilities()
+                with self._lock:
+                    previous = self._capabilities
+                    self._capabilities = capabilities
+                self._save(capabilities)
+                changed = previous is None or any(
+                    previous.get(key) != capabilities[key] for key in ("compute_types", "cpu_features", "input_devices")
+                )
+                if changed and on_change:
+                    try:
+                        on_change(capabilities)
+                    except RuntimeError as e:
+                        # The receiver (e.g. a closed settings dialog's signal) was deleted meanwhile
+                        print(f"Capability change not delivered: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def compute_types(self, device):
+        return self.get()["compute_types"].get(device, [])
+
+    def recommended_compute_type(self, device):
+        """Fastest type with native kernels: int8 on CPUs with AVX2/NEON, float16 on CUDA"""
+        supported = self.compute_types(device)
+        if not supported:
+            return "int8"
+        if device == "cuda":
+            for compute_type in ("int8_float16", "float16"):
+                if compute_type in supported:
+                    return compute_type
+        features = self.get()["cpu_features"]
+        if "int8" in supported and (features.get("avx2") or features.get("neon") or features.get("avx512")):
+            return "int8"
+        return "float32" if "float32" in supported else supported[0]
+
+
+capability_probe = CapabilityProbe()
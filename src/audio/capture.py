@@ -0,0 +1,203 @@
+import threading
+import time
+import numpy as np
+import sounddevice as sd
+from src.metrics import metrics
+
+
+class RingBuffer:
+    """
+    Preallocated single-producer/single-consumer ring of audio frames
+
+    The producer (audio callback) only copies into the preallocated array and
+    advances an integer write position; a plain int store is atomic under the
+    GIL, so no lock is taken on the real-time side. If the consumer falls more
+    than `capacity` frames behind, the oldest frames are skipped and counted.
+    """
+
+    def __init__(self, capacity, channels, dtype=np.float32):
+        self.capacity = int(capacity)
+        self._buf = np.zeros((self.capacity, channels), dtype=dtype)
+        self._write_pos = 0  # Total frames written, only advanced by the producer
+        self._read_pos = 0   # Total frames consumed, only advanced by the consumer
+        self.dropped_frames = 0
+
+    def write(self, block):
+        """Producer side: copy a (frames, channels) block, no allocation of sample data"""
+        n = len(block)
+        if n > self.capacity:
+            block = block[n - self.capacity:]
+            n = self.capacity
+        start = self._write_pos % self.capacity
+        first = min(n, self.capacity - start)
+        self._buf[start:start + first] = block[:first]
+        if first < n:
+            self._buf[:n - first] = block[first:]
+        self._write_pos += n
+
+    def available(self):
+        return self._write_pos - self._read_pos
+
+    def read_into(self, out):
+        """
+        Consumer side: move up to len(out) pending frames into `out`
+
+        Returns:
+            int: Number of frames copied
+        """
+        write_pos = self._write_pos
+        pending = write_pos - self._read_pos
+        if pending > self.capacity:
+            # Consumer fell behind and the producer wrapped over unread frames
+            self.dropped_frames += pending - self.capacity
+            self._read_pos = write_pos - self.capacity
+            pending = self.capacity
+        n = min(pending, len(out))
+        start = self._read_pos % self.capacity
+        first = min(n, self.capacity - start)
+        out[:first] = self._buf[start:start + first]
+        if first < n:
+            out[first:n] = self._buf[:n - first]
+        self._read_pos += n
+        return n
+
+
+class AudioCapture:
+    """
+    Real-time-safe microphone capture
+
+    The sounddevice callback only copies the block into a ring buffer and bumps
+    status counters. A consumer thread drains the ring every `poll_ms` into a
+    preallocated recording buffer and does the metering and silence detection
+    there, reporting through `on_level(rms)` and `on_silence()` on that thread.
+    """
+
+    def __init__(self, sample_rate, channels=1, device=None, max_seconds=60, ring_seconds=2,
+                 poll_ms=20, silence_threshold=0.01, silence_max_ms=2000, on_level=None, on_silence=None,
+                 meter=None):
+        """
+        Args:
+            sample_rate (int): Capture sample rate
+            channels (int): Input channels
+            device (int | None): sounddevice input device id
+            max_seconds (float): Longest recording kept, later frames are discarded
+            ring_seconds (float): Ring capacity, how far the consumer may lag behind
+            poll_ms (int): Consumer wake-up interval
+            silence_threshold (float): RMS below this counts as silence
+            silence_max_ms (int): Silence duration that triggers on_silence, <= 0 for the first silent block
+            on_level (callable): Called with the RMS of each drained chunk
+            on_silence (callable): Called once when the silence timeout is reached
+            meter (LevelMeter): Level envelope fed with every drained chunk
+        """
+        self.sample_rate = sample_rate
+        self.channels = channels
+        self.device = device
+        self.poll_ms = poll_ms
+        self.silence_threshold = silence_threshold
+        self.silence_max_ms = silence_max_ms
+        self.on_level = on_level
+        self.on_silence = on_silence
+        self.meter = meter
+        self._ring = RingBuffer(int(ring_seconds * sample_rate), channels)
+        self._recording = np.zeros((int(max_seconds * sample_rate), channels), dtype=np.float32)
+        self._recorded = 0
+        self._stream = None
+        self._consumer = None
+        self._running = False
+        self._silent_frames = 0
+        self._silence_reported = False
+        # Written by the callback only
+        self.callbacks = 0
+        self.input_overflows = 0
+        self.input_underflows = 0
+
+    def _callback(self, indata, frames, time_info, status):
+        # Real-time thread: copy and count, nothing else
+        if status:
+            if status.input_overflow:
+                self.input_overflows += 1
+            if status.input_underflow:
+                self.input_underflows += 1
+        self._ring.write(indata)
+        self.callbacks += 1
+
+    def start(self):
+        self._running = True
+        self._stream = sd.InputStream(
+            channels=self.channels, samplerate=self.sample_rate, dtype='float32',
+            callback=self._callback, device=self.device
+        )
+        self._stream.start()
+        self._consumer = threading.Thread(target=self._consume, daemon=True)
+        self._consumer.start()
+
+    def _consume(self):
+        interval = self.poll_ms / 1000
+        while self._running:
+            time.sleep(interval)
+            self._drain()
+        self._drain()
+
+    def _drain(self):
+        if self._ring.available() == 0:
+            return
+        free = len(self._recording) - self._recorded
+        if free > 0:
+            n = self._ring.read_into(self._recording[self._recorded:])
+            chunk = self._recording[self._recorded:self._recorded + n]
+            self._recorded += n
+        else:
+            # Recording buffer full: keep metering, discard the samples
+            scratch = np.empty((self._ring.available(), self.channels), dtype=np.float32)
+            n = self._ring.read_into(scratch)
+            chunk = scratch[:n]
+        if n:
+            self._meter(chunk)
+
+    def _meter(self, chunk):
+        rms = float(np.sqrt(np.mean(np.square(chunk, dtype=np.float64))))
+        if self.on_level:
+            self.on_level(rms)
+        if self.meter:
+            self.meter.process(chunk, rms)
+        if rms < self.silence_threshold:
+            self._silent_frames += len(chunk)
+        else:
+            self._silent_frames = 0
+            self._silence_reported = False
+        silent_ms = self._silent_frames * 1000 / self.sample_rate
+        timed_out = rms < self.silence_threshold if self.silence_max_ms <= 0 else silent_ms >= self.silence_max_ms
+        if timed_out and not self._silence_reported and self.on_silence:
+            self._silence_reported = True
+            self.on_silence()
+
+    def stop(self):
+        """
+        Stop capturing
+
+        Returns:
+            np.ndarray: The recorded frames, shape (frames, channels)
+        """
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        self._running = False
+        if self._consumer is not None and self._consumer is not threading.current_thread():
+            self._consumer.join(timeout=1)
+        self._consumer = None
+        stats = self.stats()
+        metrics.incr("audio.input_overflows", stats["input_overflows"])
+        metrics.incr("audio.input_underflows", stats["input_underflows"])
+        metrics.incr("audio.dropped_frames", stats["dropped_frames"])
+        return self._recording[:self._recorded].copy()
+
+    def stats(self):
+        """Capture health counters"""
+        return {
+            "callbacks": self.callbacks,
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows,
+            "dropped_frames": self._ring.dropped_frames,
+            "recorded_frames": self._recorded,
+        }
@@ -0,0 +1,224 @@
+import json
+import os
+import re
+import tempfile
+import time
+import unicodedata
+from src.audio.capabilities import COMPUTE_TYPE_ORDER
+from src.audio.cpu_tuning import plan_threads
+from src.metrics import metrics
+
+AUDIO_EXTENSIONS = (".wav", ".flac", ".mp3", ".m4a", ".ogg")
+# Files faster-whisper needs next to model.bin
+COPY_FILES = ["tokenizer.json", "preprocessor_config.json"]
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def decoder_layer_plan(total, keep):
+    """
+    Decoder layers kept when pruning, spread evenly and always including the
+    first and last layer (the distil-whisper student initialization)
+    """
+    if not 1 <= keep <= total:
+        raise ValueError(f"Can keep 1..{total} decoder layers, got {keep}")
+    if keep == 1:
+        return [total - 1]
+    return sorted({round(i * (total - 1) / (keep - 1)) for i in range(keep)})
+
+
+def prune_decoder_layers(source, keep, output_dir):
+    """
+    Save a copy of a Transformers Whisper checkpoint with fewer decoder layers
+
+    Decoding runs the decoder once per token, so it dominates latency on CPU;
+    the encoder is kept intact. Quality drops without distillation, pruned
+    checkpoints are meant to be measured (and optionally fine-tuned) first.
+
+    Returns:
+        list: Indices of the kept layers
+    """
+    import torch
+    from transformers import WhisperForConditionalGeneration, WhisperProcessor
+
+    model = WhisperForConditionalGeneration.from_pretrained(source)
+    layers = model.model.decoder.layers
+    kept = decoder_layer_plan(len(layers), keep)
+    model.model.decoder.layers = torch.nn.ModuleList([layers[i] for i in kept])
+    model.config.decoder_layers = len(kept)
+    model.save_pretrained(output_dir)
+    WhisperProcessor.from_pretrained(source).save_pretrained(output_dir)
+    return kept
+
+
+def convert_checkpoint(source, output_dir, quantization="int8"):
+    """
+    Convert a Transformers Whisper checkpoint (hub id or directory) to CTranslate2
+
+    Args:
+        source (str): e.g. "openai/whisper-small", "distil-whisper/distil-large-v3" or a fine-tuned checkpoint directory
+        output_dir (str): Created by the converter
+        quantization (str): Weight type stored in model.bin, e.g. "int8", "int8_float32", "int16"
+    """
+    if quantization not in COMPUTE_TYPE_ORDER:
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    try:
+        # The converter only fails on its first tensor without these
+        import torch
+        import transformers
+        from ctranslate2.converters import TransformersConverter
+    except ImportError as e:
+        raise RuntimeError(f"Conversion needs ctranslate2 with transformers and torch installed: {e}")
+    copy_files = [name for name in COPY_FILES if not os.path.isdir(source)
+                  or os.path.exists(os.path.join(source, name))]
+    converter = TransformersConverter(source, copy_files=copy_files)
+    converter.convert(output_dir, quantization=quantization, force=True)
+    return output_dir
+
+
+def load_eval_set(path):
+    """
+    Evaluation clips with reference transcripts
+
+    Either a directory of audio files with a same-named .txt reference next to
+    each, or a .jsonl manifest of {"audio": path, "text": reference} lines
+    (paths relative to the manifest).
+
+    Returns:
+        list: (audio path, reference text) pairs
+    """
+    pairs = []
+    if os.path.isdir(path):
+        for name in sorted(os.listdir(path)):
+            stem, ext = os.path.splitext(name)
+            reference = os.path.join(path, stem + ".txt")
+            if ext.lower() in AUDIO_EXTENSIONS and os.path.exists(reference):
+                with open(reference, "r", encoding="utf-8") as f:
+                    pairs.append((os.path.join(path, name), f.read().strip()))
+    else:
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    pairs.append((os.path.join(base, item["audio"]), item["text"]))
+    if not pairs:
+        raise ValueError(f"No audio/reference pairs found in {path}")
+    return pairs
+
+
+def _tokens(text):
+    """Lower-cased words without punctuation; CJK characters count as one token each"""
+    text = "".join(" " if unicodedata.category(ch).startswith("P") else ch for ch in text.lower())
+    text = _CJK_RE.sub(lambda m: f" {m.group(0)} ", text)
+    return text.split()
+
+
+def edit_distance(reference, hypothesis):
+    """Levenshtein distance between two token lists, O(len(hypothesis)) memory"""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref in enumerate(reference, 1):
+        current = [i]
+        for j, hyp in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref != hyp)))
+        previous = current
+    return previous[-1]
+
+
+def word_error_rate(references, hypotheses):
+    """Corpus WER: total edits over total reference tokens"""
+    edits = words = 0
+    for reference, hypothesis in zip(references, hypotheses):
+        ref_tokens = _tokens(reference)
+        edits += edit_distance(ref_tokens, _tokens(hypothesis))
+        words += len(ref_tokens)
+    return edits / words if words else 0.0
+
+
+def evaluate_model(model_dir, eval_set, config, compute_type=None):
+    """
+    Measure real-time factor and WER of a local model on an evaluation set
+
+    The model is loaded with the thread plan the application would use, and
+    warmed up on one clip first so load time and first-call allocation are not
+    counted.
+
+    Args:
+        model_dir (str): CTranslate2 model directory
+        eval_set (str): Directory or manifest, see load_eval_set()
+        config (dict): Whisper configuration (device, beam_size, language, threads)
+        compute_type (str): Overrides config["compute_type"], normally the conversion quantization
+
+    Returns:
+        dict: rtf, wer, audio_seconds, clips, compute_type, device, eval_set, evaluated_at
+    """
+    from faster_whisper import WhisperModel
+
+    pairs = load_eval_set(eval_set)
+    compute_type = compute_type or config["compute_type"]
+    cpu_threads, num_workers, _ = plan_threads(config)
+    model = WhisperModel(model_dir, device=config["device"], compute_type=compute_type,
+                         cpu_threads=cpu_threads, num_workers=num_workers, local_files_only=True)
+    kwargs = {"beam_size": config["beam_size"], "task": "transcribe"}
+    if config["language"]:
+        kwargs["language"] = config["language"]
+
+    def run(path):
+        segments, info = model.transcribe(path, **kwargs)
+        return " ".join(segment.text.strip() for segment in segments), info.duration
+
+    run(pairs[0][0])
+    hypotheses, audio_seconds, decode_seconds = [], 0.0, 0.0
+    for path, _ in pairs:
+        start = time.perf_counter()
+        text, duration = run(path)
+        decode_seconds += time.perf_counter() - start
+        audio_seconds += duration
+        hypotheses.append(text)
+    result = {
+        "rtf": decode_seconds / audio_seconds if audio_seconds else None,
+        "wer": word_error_rate([reference for _, reference in pairs], hypotheses),
+        "audio_seconds": audio_seconds,
+        "clips": len(pairs),
+        "compute_type": compute_type,
+        "device": config["device"],
+        "eval_set": os.path.abspath(eval_set),
+        "evaluated_at": time.time(),
+    }
+    metrics.observe("conversion.rtf", result["rtf"] or 0.0, compute_type=compute_type)
+    return result
+
+
+def build_variant(source, name, store, quantization="int8", decoder_layers=None, eval_set=None, config=None):
+    """
+    Convert (and optionally prune) a checkpoint, measure it and register it in the model store
+
+    Args:
+        source (str): Transformers Whisper checkpoint, hub id or directory
+        name (str): Name in the model store
+        store (ModelStore): Destination store
+        quantization (str): CTranslate2 weight quantization
+        decoder_layers (int): Keep only this many decoder layers, None keeps all
+        eval_set (str): Measure RTF and WER on this set before registering
+        config (dict): Whisper configuration used for the measurement
+
+    Returns:
+        dict: The model's index entry
+    """
+    conversion = {"source": source, "quantization": quantization, "converted_at": time.time()}
+    os.makedirs(store.directory, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=store.directory, prefix=".convert-") as staging:
+        checkpoint = source
+        if decoder_layers:
+            checkpoint = os.path.join(staging, "pruned")
+            print(f"Pruning decoder of {source} to {decoder_layers} layers...")
+            conversion["decoder_layers"] = prune_decoder_layers(source, decoder_layers, checkpoint)
+        output_dir = os.path.join(staging, "ct2")
+        print(f"Converting to CTranslate2 ({quantization})...")
+        start = time.perf_counter()
+        convert_checkpoint(checkpoint, output_dir, quantization)
+        conversion["seconds"] = time.perf_counter() - start
+        metadata = {"conversion": conversion}
+        if eval_set:
+            print(f"Evaluating on {eval_set}...")
+            metadata["evaluation"] = evaluate_model(output_dir, eval_set, config, compute_type=quantization)
+        return store.import_model(output_dir, name=name, origin=f"convert:{source}", metadata=metadata)
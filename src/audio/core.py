@@ -3,8 +3,16 @@ from scipy.io.wavfile import write
 import numpy as np
 import os
 import time
+import wave
 from datetime import datetime
 from faster_whisper import WhisperModel
+from src.audio.cpu_tuning import plan_threads
+from src.audio.language import language_manager
+from src.audio.whisper_transcriber import TranscriptionStream, load_whisper_config
+from src.audio.model_store import resolve_model
+from src.audio import longform
+
+LONG_RECORDING_SEC = 60  # Longer recordings are streamed to disk instead of held in memory
 
 class AudioProcessor:
     """Audio processing core class, integrating recording and transcription functionality"""
@@ -13,7 +21,10 @@ class AudioProcessor:
         self.sample_rate = sample_rate
         self.channels = channels
         self.whisper_model = None
+        self.whisper_workers = 1
         self.cache_dir = cache_dir
+        # Spoken language is pinned per processor after the first confident detection
+        self.language_session = f"cli-{id(self)}"
         
         # Ensure cache directory exists
         self._ensure_cache_dirs()
@@ -71,43 +82,94 @@ class AudioProcessor:
         print(f"Starting recording for {duration} seconds...")
         print("Please start speaking...")
         
-        audio = sd.rec(int(duration * self.sample_rate), samplerate=self.sample_rate, 
-                      channels=self.channels, dtype='int16', device=device)
-        sd.wait()
+        if duration >= LONG_RECORDING_SEC:
+            volume = self._record_to_file(duration, output_path, device)
+            # Hand back a memory map of the file rather than the samples
+            audio, _ = longform.open_memmap(output_path)
+        else:
+            audio = sd.rec(int(duration * self.sample_rate), samplerate=self.sample_rate, 
+                          channels=self.channels, dtype='int16', device=device)
+            sd.wait()
+            volume = np.sqrt(np.mean(audio**2))
+            write(output_path, self.sample_rate, audio)
         
-        volume = np.sqrt(np.mean(audio**2))
         print(f"Recording completed, volume level: {volume}")
         
         if volume < 20:
             print("Warning: Recording volume too low, please check microphone settings")
         
-        write(output_path, self.sample_rate, audio)
         print(f"Recording saved to {output_path}")
         
         return audio, output_path, volume
     
-    def load_whisper_model(self, model_size="base"):
+    def _record_to_file(self, duration, output_path, device=None, block_sec=0.5):
+        """Record straight into a WAV file block by block, returning the RMS volume"""
+        total_frames = int(duration * self.sample_rate)
+        block = int(block_sec * self.sample_rate)
+        sum_squares, recorded = 0.0, 0
+        with wave.open(output_path, "wb") as wav_file, \
+                sd.InputStream(samplerate=self.sample_rate, channels=self.channels, dtype='int16',
+                               device=device) as stream:
+            wav_file.setnchannels(self.channels)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            while recorded < total_frames:
+                data, overflowed = stream.read(min(block, total_frames - recorded))
+                if overflowed:
+                    print("Warning: audio input overflow, some samples were dropped")
+                wav_file.writeframes(data.tobytes())
+                sum_squares += float(np.sum(data.astype(np.float64) ** 2))
+                recorded += len(data)
+        return np.sqrt(sum_squares / max(1, recorded * self.channels))
+    
+    def load_whisper_model(self, model_size="base", num_workers=None):
         """Load Whisper model"""
         # For compatibility, always reload model to avoid accessing unknown attributes
         print(f"Loading Whisper model: {model_size}")
-        self.whisper_model = WhisperModel(model_size, device="cpu", compute_type="int8")
+        cpu_threads, num_workers, _ = plan_threads({"num_workers": num_workers})
+        model_path = resolve_model(dict(load_whisper_config(), model_size=model_size))
+        self.whisper_model = WhisperModel(model_path, device="cpu", compute_type="int8",
+                                          cpu_threads=cpu_threads, num_workers=num_workers, local_files_only=True)
+        self.whisper_workers = num_workers
         return self.whisper_model
     
-    def transcribe_audio(self, audio_path, model_size="base", save_transcript=True):
-        """Transcribe audio file"""
+    def stream_transcription(self, audio_path, model_size="base", parallel_workers=None):
+        """
+        Start transcribing an audio file, returning a TranscriptionStream of segments
+        
+        Recordings longer than the long-form threshold are memory-mapped; with
+        parallel_workers > 1 they are split at silences and the chunks decoded
+        concurrently on a model with that many workers.
+        """
         if not os.path.exists(audio_path):
             raise FileNotFoundError(f"Audio file not found: {audio_path}")
         
-        model = self.load_whisper_model(model_size)
+        duration = longform.file_duration(audio_path)
+        is_long = duration is not None and duration >= longform.LONGFORM_DEFAULTS["min_duration_sec"]
+        # A short clip is one sequential decode, extra model workers would only cost memory
+        model = self.load_whisper_model(model_size, parallel_workers if is_long else 1)
         print(f"Starting transcription of audio file: {audio_path}")
         
-        segments, info = model.transcribe(audio_path, beam_size=5)
+        # Default pinning thresholds, no fixed language
+        pin_config = {"language": None}
+        language = language_manager.decode_language(self.language_session, pin_config)
+        if is_long:
+            settings = dict(longform.LONGFORM_DEFAULTS, parallel_workers=parallel_workers or "auto")
+            segments, info = longform.transcribe_file(audio_path, model, {"beam_size": 5, "language": language},
+                                                      settings, self.whisper_workers)
+        else:
+            segments, info = model.transcribe(audio_path, beam_size=5, language=language)
         
-        transcript = ""
-        for segment in segments:
-            transcript += segment.text + " "
+        def on_complete(avg_logprobs):
+            language_manager.observe(self.language_session, pin_config, info.language, info.language_probability, avg_logprobs)
         
-        transcript = transcript.strip()
+        return TranscriptionStream(segments, info, on_complete)
+    
+    def transcribe_audio(self, audio_path, model_size="base", save_transcript=True, parallel_workers=None):
+        """Transcribe audio file"""
+        stream = self.stream_transcription(audio_path, model_size, parallel_workers)
+        transcript = stream.text()
+        info = stream.info
         
         print(f"Transcription completed!")
         print(f"Detected language: {info.language} (confidence: {info.language_probability:.2f})")
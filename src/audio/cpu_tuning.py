@@ -0,0 +1,215 @@
+import glob
+import os
+import platform
+import subprocess
+from contextlib import contextmanager
+
+# CTranslate2 intra-op scaling flattens out beyond roughly this many threads per
+# decode on the Whisper encoder (see `scripts/benchmark_whisper.py threads`), so
+# larger core budgets are better spent on additional model workers.
+THREADS_PER_WORKER_TARGET = 8
+
+# Threads CTranslate2 uses per decode when cpu_threads is 0 (the default before
+# auto-tuning); reserving cores never shrinks the budget below this.
+CT2_DEFAULT_THREADS = 4
+
+_topology = None
+
+
+def _parse_cpu_list(text):
+    """Parse a Linux cpulist such as "0-3,8-11" """
+    cpus = []
+    for part in text.strip().split(","):
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cpus.extend(range(int(start), int(end) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def _linux_physical_cores():
+    cores = set()
+    for path in glob.glob("/sys/devices/system/cpu/cpu[0-9]*/topology/core_id"):
+        cpu_dir = os.path.dirname(os.path.dirname(path))
+        try:
+            with open(path) as f:
+                core_id = f.read().strip()
+            with open(os.path.join(cpu_dir, "topology", "physical_package_id")) as f:
+                package_id = f.read().strip()
+        except OSError:
+            continue
+        cores.add((package_id, core_id))
+    return len(cores) or None
+
+
+def _linux_numa_nodes():
+    nodes = []
+    for path in sorted(glob.glob("/sys/devices/system/node/node[0-9]*/cpulist")):
+        try:
+            with open(path) as f:
+                cpus = _parse_cpu_list(f.read())
+        except OSError:
+            continue
+        if cpus:
+            nodes.append(cpus)
+    return nodes
+
+
+def _macos_physical_cores():
+    try:
+        return int(subprocess.check_output(["sysctl", "-n", "hw.physicalcpu"], timeout=2).strip())
+    except Exception:
+        return None
+
+
+def detect_cpu_topology():
+    """
+    Detect logical CPUs, physical cores and NUMA nodes (cached)
+
+    Returns:
+        dict: {"logical": int, "physical": int, "usable": int, "numa_nodes": list[list[int]],
+               "available": list[int] | None}; "physical" counts the whole machine,
+               "usable" the physical cores this process may run on
+    """
+    global _topology
+    if _topology is not None:
+        return _topology
+
+    logical = os.cpu_count() or 1
+    physical = None
+    numa_nodes = []
+    system = platform.system()
+    if system == "Linux":
+        physical = _linux_physical_cores()
+        numa_nodes = _linux_numa_nodes()
+    elif system == "Darwin":
+        physical = _macos_physical_cores()
+    if physical is None:
+        try:
+            import psutil
+            physical = psutil.cpu_count(logical=False)
+        except Exception:
+            physical = None
+    # CPUs this process may run on (cgroups / taskset), Linux only
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+    physical = physical or logical
+    usable = physical
+    if available is not None:
+        # Scale physical cores down to the share of logical CPUs we are allowed to use;
+        # "physical" stays the machine total so logical / physical is the SMT ratio
+        usable = max(1, round(physical * len(available) / logical))
+    _topology = {
+        "logical": logical,
+        "physical": physical,
+        "usable": usable,
+        "numa_nodes": numa_nodes or [list(range(logical))],
+        "available": available,
+    }
+    return _topology
+
+
+def resolve_affinity(spec, topology=None):
+    """
+    Resolve a `cpu_affinity` config value to a CPU id list
+
+    Args:
+        spec: None, a list of CPU ids, or "numa:<node>"
+
+    Returns:
+        list[int] | None: CPU ids to pin to, or None for no pinning (also for invalid specs)
+    """
+    if not spec:
+        return None
+    topology = topology or detect_cpu_topology()
+    if isinstance(spec, str) and spec.startswith("numa:"):
+        try:
+            node = int(spec.split(":", 1)[1])
+        except ValueError:
+            print(f"Invalid cpu_affinity {spec!r}, expected \"numa:<node>\"; CPU pinning disabled")
+            return None
+        nodes = topology["numa_nodes"]
+        if not 0 <= node < len(nodes):
+            print(f"NUMA node {node} not found, CPU pinning disabled")
+            return None
+        return list(nodes[node])
+    try:
+        if isinstance(spec, str):
+            raise ValueError(spec)
+        return [int(cpu) for cpu in spec]
+    except (TypeError, ValueError):
+        print(f"Invalid cpu_affinity {spec!r}, expected a list of CPU ids or \"numa:<node>\"; CPU pinning disabled")
+        return None
+
+
+def core_budget(config, topology=None, affinity=None):
+    """
+    Physical cores available to Whisper decoding
+
+    Pinned: the pinned CPU set, assuming 2-way SMT if logical > physical.
+    Otherwise the usable cores minus `reserved_cores`, but never less than
+    CTranslate2's default thread count, so small machines (e.g. 4 cores) do
+    not end up slower than with cpu_threads=0.
+    """
+    topology = topology or detect_cpu_topology()
+    if affinity:
+        smt = max(1, round(topology["logical"] / topology["physical"]))
+        return max(1, len(affinity) // smt)
+    usable = topology["usable"]
+    budget = usable - int(config.get("reserved_cores", 2))
+    return max(1, budget, min(usable, CT2_DEFAULT_THREADS))
+
+
+def plan_threads(config, topology=None):
+    """
+    Split CPU cores between Whisper model workers and the rest of the app
+
+    Config keys:
+        cpu_threads: "auto" or threads per model worker
+        num_workers: "auto" or number of model workers (concurrent decodes)
+        reserved_cores: physical cores left for the Qt thread, audio callbacks and LLM I/O
+        cpu_affinity: None, list of CPU ids, or "numa:<node>" to pin model threads
+
+    Returns:
+        tuple: (cpu_threads, num_workers, affinity list or None)
+    """
+    topology = topology or detect_cpu_topology()
+    affinity = resolve_affinity(config.get("cpu_affinity"), topology)
+    budget = core_budget(config, topology, affinity)
+
+    num_workers = config.get("num_workers", "auto")
+    if num_workers in (None, "auto"):
+        num_workers = max(1, budget // THREADS_PER_WORKER_TARGET)
+    num_workers = max(1, int(num_workers))
+
+    cpu_threads = config.get("cpu_threads", "auto")
+    if cpu_threads in (None, "auto"):
+        cpu_threads = max(1, budget // num_workers)
+    cpu_threads = max(1, int(cpu_threads))
+    return cpu_threads, num_workers, affinity
+
+
+@contextmanager
+def pinned_thread(cpus):
+    """
+    Temporarily pin the calling thread to `cpus` (Linux only)
+
+    Threads created inside the block (e.g. CTranslate2's compute pool during model
+    construction) inherit the affinity; the calling thread is restored afterwards.
+    """
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        yield
+        return
+    previous = os.sched_getaffinity(0)
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as e:
+        print(f"CPU pinning failed: {e}")
+        yield
+        return
+    try:
+        yield
+    finally:
+        os.sched_setaffinity(0, previous)
@@ -0,0 +1,117 @@
+import threading
+from collections import OrderedDict
+from src.metrics import metrics
+
+DEFAULT_PINNING = {
+    "enabled": True,
+    "confidence_threshold": 0.8,  # Minimum language probability needed to pin a detection
+    "recheck_logprob": -1.0,      # Mean segment avg_logprob below this counts as a poor decode
+    "recheck_after": 2            # Consecutive poor decodes before the pin is dropped
+}
+
+
+class LanguageManager:
+    """
+    Per-session spoken-language pinning
+
+    Whisper runs language identification on the first 30 s window of every
+    decode that has no `language`. Within a session (a GUI user, a CLI run, a
+    service client) the language rarely changes, so the first confident
+    detection is pinned and passed to later decodes, which then skip detection.
+    While pinned, Whisper reports probability 1.0 for the forced language, so
+    decode quality (segment avg_logprob) is used instead: after a few poor
+    decodes in a row the pin is dropped and the next utterance is detected again.
+    """
+
+    def __init__(self, max_sessions=256):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    @staticmethod
+    def settings(config):
+        settings = dict(DEFAULT_PINNING)
+        settings.update(config.get("language_pinning") or {})
+        return settings
+
+    def _state(self, session):
+        state = self._sessions.get(session)
+        if state is None:
+            state = self._sessions[session] = {"language": None, "probability": 0.0, "misses": 0}
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        self._sessions.move_to_end(session)
+        return state
+
+    def decode_language(self, session, config):
+        """
+        Language to pass to model.transcribe for a session
+
+        Args:
+            session (str | None): Session key, None disables pinning
+            config (dict): Whisper configuration
+
+        Returns:
+            str | None: Language code, or None to let Whisper detect it
+        """
+        if config.get("language"):
+            return config["language"]
+        if session is None or not self.settings(config)["enabled"]:
+            return None
+        with self._lock:
+            language = self._state(session)["language"]
+        metrics.incr("whisper.language", outcome="pinned" if language else "detect")
+        return language
+
+    def observe(self, session, config, language, probability, avg_logprobs):
+        """
+        Update a session after a decode
+
+        Args:
+            session (str | None): Session key
+            config (dict): Whisper configuration
+            language (str): Language reported by Whisper
+            probability (float): Language probability reported by Whisper
+            avg_logprobs (list[float]): avg_logprob of the decoded segments
+        """
+        if session is None or config.get("language"):
+            return
+        settings = self.settings(config)
+        if not settings["enabled"]:
+            return
+        with self._lock:
+            state = self._state(session)
+            if state["language"] is None:
+                if language and probability >= settings["confidence_threshold"]:
+                    state.update(language=language, probability=probability, misses=0)
+                    metrics.incr("whisper.language_pin", language=language)
+                return
+            if not avg_logprobs:
+                return
+            if sum(avg_logprobs) / len(avg_logprobs) < settings["recheck_logprob"]:
+                state["misses"] += 1
+                if state["misses"] >= settings["recheck_after"]:
+                    print(f"Language pin '{state['language']}' dropped for session {session}, re-detecting")
+                    metrics.incr("whisper.language_recheck", language=state["language"])
+                    state.update(language=None, probability=0.0, misses=0)
+            else:
+                state["misses"] = 0
+
+    def pin(self, session, language):
+        """Pin a session to a language explicitly"""
+        with self._lock:
+            self._state(session).update(language=language, probability=1.0, misses=0)
+
+    def unpin(self, session):
+        with self._lock:
+            self._sessions.pop(session, None)
+
+    def pinned(self, session):
+        """Currently pinned language of a session, or None"""
+        with self._lock:
+            state = self._sessions.get(session)
+            return state["language"] if state else None
+
+
+# Process-wide manager shared by the GUI, CLI and service
+language_manager = LanguageManager()
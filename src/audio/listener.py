@@ -0,0 +1,237 @@
+import threading
+import time
+from collections import deque
+import numpy as np
+import sounddevice as sd
+from src.audio.capture import RingBuffer
+from src.metrics import metrics
+
+LISTENER_DEFAULTS = {
+    "threshold": 0.01,     # Lowest RMS counted as speech, the adaptive floor can raise it
+    "noise_ratio": 3.0,    # Speech must be this many times louder than the background
+    "end_ms": 800,         # Pause that ends an utterance
+    "preroll_ms": 300,     # Audio kept from before speech was detected
+    "min_speech_ms": 300,  # Shorter sounds are ignored
+    "max_utterance_sec": 60,
+    "poll_ms": 100         # Consumer wake-up interval, the main idle cost
+}
+
+
+def settings(config):
+    merged = dict(LISTENER_DEFAULTS)
+    merged.update(config.get("hands_free") or {})
+    return merged
+
+
+class VadGate:
+    """
+    Streaming energy gate with an adaptive noise floor
+
+    Speech starts after `start_ms` of frames above max(threshold, noise floor x
+    noise_ratio) and ends after `end_ms` below 70% of that level (hysteresis,
+    so a word's decay does not flap the gate). The noise floor follows the
+    frame energy slowly while no one is speaking.
+    """
+
+    def __init__(self, frame_ms=20, threshold=0.01, noise_ratio=3.0, start_ms=120, end_ms=800, noise_alpha=0.05):
+        self.threshold = threshold
+        self.noise_ratio = noise_ratio
+        self.noise_alpha = noise_alpha
+        self.start_frames = max(1, int(start_ms / frame_ms))
+        self.end_frames = max(1, int(end_ms / frame_ms))
+        self.noise = threshold / noise_ratio
+        self.speaking = False
+        self._run = 0  # Consecutive frames pointing to the other state
+
+    def update(self, rms):
+        """Feed one frame's RMS, returns "start", "end" or None"""
+        level = max(self.threshold, self.noise * self.noise_ratio)
+        if not self.speaking:
+            if rms > level:
+                self._run += 1
+                if self._run >= self.start_frames:
+                    self.speaking, self._run = True, 0
+                    return "start"
+            else:
+                self._run = 0
+                self.noise += (rms - self.noise) * self.noise_alpha
+            return None
+        if rms < level * 0.7:
+            self._run += 1
+            if self._run >= self.end_frames:
+                self.speaking, self._run = False, 0
+                return "end"
+        else:
+            self._run = 0
+        return None
+
+
+class HandsFreeListener:
+    """
+    Always-on microphone that cuts the input into utterances
+
+    One input stream stays open; its callback only copies into a ring buffer.
+    A consumer thread wakes every `poll_ms`, computes per-frame energies in one
+    vectorized pass and runs them through a VadGate. While idle only a short
+    pre-roll is kept; detected utterances (with the pre-roll, so the first
+    syllable survives the start delay) are handed to `on_utterance(audio, info)`
+    on the consumer thread.
+    """
+
+    def __init__(self, sample_rate, device=None, on_utterance=None, meter=None, frame_ms=20, poll_ms=100,
+                 preroll_ms=300, tail_ms=200, min_speech_ms=300, max_utterance_sec=60, **gate_options):
+        """
+        Args:
+            sample_rate (int): Capture sample rate (16000 avoids resampling before Whisper)
+            device (int | None): sounddevice input device id
+            on_utterance (callable): Called with (mono float32 samples, info dict)
+            meter (LevelMeter): Fed while an utterance is being recorded
+            poll_ms (int): Consumer wake-up interval, the main idle cost
+            preroll_ms (int): Audio kept from before the gate opened
+            tail_ms (int): Silence kept after the last voiced frame
+            min_speech_ms (int): Shorter utterances (clicks, coughs) are dropped
+            max_utterance_sec (float): Utterances are cut at this length
+            **gate_options: VadGate parameters (threshold, noise_ratio, start_ms, end_ms)
+        """
+        self.sample_rate = sample_rate
+        self.device = device
+        self.on_utterance = on_utterance
+        self.meter = meter
+        self.poll_ms = poll_ms
+        self.frame = int(sample_rate * frame_ms / 1000)
+        self.gate = VadGate(frame_ms=frame_ms, **gate_options)
+        self.tail_frames = int(tail_ms / frame_ms)
+        self.min_speech_frames = int(min_speech_ms / frame_ms)
+        self.max_frames = int(max_utterance_sec * 1000 / frame_ms)
+        self._preroll = deque(maxlen=max(1, int(preroll_ms / frame_ms)))
+        self._ring = RingBuffer(int(sample_rate * 2), 1)
+        self._scratch = np.zeros((int(sample_rate * 2), 1), dtype=np.float32)
+        self._carry = np.zeros(0, dtype=np.float32)
+        self._utterance = None
+        self._lead_frames = 0
+        self._speech_start = None
+        self._stream = None
+        self._consumer = None
+        self._running = False
+        self._cpu_start = None
+        self.utterances = 0
+        # Written by the callback only
+        self.input_overflows = 0
+
+    def _callback(self, indata, frames, time_info, status):
+        # Real-time thread: copy and count, nothing else
+        if status and status.input_overflow:
+            self.input_overflows += 1
+        self._ring.write(indata)
+
+    def start(self):
+        self._running = True
+        self._cpu_start = (time.monotonic(), time.process_time())
+        self._stream = sd.InputStream(
+            channels=1, samplerate=self.sample_rate, dtype='float32', callback=self._callback, device=self.device
+        )
+        self._stream.start()
+        self._consumer = threading.Thread(target=self._consume, daemon=True)
+        self._consumer.start()
+
+    def _consume(self):
+        interval = self.poll_ms / 1000
+        idle_mark = (time.monotonic(), time.process_time())
+        while self._running:
+            time.sleep(interval)
+            n = self._ring.read_into(self._scratch)
+            if n:
+                self._process(self._scratch[:n, 0])
+            if self._utterance is None and time.monotonic() - idle_mark[0] >= 10:
+                # Process CPU while waiting for speech, in % of one core
+                now = (time.monotonic(), time.process_time())
+                metrics.observe("handsfree.idle_cpu_percent", 100 * (now[1] - idle_mark[1]) / (now[0] - idle_mark[0]))
+                idle_mark = now
+            elif self._utterance is not None:
+                idle_mark = (time.monotonic(), time.process_time())
+
+    def _process(self, samples):
+        samples = np.concatenate((self._carry, samples)) if len(self._carry) else samples
+        n_frames = len(samples) // self.frame
+        self._carry = samples[n_frames * self.frame:].copy()
+        if n_frames == 0:
+            return
+        frames = samples[:n_frames * self.frame].reshape(n_frames, self.frame)
+        energies = np.sqrt(np.mean(np.square(frames), axis=1))
+        if self.meter and self._utterance is not None:
+            self.meter.process(samples, float(energies.mean()))
+        for i, (frame, rms) in enumerate(zip(frames, energies)):
+            event = self.gate.update(float(rms))
+            if self._utterance is None:
+                self._preroll.append(frame.copy())
+                if event == "start":
+                    # The gate opened after start_ms of speech, which is already in the pre-roll
+                    self._utterance = list(self._preroll)
+                    self._lead_frames = len(self._utterance) - self.gate.start_frames
+                    self._preroll.clear()
+                    self._speech_start = time.monotonic()
+                continue
+            self._utterance.append(frame.copy())
+            if event == "end" or len(self._utterance) >= self.max_frames:
+                if event != "end":
+                    self.gate.speaking = False
+                trailing = self.gate.end_frames if event == "end" else 0
+                # Samples captured since the last voiced one, to date the end of speech
+                since = (trailing + n_frames - 1 - i) * self.frame + len(self._carry)
+                self._emit(trailing, time.monotonic() - since / self.sample_rate)
+
+    def _emit(self, trailing, speech_end):
+        frames = self._utterance
+        self._utterance = None
+        # Drop most of the silence that closed the gate
+        cut = max(0, trailing - self.tail_frames)
+        if cut:
+            frames = frames[:-cut]
+        if len(frames) - self._lead_frames - self.tail_frames < self.min_speech_frames:
+            metrics.incr("handsfree.rejected")
+            return
+        audio = np.concatenate(frames)
+        info = {
+            "speech_start": self._speech_start,
+            # Monotonic time the speaker stopped, the reference for wake-to-text latency
+            "speech_end": speech_end,
+            "duration": len(audio) / self.sample_rate,
+        }
+        self.utterances += 1
+        metrics.incr("handsfree.utterances")
+        if self.on_utterance:
+            self.on_utterance(audio, info)
+
+    def stop(self):
+        """
+        Close the input stream, an utterance in progress is discarded
+
+        Returns:
+            dict: Final stats()
+        """
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream.close()
+            self._stream = None
+        self._running = False
+        if self._consumer is not None and self._consumer is not threading.current_thread():
+            self._consumer.join(timeout=1)
+        self._consumer = None
+        self._utterance = None
+        stats = self.stats()
+        metrics.incr("audio.input_overflows", stats["input_overflows"])
+        metrics.incr("audio.dropped_frames", stats["dropped_frames"])
+        return stats
+
+    def stats(self):
+        """Utterance count, overflows and average process CPU since start (% of one core)"""
+        cpu = None
+        if self._cpu_start:
+            wall = time.monotonic() - self._cpu_start[0]
+            cpu = 100 * (time.process_time() - self._cpu_start[1]) / wall if wall > 0 else 0.0
+        return {
+            "utterances": self.utterances,
+            "input_overflows": self.input_overflows,
+            "dropped_frames": self._ring.dropped_frames,
+            "cpu_percent": cpu,
+        }
@@ -0,0 +1,293 @@
+import os
+import mmap
+import dataclasses
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import numpy as np
+from faster_whisper.vad import get_speech_timestamps, VadOptions
+from scipy.io import wavfile
+from src.audio.pcm import to_model_input, WHISPER_SAMPLE_RATE
+
+LONGFORM_DEFAULTS = {
+    "enabled": True,
+    "min_duration_sec": 600,  # Files at least this long are transcribed window by window
+    "window_sec": 60,         # Audio handed to the model per call
+    "overlap_sec": 4,         # Overlap between windows, segments are cut in its middle
+    "parallel_workers": "auto"  # Concurrent chunk decodes, "auto" = the model's num_workers; 1 = sequential windows
+}
+
+# Parallel mode: chunks are cut at the longest silence found in the search range
+CHUNK_TARGET_SEC = 45
+CHUNK_MAX_SEC = 60
+CHUNK_SEARCH_SEC = 15
+MIN_SILENCE_SEC = 0.3
+FORCED_CUT_OVERLAP_SEC = 2
+
+
+MAPPABLE_EXTENSIONS = {".wav", ".pcm", ".raw"}
+
+
+def settings(config):
+    merged = dict(LONGFORM_DEFAULTS)
+    merged.update(config.get("longform") or {})
+    return merged
+
+
+def transcribe_file(path, model, transcribe_kwargs, longform_settings, num_workers):
+    """
+    Long-form transcription of a file, parallel when the model has several workers
+
+    Args:
+        num_workers (int): num_workers the model was created with
+
+    Returns:
+        tuple: (segment generator, info)
+    """
+    workers = longform_settings.get("parallel_workers", "auto")
+    workers = num_workers if workers in (None, "auto") else min(int(workers), num_workers)
+    if workers > 1:
+        print(f"Transcribing in parallel on {workers} workers, split at silences")
+        return transcribe_parallel(path, model, transcribe_kwargs, workers)
+    print(f"Transcribing in {longform_settings['window_sec']} s windows")
+    return transcribe_long(path, model, transcribe_kwargs, longform_settings["window_sec"],
+                           longform_settings["overlap_sec"])
+
+
+def open_memmap(path, sample_rate=None, channels=1, dtype="int16"):
+    """
+    Memory-map a WAV or raw PCM file without reading it into memory
+
+    Args:
+        path (str): .wav file, or raw interleaved PCM (.pcm/.raw)
+        sample_rate (int): Sample rate of raw PCM (WAV files carry their own)
+        channels (int): Channels of raw PCM
+        dtype (str): Sample format of raw PCM
+
+    Returns:
+        tuple: (samples memmap of shape (n,) or (n, channels), sample_rate)
+    """
+    if os.path.splitext(path)[1].lower() == ".wav":
+        # Raises ValueError for formats scipy cannot map (e.g. 24-bit)
+        sample_rate, samples = wavfile.read(path, mmap=True)
+        return samples, sample_rate
+    samples = np.memmap(path, dtype=np.dtype(dtype), mode="r")
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+    return samples, sample_rate or WHISPER_SAMPLE_RATE
+
+
+def file_duration(path):
+    """Duration of a WAV/PCM file in seconds, None if it cannot be memory-mapped"""
+    if os.path.splitext(path)[1].lower() not in MAPPABLE_EXTENSIONS:
+        return None
+    try:
+        samples, sample_rate = open_memmap(path)
+    except Exception:
+        return None
+    return len(samples) / sample_rate
+
+
+def _release_pages(samples, start, end):
+    """
+    Drop the mapped pages of samples[start:end] from resident memory (where supported)
+
+    File-backed pages stay counted in RSS after being read; advising the kernel
+    that consumed windows are no longer needed keeps RSS flat over the file.
+    """
+    mapping = getattr(samples, "_mmap", None)
+    if mapping is None or not hasattr(mapping, "madvise") or not hasattr(mmap, "MADV_DONTNEED"):
+        return
+    frame_bytes = samples.itemsize * (samples.shape[1] if samples.ndim > 1 else 1)
+    # np.memmap maps from `offset` rounded down to the allocation granularity
+    base = samples.offset - samples.offset % mmap.ALLOCATIONGRANULARITY
+    byte_start = samples.offset - base + start * frame_bytes
+    byte_end = samples.offset - base + end * frame_bytes
+    byte_start -= byte_start % mmap.PAGESIZE
+    byte_end -= byte_end % mmap.PAGESIZE
+    if byte_end > byte_start:
+        try:
+            mapping.madvise(mmap.MADV_DONTNEED, byte_start, byte_end - byte_start)
+        except (OSError, ValueError):
+            pass
+
+
+def iter_windows(samples, sample_rate, window_sec=60, overlap_sec=4):
+    """
+    Yield fixed-size overlapping windows converted to model input
+
+    Only the current window is paged in and converted, so resident memory is
+    bounded by the window size rather than the recording length.
+
+    Yields:
+        tuple: (window start in seconds, 16 kHz mono float32 window, is last window)
+    """
+    window = int(window_sec * sample_rate)
+    hop = max(1, window - int(overlap_sec * sample_rate))
+    total = len(samples)
+    start = 0
+    while start < total:
+        end = min(total, start + window)
+        yield start / sample_rate, to_model_input(np.array(samples[start:end]), sample_rate), end >= total
+        if end >= total:
+            break
+        # The next window starts at start + hop, everything before it is consumed
+        _release_pages(samples, start, start + hop)
+        start += hop
+
+
+def transcribe_long(path, model, transcribe_kwargs, window_sec=60, overlap_sec=4):
+    """
+    Transcribe a long WAV/PCM recording window by window from a memory map
+
+    Each window owns the time range between the middles of its overlaps with
+    its neighbours; segments starting outside that range are dropped, as are
+    repeats of the previous window's last segment, so boundaries merge
+    without duplicated text.
+
+    Args:
+        path (str): Recording path
+        model (WhisperModel): Loaded model
+        transcribe_kwargs (dict): model.transcribe keyword arguments
+
+    Returns:
+        tuple: (generator of faster-whisper Segments with absolute timestamps, info of the first window)
+    """
+    samples, sample_rate = open_memmap(path)
+    windows = iter_windows(samples, sample_rate, window_sec, overlap_sec)
+    offset, audio, is_last = next(windows)
+    segments, info = model.transcribe(audio, **transcribe_kwargs)
+    kwargs = dict(transcribe_kwargs)
+    # Detect the language once, on the first window
+    if not kwargs.get("language"):
+        kwargs["language"] = info.language
+
+    def generate():
+        nonlocal offset, audio, is_last, segments
+        owned_from = 0.0
+        last_end, last_text = 0.0, None
+        while True:
+            duration = len(audio) / WHISPER_SAMPLE_RATE
+            owned_to = float("inf") if is_last else offset + duration - overlap_sec / 2
+            for segment in segments:
+                start, end = offset + segment.start, offset + segment.end
+                if start < owned_from or start >= owned_to:
+                    continue
+                text = segment.text.strip()
+                if text == last_text and start < last_end:
+                    continue
+                last_end, last_text = end, text
+                yield dataclasses.replace(segment, start=start, end=end)
+            if is_last:
+                return
+            owned_from = owned_to
+            offset, audio, is_last = next(windows)
+            segments, _ = model.transcribe(audio, **kwargs)
+
+    return generate(), info
+
+
+def plan_chunks(samples, sample_rate, target_sec=CHUNK_TARGET_SEC, max_sec=CHUNK_MAX_SEC,
+                search_sec=CHUNK_SEARCH_SEC):
+    """
+    Split a recording into chunks at VAD-detected silences
+
+    For each chunk, VAD runs only on the search range around the target length
+    and the cut is placed in the middle of the longest silence there, so no word
+    is split. Without a usable silence the chunk is cut at `max_sec` with a small
+    overlap, and each side keeps the segments starting on its side of the cut.
+
+    Yields:
+        dict: start/end sample of the chunk and the own_from/own_to time range (seconds) it owns
+    """
+    total = len(samples)
+    cursor, own_from = 0, 0.0
+    vad_options = VadOptions(min_silence_duration_ms=int(MIN_SILENCE_SEC * 1000))
+    while True:
+        if total - cursor <= max_sec * sample_rate:
+            yield {"start": cursor, "end": total, "own_from": own_from, "own_to": float("inf")}
+            return
+        region_start = cursor + int((target_sec - search_sec / 2) * sample_rate)
+        region_end = cursor + int(max_sec * sample_rate)
+        region = to_model_input(np.array(samples[region_start:region_end]), sample_rate)
+        speech = get_speech_timestamps(region, vad_options)
+        # Silences between speech chunks, in 16 kHz samples relative to the region
+        edges = [0] + [x for chunk in speech for x in (chunk["start"], chunk["end"])] + [len(region)]
+        gaps = [(edges[i + 1] - edges[i], edges[i]) for i in range(0, len(edges) - 1, 2)]
+        length, gap_start = max(gaps)
+        if length >= MIN_SILENCE_SEC * WHISPER_SAMPLE_RATE:
+            cut = region_start + int((gap_start + length / 2) / WHISPER_SAMPLE_RATE * sample_rate)
+            yield {"start": cursor, "end": cut, "own_from": own_from, "own_to": cut / sample_rate}
+            cursor, own_from = cut, cut / sample_rate
+        else:
+            cut = region_end
+            half = int(FORCED_CUT_OVERLAP_SEC / 2 * sample_rate)
+            yield {"start": cursor, "end": cut + half, "own_from": own_from, "own_to": cut / sample_rate}
+            cursor, own_from = cut - half, cut / sample_rate
+
+
+def transcribe_parallel(path, model, transcribe_kwargs, workers):
+    """
+    Transcribe a long WAV/PCM recording with chunks decoded concurrently
+
+    The model must be created with num_workers >= workers so CTranslate2 can run
+    that many decodes at once. Chunks are read from the memory map when a worker
+    picks them up, at most 2 x workers are in flight, and segments are yielded
+    in recording order.
+
+    Args:
+        path (str): Recording path
+        model (WhisperModel): Loaded model
+        transcribe_kwargs (dict): model.transcribe keyword arguments
+        workers (int): Number of concurrent decodes
+
+    Returns:
+        tuple: (generator of faster-whisper Segments with absolute timestamps, info with language)
+    """
+    samples, sample_rate = open_memmap(path)
+    kwargs = dict(transcribe_kwargs)
+    probability = 1.0
+    if not kwargs.get("language"):
+        # One language detection for the whole recording instead of one per chunk
+        head = to_model_input(np.array(samples[:30 * sample_rate]), sample_rate)
+        kwargs["language"], probability, _ = model.detect_language(head)
+    info = SimpleNamespace(language=kwargs["language"], language_probability=probability,
+                           duration=len(samples) / sample_rate)
+
+    def run(chunk):
+        audio = to_model_input(np.array(samples[chunk["start"]:chunk["end"]]), sample_rate)
+        offset = chunk["start"] / sample_rate
+        segments, _ = model.transcribe(audio, **kwargs)
+        kept = []
+        for segment in segments:
+            start = offset + segment.start
+            if chunk["own_from"] <= start < chunk["own_to"]:
+                kept.append(dataclasses.replace(segment, start=start, end=offset + segment.end))
+        return kept
+
+    def generate():
+        last_end, last_text = 0.0, None
+        chunks = plan_chunks(samples, sample_rate)
+        pending = deque()
+        exhausted = False
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                while not exhausted and len(pending) < workers * 2:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        exhausted = True
+                    else:
+                        pending.append((chunk, executor.submit(run, chunk)))
+                if not pending:
+                    return
+                chunk, future = pending.popleft()
+                for segment in future.result():
+                    text = segment.text.strip()
+                    # Drop a boundary segment repeated by both sides of a forced cut
+                    if text == last_text and segment.start < last_end:
+                        continue
+                    last_end, last_text = segment.end, text
+                    yield segment
+                _release_pages(samples, chunk["start"], chunk["end"])
+
+    return generate(), info
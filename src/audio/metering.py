@@ -0,0 +1,98 @@
+import time
+import numpy as np
+
+
+class LevelSlot:
+    """
+    Single-producer/single-consumer latest-value slot
+
+    The producer replaces the value and bumps a sequence number; the consumer
+    takes the value only if the sequence moved since its last take. Both are
+    plain attribute stores, so neither side ever blocks the other; a consumer
+    racing a publish simply sees the newer value.
+    """
+
+    def __init__(self):
+        self._value = None
+        self._seq = 0
+        self._taken_seq = 0
+
+    def publish(self, value):
+        self._value = value
+        self._seq += 1
+
+    def take(self):
+        """Latest value if it changed since the last take, else None"""
+        seq = self._seq
+        if seq == self._taken_seq:
+            return None
+        self._taken_seq = seq
+        return self._value
+
+
+class LevelMeter:
+    """
+    Decimated peak/RMS envelope for the level display
+
+    `process` runs on the capture consumer thread: it smooths the level with
+    separate attack/release rates and publishes into a LevelSlot at most
+    `max_fps` times per second, and only when the envelope moved by more than
+    `change_threshold`. `notify` is called once per batch of publishes until
+    the UI consumes the slot, so the UI thread gets a single coalesced wake-up
+    per change instead of polling on timers.
+    """
+
+    def __init__(self, notify=None, gain=8.0, max_fps=30, change_threshold=0.02, attack=0.5, release=0.18):
+        """
+        Args:
+            notify (callable): Called (on the producer thread) when a new level is waiting
+            gain (float): RMS to display amplitude gain
+            max_fps (int): Maximum publish rate
+            change_threshold (float): Minimum envelope change worth a repaint
+            attack (float): Smoothing factor while the level rises
+            release (float): Smoothing factor while the level falls
+        """
+        self.notify = notify
+        self.gain = gain
+        self.min_interval = 1.0 / max_fps
+        self.change_threshold = change_threshold
+        self.attack = attack
+        self.release = release
+        self.slot = LevelSlot()
+        self.reset()
+
+    def reset(self):
+        self.published = 0
+        self._envelope = 0.0
+        self._peak = 0.0
+        self._last_envelope = 0.0
+        self._last_publish = 0.0
+        self._pending = False
+
+    def process(self, chunk, rms=None):
+        """Update the envelope with a chunk of samples (producer thread)"""
+        if rms is None:
+            rms = float(np.sqrt(np.mean(np.square(chunk, dtype=np.float64))))
+        self._peak = max(self._peak, float(np.max(np.abs(chunk)))) if len(chunk) else self._peak
+        target = min(rms * self.gain, 1.0)
+        alpha = self.attack if target > self._envelope else self.release
+        self._envelope += (target - self._envelope) * alpha
+
+        now = time.monotonic()
+        if now - self._last_publish < self.min_interval:
+            return
+        if abs(self._envelope - self._last_envelope) < self.change_threshold:
+            return
+        self.slot.publish({"envelope": self._envelope, "peak": self._peak, "rms": rms})
+        self.published += 1
+        self._peak = 0.0
+        self._last_envelope = self._envelope
+        self._last_publish = now
+        if not self._pending and self.notify:
+            self._pending = True
+            self.notify()
+
+    def consume(self):
+        """Take the latest level (consumer/UI thread), None if nothing new"""
+        self._pending = False
+        return self.slot.take()
@@ -0,0 +1,355 @@
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+from src.metrics import metrics
+
+STORE_DEFAULTS = {
+    "directory": "models",  # Imported models and index.json
+    "offline": True,        # Never download at load time, missing models must be imported first
+    "verify": "size"        # Check on every load: "size" (cheap), "sha256" (reads every file) or "none"
+}
+
+INDEX_FILE = "index.json"
+# A CTranslate2 Whisper model directory is recognized by its weights file
+MODEL_MARKER = "model.bin"
+_CHUNK = 1 << 20
+
+
+class ModelNotFoundError(FileNotFoundError):
+    """The requested model is not in the local store and may not be downloaded"""
+
+
+class ModelIntegrityError(Exception):
+    """A stored model's files no longer match the index"""
+
+
+def settings(config):
+    merged = dict(STORE_DEFAULTS)
+    merged.update(config.get("model_store") or {})
+    return merged
+
+
+def _copy_hashed(src, dst):
+    """Copy a file and hash it in the same pass, returns (size, sha256)"""
+    digest = hashlib.sha256()
+    size = 0
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        while True:
+            chunk = fin.read(_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+            fout.write(chunk)
+            size += len(chunk)
+    return size, digest.hexdigest()
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(_CHUNK)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _find_model_dir(root):
+    """Directory under root holding model.bin (archives often wrap the model in a folder)"""
+    for dirpath, _, files in os.walk(root):
+        if MODEL_MARKER in files:
+            return dirpath
+    return None
+
+
+def _check_member_path(dest, member):
+    root = os.path.realpath(dest)
+    target = os.path.realpath(os.path.join(dest, member))
+    # `tar -C model -cf model.tar .` stores the archive root itself as "." or "./"
+    if target != root and not target.startswith(root + os.sep):
+        raise ValueError(f"Unsafe path in archive: {member}")
+
+
+def _extract(archive, dest):
+    if zipfile.is_zipfile(archive):
+        with zipfile.ZipFile(archive) as zf:
+            for member in zf.namelist():
+                _check_member_path(dest, member)
+            zf.extractall(dest)
+    elif tarfile.is_tarfile(archive):
+        with tarfile.open(archive) as tf:
+            if hasattr(tarfile, "data_filter"):
+                # "data" filter rejects absolute paths, links outside dest and special files
+                tf.extractall(dest, filter="data")
+                return
+            # Python before 3.10.12 / 3.11.4 has no extraction filters, check members by hand;
+            # model archives only need plain files and directories
+            for member in tf.getmembers():
+                if not (member.isfile() or member.isdir()):
+                    raise ValueError(f"Unsupported entry in archive: {member.name}")
+                _check_member_path(dest, member.name)
+            tf.extractall(dest)
+    else:
+        raise ValueError(f"Not a model directory or a .zip/.tar archive: {archive}")
+
+
+class ModelStore:
+    """
+    Local store of CTranslate2 Whisper models
+
+    Each model lives in `<directory>/<name>/` and is recorded in
+    `<directory>/index.json` with its source, total size and the size and
+    SHA-256 of every file, computed once while importing. `resolve()` only
+    looks at the local disk, so loading a model never needs the network.
+    """
+
+    def __init__(self, directory=STORE_DEFAULTS["directory"]):
+        self.directory = directory
+        self.index_path = os.path.join(directory, INDEX_FILE)
+
+    def load_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Failed to read model index {self.index_path}: {e}")
+            return {}
+
+    def _save_index(self, index):
+        os.makedirs(self.directory, exist_ok=True)
+        # Write then rename, a crash never leaves a truncated index
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".index-", suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        os.replace(tmp, self.index_path)
+
+    def models(self):
+        return self.load_index()
+
+    def _path(self, entry):
+        path = entry["path"]
+        return path if os.path.isabs(path) else os.path.join(self.directory, path)
+
+    def resolve(self, name, verify="size"):
+        """
+        Local directory of a stored model
+
+        Args:
+            name (str): Model name, e.g. "base" or "large-v3"
+            verify (str): "size", "sha256" or "none", see verify()
+
+        Returns:
+            str | None: Model directory, None if the model was never imported
+
+        Raises:
+            ModelIntegrityError: The stored files do not match the index
+        """
+        entry = self.load_index().get(name)
+        if entry is None:
+            return None
+        path = self._path(entry)
+        if verify != "none":
+            problems = self.verify(name, full=verify == "sha256")
+            if problems:
+                metrics.incr("model_store.integrity_failures", model=name)
+                raise ModelIntegrityError(
+                    f"Model '{name}' in {path} is damaged ({'; '.join(problems[:3])}), import it again"
+                )
+        return path
+
+    def verify(self, name, full=False):
+        """
+        Compare a stored model with its index entry
+
+        Args:
+            full (bool): Also recompute SHA-256 checksums, otherwise only sizes are compared
+
+        Returns:
+            list: Problems found, empty if the model is intact
+        """
+        entry = self.load_index().get(name)
+        if entry is None:
+            return [f"'{name}' is not in the index"]
+        path = self._path(entry)
+        problems = []
+        for rel, info in entry["files"].items():
+            file_path = os.path.join(path, rel)
+            try:
+                size = os.path.getsize(file_path)
+            except OSError:
+                problems.append(f"{rel} is missing")
+                continue
+            if size != info["size"]:
+                problems.append(f"{rel} has {size} bytes, expected {info['size']}")
+            elif full and _hash_file(file_path) != info["sha256"]:
+                problems.append(f"{rel} checksum mismatch")
+        return problems
+
+    def import_model(self, source, name=None, origin=None, metadata=None):
+        """
+        Copy a model directory or archive into the store
+
+        Args:
+            source (str): CTranslate2 model directory (containing model.bin), or a .zip/.tar(.gz) of one
+            name (str): Store name, defaults to the directory or archive name
+            origin (str): Recorded as the model's source, defaults to the source path
+            metadata (dict): Extra index fields, e.g. "conversion" and "evaluation" results
+
+        Returns:
+            dict: The new index entry
+        """
+        source = os.path.abspath(source)
+        if not os.path.exists(source):
+            raise FileNotFoundError(f"Model source not found: {source}")
+        if name is None:
+            name = os.path.basename(source.rstrip(os.sep))
+            for ext in (".tar.gz", ".tgz", ".tar", ".zip"):
+                if name.endswith(ext):
+                    name = name[:-len(ext)]
+                    break
+        if not name or name.startswith(".") or os.sep in name or (os.altsep and os.altsep in name):
+            raise ValueError(f"Invalid model name: {name!r}")
+
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.directory, prefix=".import-") as staging:
+            if os.path.isdir(source):
+                model_dir = source
+            else:
+                _extract(source, os.path.join(staging, "extracted"))
+                model_dir = _find_model_dir(os.path.join(staging, "extracted"))
+            if model_dir is None or not os.path.isfile(os.path.join(model_dir, MODEL_MARKER)):
+                raise ValueError(f"No {MODEL_MARKER} found in {source}, not a CTranslate2 model")
+
+            files = {}
+            copy_dir = os.path.join(staging, "model")
+            for dirpath, dirnames, filenames in os.walk(model_dir):
+                dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+                for filename in filenames:
+                    if filename.startswith("."):
+                        continue
+                    src = os.path.join(dirpath, filename)
+                    rel = os.path.relpath(src, model_dir)
+                    dst = os.path.join(copy_dir, rel)
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    # Hub caches keep files as symlinks into a blob store, copy the content
+                    size, sha256 = _copy_hashed(os.path.realpath(src), dst)
+                    files[rel.replace(os.sep, "/")] = {"size": size, "sha256": sha256}
+
+            target = os.path.join(self.directory, name)
+            if os.path.exists(target):
+                # Swap in the new copy, the old one is removed with the staging directory
+                os.replace(target, os.path.join(staging, "previous"))
+            os.replace(copy_dir, target)
+
+        entry = {
+            "path": name,
+            "source": origin or source,
+            "imported_at": time.time(),
+            "total_size": sum(info["size"] for info in files.values()),
+            "files": files,
+        }
+        entry.update(metadata or {})
+        index = self.load_index()
+        index[name] = entry
+        self._save_index(index)
+        metrics.observe("model_store.import_seconds", time.perf_counter() - start)
+        return entry
+
+    def import_from_hub(self, name, allow_download=False):
+        """
+        Import a faster-whisper model from the Hugging Face cache
+
+        Args:
+            name (str): Model size or repository id, e.g. "base" or "Systran/faster-whisper-small"
+            allow_download (bool): Download when it is not cached yet; otherwise only the local cache is used
+
+        Returns:
+            dict: The new index entry
+        """
+        from faster_whisper.utils import download_model
+        path = download_model(name, local_files_only=not allow_download)
+        return self.import_model(path, name=name.split("/")[-1] if "/" in name else name, origin=f"hub:{name}")
+
+    def annotate(self, name, **fields):
+        """Add fields (e.g. evaluation=...) to a stored model's index entry"""
+        index = self.load_index()
+        if name not in index:
+            raise ModelNotFoundError(f"Model '{name}' is not in the local model store ({self.directory})")
+        index[name].update(fields)
+        self._save_index(index)
+        return index[name]
+
+    def fastest(self, max_wer=None):
+        """
+        Name of the evaluated model with the lowest real-time factor
+
+        Args:
+            max_wer (float): Only consider models whose measured WER is at most this
+
+        Returns:
+            str | None: None if no evaluated model qualifies
+        """
+        candidates = [
+            (entry["evaluation"]["rtf"], name) for name, entry in self.load_index().items()
+            if entry.get("evaluation", {}).get("rtf") is not None
+            and (max_wer is None or entry["evaluation"]["wer"] <= max_wer)
+        ]
+        return min(candidates)[1] if candidates else None
+
+    def remove(self, name):
+        index = self.load_index()
+        entry = index.pop(name, None)
+        if entry is None:
+            return False
+        shutil.rmtree(self._path(entry), ignore_errors=True)
+        self._save_index(index)
+        return True
+
+
+def resolve_model(config):
+    """
+    Path to pass to WhisperModel for config["model_size"], resolved locally
+
+    A model_size that is already a directory is used as is. Otherwise the store
+    is consulted; a model missing from it is imported from the Hugging Face
+    cache if it was downloaded there before (no network). Only with
+    `model_store.offline` set to false may a missing model be downloaded, and it
+    is then imported so later loads are local.
+
+    Returns:
+        str: Local model directory
+
+    Raises:
+        ModelNotFoundError: The model is not available locally and offline mode is on
+    """
+    name = config["model_size"]
+    if os.path.isdir(name):
+        return name
+    store_settings = settings(config)
+    store = ModelStore(store_settings["directory"])
+    path = store.resolve(name, verify=store_settings["verify"])
+    if path is not None:
+        metrics.incr("model_store.hits", model=name)
+        return path
+    try:
+        store.import_from_hub(name)
+        print(f"Imported model '{name}' from the Hugging Face cache into {store.directory}")
+    except Exception:
+        if store_settings["offline"]:
+            metrics.incr("model_store.misses", model=name)
+            raise ModelNotFoundError(
+                f"Model '{name}' is not in the local model store ({store.directory}). "
+                f"Import it with: python scripts/manage_models.py import --hub {name} --download"
+            )
+        print(f"Model '{name}' not found locally, downloading (model_store.offline is false)")
+        store.import_from_hub(name, allow_download=True)
+    return store.resolve(name, verify="none")
@@ -0,0 +1,70 @@
+import io
+import numpy as np
+from scipy.io import wavfile
+from scipy.signal import resample_poly
+from math import gcd
+
+WHISPER_SAMPLE_RATE = 16000  # faster-whisper expects 16 kHz mono float32 arrays
+
+
+def to_model_input(audio, sample_rate):
+    """
+    Convert an audio array to the format faster-whisper accepts directly
+
+    Args:
+        audio (np.ndarray): Samples, shape (n,) or (n, channels), int16/int32/float
+        sample_rate (int): Sample rate of `audio`
+
+    Returns:
+        np.ndarray: Mono float32 samples in [-1, 1] at 16 kHz
+    """
+    audio = np.asarray(audio)
+    if audio.dtype == np.int16:
+        audio = audio.astype(np.float32) / 32768.0
+    elif audio.dtype == np.int32:
+        audio = audio.astype(np.float32) / 2147483648.0
+    elif audio.dtype == np.uint8:
+        audio = (audio.astype(np.float32) - 128.0) / 128.0
+    else:
+        audio = audio.astype(np.float32, copy=False)
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+    if sample_rate != WHISPER_SAMPLE_RATE:
+        divisor = gcd(int(sample_rate), WHISPER_SAMPLE_RATE)
+        audio = resample_poly(audio, WHISPER_SAMPLE_RATE // divisor, int(sample_rate) // divisor).astype(np.float32)
+    return np.ascontiguousarray(audio)
+
+
+def decode_pcm(data, sample_rate=WHISPER_SAMPLE_RATE, channels=1, dtype="int16"):
+    """
+    Decode raw interleaved PCM bytes
+
+    Args:
+        data (bytes): Raw PCM bytes
+        sample_rate (int): Sample rate of the PCM data
+        channels (int): Number of interleaved channels
+        dtype (str): Sample format, "int16" or "float32"
+
+    Returns:
+        np.ndarray: Mono float32 samples at 16 kHz
+    """
+    samples = np.frombuffer(data, dtype=np.dtype(dtype))
+    if channels > 1:
+        samples = samples[:len(samples) - len(samples) % channels].reshape(-1, channels)
+    return to_model_input(samples, sample_rate)
+
+
+def decode_wav(data):
+    """
+    Decode a WAV file held in memory
+
+    Returns:
+        np.ndarray: Mono float32 samples at 16 kHz
+    """
+    sample_rate, samples = wavfile.read(io.BytesIO(data))
+    return to_model_input(samples, sample_rate)
+
+
+def duration_seconds(audio):
+    """Duration of a 16 kHz model input array"""
+    return len(audio) / WHISPER_SAMPLE_RATE
@@ -0,0 +1,70 @@
+import time
+from src.audio.pcm import WHISPER_SAMPLE_RATE
+from src.audio.whisper_transcriber import transcribe_batch, load_whisper_config, BATCH_CLIP_MAX_SEC
+from src.batching import MicroBatcher
+from src.metrics import metrics
+
+
+class TranscriptionScheduler:
+    """
+    Dynamic micro-batching in front of the warm Whisper model
+
+    Clips submitted at about the same time (batch CLI, several service clients)
+    are grouped into one batched encoder pass instead of running `model.transcribe`
+    one after another. A batch is dispatched as soon as it is full or `max_wait_ms`
+    after its first clip arrived, so added latency is bounded.
+    """
+
+    def __init__(self, max_batch_size=8, max_wait_ms=50, max_queue=64):
+        """
+        Args:
+            max_batch_size (int): Maximum clips per batched pass
+            max_wait_ms (float): Maximum time a clip waits for the batch to fill
+            max_queue (int): Maximum queued clips before submit() raises QueueFullError
+        """
+        self._batcher = MicroBatcher(
+            "whisper", self._process,
+            max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, max_queue=max_queue,
+            # Long clips need the sequential long-form decoder, keep them out of batches
+            can_batch=lambda first, item: self._is_short(first[0]) and self._is_short(item[0])
+        )
+
+    @staticmethod
+    def _is_short(audio):
+        return len(audio) <= BATCH_CLIP_MAX_SEC * WHISPER_SAMPLE_RATE
+
+    def submit(self, audio, session=None):
+        """
+        Queue a 16 kHz mono float32 clip
+
+        Args:
+            audio (np.ndarray): Clip samples
+            session (str | None): Language pinning session of the caller
+
+        Returns:
+            Future: Resolves to (Transcribed text, detected language)
+        """
+        return self._batcher.submit((audio, session))
+
+    def transcribe(self, audio, timeout=None, session=None):
+        """Transcribe a clip through the scheduler, blocking until done"""
+        return self.submit(audio, session).result(timeout=timeout)
+
+    def qsize(self):
+        return self._batcher.qsize()
+
+    def _process(self, items):
+        clips = [audio for audio, _ in items]
+        start = time.perf_counter()
+        results = transcribe_batch(clips, load_whisper_config(), [session for _, session in items])
+        elapsed = time.perf_counter() - start
+        audio_sec = sum(len(clip) for clip in clips) / WHISPER_SAMPLE_RATE
+        metrics.observe("whisper.batch_size", len(clips))
+        metrics.incr("whisper.audio_seconds", audio_sec)
+        if elapsed > 0:
+            # Seconds of audio decoded per wall-clock second
+            metrics.observe("whisper.throughput", audio_sec / elapsed)
+        return results
+
+    def stop(self):
+        self._batcher.stop()
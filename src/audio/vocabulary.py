@@ -0,0 +1,280 @@
+import os
+import re
+import json
+import time
+import sys
+import hashlib
+import threading
+from collections import Counter
+
+DEFAULT_VOCABULARY = {
+    "enabled": False,
+    "project_dir": None,       # Project whose identifiers bias the transcription
+    "max_terms": 40,           # Terms kept in the prompt
+    "max_prompt_tokens": 120,  # Whisper allows at most 223 prompt tokens
+    "refresh_interval": 60,    # Seconds between incremental rescans
+    "mode": "initial_prompt",  # "initial_prompt" (pre-tokenized, first window) or "hotwords" (every window)
+    "index_dir": os.path.join("config", "vocabulary")  # Not under cache/, the GUI empties that on exit
+}
+
+SOURCE_EXTENSIONS = {
+    ".py", ".js", ".jsx", ".ts", ".tsx", ".go", ".rs", ".java", ".kt", ".c", ".h", ".cc", ".cpp", ".hpp",
+    ".cs", ".rb", ".php", ".swift", ".scala", ".lua", ".sh", ".sql", ".vue", ".svelte"
+}
+SKIP_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "venv", ".venv", "env", "__pycache__", "build", "dist",
+    "target", ".idea", ".vscode", ".mypy_cache", ".pytest_cache", ".tox", "vendor", "cache"
+}
+MAX_FILES = 5000
+MAX_FILE_BYTES = 512 * 1024
+
+IDENTIFIER_RE = re.compile(r"\b[A-Za-z_][A-Za-z0-9_]{2,}\b")
+DEFINITION_RE = re.compile(
+    r"\b(?:def|class|function|func|fn|struct|interface|enum|trait|type|impl)\s+([A-Za-z_][A-Za-z0-9_]*)"
+)
+IMPORT_RE = re.compile(
+    r"(?:^|\n)\s*(?:from|import|use)\s+([A-Za-z_][A-Za-z0-9_]*)|require\(\s*['\"]([A-Za-z@][\w\-/]*)['\"]"
+)
+# Words Whisper already spells correctly; biasing towards them only wastes prompt tokens
+COMMON_WORDS = {
+    "self", "this", "true", "false", "none", "null", "return", "import", "from", "class", "def", "function",
+    "const", "let", "var", "for", "while", "if", "else", "elif", "try", "except", "catch", "finally", "with",
+    "and", "not", "the", "int", "str", "float", "bool", "list", "dict", "set", "tuple", "string", "number",
+    "void", "public", "private", "static", "new", "async", "await", "yield", "pass", "break", "continue",
+    "print", "len", "range", "type", "args", "kwargs", "value", "values", "key", "keys", "item", "items",
+    "data", "result", "name", "path", "file", "text", "index", "default", "config", "error", "cls",
+    "get", "put", "post", "init", "main", "test", "tests", "undefined", "export", "package", "struct",
+    "impl", "use", "mod", "pub", "enum", "interface", "extends", "implements", "lambda", "raise",
+    "assert", "global", "del", "case", "switch", "throw", "throws", "super", "object", "any", "all",
+    "src", "lib", "app", "utils", "util", "common", "core",
+}
+# Standard library modules are common words to Whisper, only third-party libraries are kept
+STDLIB_MODULES = set(getattr(sys, "stdlib_module_names", ()))
+DEFINITION_WEIGHT = 5
+IMPORT_WEIGHT = 4
+
+
+def extract_terms(text):
+    """
+    Extract weighted vocabulary terms from source code
+
+    Definitions and imported libraries weigh more than plain identifier uses.
+
+    Returns:
+        tuple: (Counter term -> weight, set of imported library names)
+    """
+    terms = Counter()
+    libraries = set()
+    for term in IDENTIFIER_RE.findall(text):
+        if term.lower() not in COMMON_WORDS and not term.startswith("__"):
+            terms[term] += 1
+    for term in DEFINITION_RE.findall(text):
+        if term.lower() not in COMMON_WORDS and not term.startswith("__"):
+            terms[term] += DEFINITION_WEIGHT
+    for module, package in IMPORT_RE.findall(text):
+        term = module or package.split("/")[-1]
+        if term and term.lower() not in COMMON_WORDS and term not in STDLIB_MODULES:
+            terms[term] += IMPORT_WEIGHT
+            libraries.add(term)
+    return terms, libraries
+
+
+def _is_distinctive(term):
+    # CamelCase, snake_case or digits - spellings Whisper would not produce by itself
+    return any(c.isupper() for c in term[1:]) or "_" in term.strip("_") or any(c.isdigit() for c in term)
+
+
+class VocabularyIndex:
+    """
+    Incrementally maintained ranking of identifiers and library names of a project
+
+    Per-file term counts are stored in `index_dir` together with the file mtime,
+    so a rescan only reads files that changed since the last scan.
+    """
+
+    def __init__(self, project_dir, index_dir=DEFAULT_VOCABULARY["index_dir"]):
+        self.project_dir = os.path.abspath(project_dir)
+        digest = hashlib.sha1(self.project_dir.encode("utf-8")).hexdigest()[:12]
+        self.index_dir = index_dir
+        self.index_path = os.path.join(index_dir, f"{digest}.json")
+        self._files = {}  # path -> {"mtime": float, "terms": {term: weight}, "libraries": [imported names]}
+        self._ranking = []
+        self.scanned_at = 0.0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self._files = json.load(f).get("files", {})
+            self._rank()
+        except Exception as e:
+            print(f"Failed to load vocabulary index: {e}")
+            self._files = {}
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+            with open(self.index_path, "w", encoding="utf-8") as f:
+                json.dump({"project_dir": self.project_dir, "files": self._files}, f)
+        except Exception as e:
+            print(f"Failed to save vocabulary index: {e}")
+
+    def _source_files(self):
+        count = 0
+        for root, dirs, files in os.walk(self.project_dir):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith(".")]
+            for filename in files:
+                if os.path.splitext(filename)[1].lower() in SOURCE_EXTENSIONS:
+                    yield os.path.join(root, filename)
+                    count += 1
+                    if count >= MAX_FILES:
+                        return
+
+    def refresh(self):
+        """
+        Rescan the project, re-reading only new or modified files
+
+        Returns:
+            bool: Whether the ranking changed
+        """
+        seen = set()
+        changed = False
+        for path in self._source_files():
+            seen.add(path)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            cached = self._files.get(path)
+            if cached and cached["mtime"] == stat.st_mtime:
+                continue
+            terms, libraries = {}, set()
+            if stat.st_size <= MAX_FILE_BYTES:
+                try:
+                    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                        terms, libraries = extract_terms(f.read())
+                except OSError:
+                    continue
+            self._files[path] = {"mtime": stat.st_mtime, "terms": dict(terms), "libraries": sorted(libraries)}
+            changed = True
+        for path in [p for p in self._files if p not in seen]:
+            del self._files[path]
+            changed = True
+        self.scanned_at = time.time()
+        if changed:
+            self._rank()
+            self.save()
+        return changed
+
+    def _rank(self):
+        weights = Counter()
+        spread = Counter()
+        libraries = set()
+        for entry in self._files.values():
+            weights.update(entry["terms"])
+            spread.update(entry["terms"].keys())
+            libraries.update(entry.get("libraries", ()))
+        # Terms used across many files are the project's core vocabulary
+        scored = [(weights[t] * (1 + spread[t]), t) for t in weights if t in libraries or _is_distinctive(t)]
+        scored.sort(reverse=True)
+        self._ranking = [t for _, t in scored]
+
+    def top_terms(self, limit):
+        return self._ranking[:limit]
+
+
+class VocabularyBias:
+    """
+    Whisper prompt built from the project vocabulary, with cached tokenization
+
+    The prompt and its token ids only change when the index ranking changes, so
+    transcription calls reuse the same token list instead of re-encoding text.
+    Rescans run on a background thread at most every `refresh_interval` seconds.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = None
+        self._refreshing = False
+        self._prompt_cache = {}  # (project_dir, terms, tokenizer id, max tokens) -> token ids
+
+    @staticmethod
+    def settings(config):
+        settings = dict(DEFAULT_VOCABULARY)
+        settings.update(config.get("vocabulary") or {})
+        return settings
+
+    def _get_index(self, project_dir, index_dir):
+        with self._lock:
+            if (self._index is None or self._index.project_dir != os.path.abspath(project_dir)
+                    or self._index.index_dir != index_dir):
+                self._index = VocabularyIndex(project_dir, index_dir)
+                self._prompt_cache.clear()
+            return self._index
+
+    def _maybe_refresh(self, index, interval):
+        with self._lock:
+            if self._refreshing or time.time() - index.scanned_at < interval:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                index.refresh()
+            except Exception as e:
+                print(f"Vocabulary rescan failed: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def terms(self, config):
+        """Ranked terms for the configured project, or [] when disabled"""
+        settings = self.settings(config)
+        if not settings["enabled"] or not settings["project_dir"] or not os.path.isdir(settings["project_dir"]):
+            return []
+        index = self._get_index(settings["project_dir"], settings["index_dir"])
+        self._maybe_refresh(index, settings["refresh_interval"])
+        return index.top_terms(settings["max_terms"])
+
+    def transcribe_kwargs(self, config, model, batched=False):
+        """
+        Extra model.transcribe keyword arguments biasing towards the project vocabulary
+
+        Args:
+            config (dict): Whisper configuration
+            model (WhisperModel): Model whose tokenizer encodes the prompt
+            batched (bool): For BatchedInferencePipeline, which only accepts a text initial_prompt
+
+        Returns:
+            dict: {"initial_prompt": [token ids]} or {"hotwords": str}, empty when disabled
+        """
+        terms = self.terms(config)
+        if not terms:
+            return {}
+        settings = self.settings(config)
+        key = (self._index.project_dir, tuple(terms), id(model.hf_tokenizer), settings["max_prompt_tokens"])
+        cached = self._prompt_cache.get(key)
+        if cached is None:
+            # Same encoding faster-whisper applies to a string initial_prompt
+            tokens = model.hf_tokenizer.encode(" " + ", ".join(terms), add_special_tokens=False).ids
+            tokens = tokens[:settings["max_prompt_tokens"]]
+            # Text forms get the same cap, a batched prompt over the limit is an error
+            cached = (tokens, model.hf_tokenizer.decode(tokens).strip())
+            with self._lock:
+                if len(self._prompt_cache) > 16:
+                    self._prompt_cache.clear()
+                self._prompt_cache[key] = cached
+        tokens, text = cached
+        if settings["mode"] == "hotwords":
+            return {"hotwords": text}
+        if batched:
+            return {"initial_prompt": text}
+        return {"initial_prompt": tokens}
+
+
+# Process-wide vocabulary bias shared by all transcription paths
+vocabulary_bias = VocabularyBias()
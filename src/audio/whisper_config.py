@@ -0,0 +1,86 @@
+import json
+import os
+
+
+def load_whisper_config():
+    """
+    Load whisper configuration file
+    
+    Returns:
+        dict: Configuration dictionary
+    """
+    config_path = os.path.join("config", "whisper_config.json")
+    default_config = {
+        "device": "cpu",
+        "compute_type": "int8",
+        "model_size": "base",
+        "beam_size": 5,
+        "language": None,
+        "task": "transcribe",
+        "vad_filter": True,
+        "vad_parameters": {
+            "min_silence_duration_ms": 500
+        },
+        "cpu_threads": "auto",
+        "num_workers": "auto",
+        "reserved_cores": 2,
+        "cpu_affinity": None,
+        "language_pinning": {
+            "enabled": True,
+            "confidence_threshold": 0.8,
+            "recheck_logprob": -1.0,
+            "recheck_after": 2
+        },
+        "vocabulary": {
+            "enabled": False,
+            "project_dir": None
+        },
+        "longform": {
+            "enabled": True,
+            "min_duration_sec": 600,
+            "window_sec": 60,
+            "overlap_sec": 4,
+            "parallel_workers": "auto"
+        },
+        "silence_compaction": {
+            "enabled": True,
+            "min_pause_ms": 700,
+            "keep_gap_ms": 250
+        },
+        "worker": {
+            "enabled": True,
+            "slots": 2,
+            "slot_seconds": 120,
+            "hang_timeout": 300
+        },
+        "model_store": {
+            "directory": "models",
+            "offline": True,
+            "verify": "size"
+        },
+        "hands_free": {
+            "threshold": 0.01,
+            "noise_ratio": 3.0,
+            "end_ms": 800,
+            "preroll_ms": 300,
+            "min_speech_ms": 300,
+            "max_utterance_sec": 60,
+            "poll_ms": 100
+        }
+    }
+    
+    if os.path.exists(config_path):
+        try:
+            with open(config_path, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+                # Merge default config and user config
+                for key, value in default_config.items():
+                    if key not in config:
+                        config[key] = value
+                return config
+        except Exception as e:
+            print(f"Failed to read config file: {e}, using default config")
+            return default_config
+    else:
+        print("Config file not found, using default config")
+        return default_config
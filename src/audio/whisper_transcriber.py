@@ -1,54 +1,168 @@
-from faster_whisper import WhisperModel
+from faster_whisper import WhisperModel, BatchedInferencePipeline
 import os
-import json
+import threading
+import bisect
+import numpy as np
+from src.audio.cpu_tuning import plan_threads, pinned_thread
+from src.audio.language import language_manager
+from src.audio.vocabulary import vocabulary_bias
+from src.metrics import metrics
+from src.audio import longform
+from src.audio import compaction
+from src.audio.model_store import resolve_model
+from src.audio.pcm import WHISPER_SAMPLE_RATE
+# Re-exported, most callers import the config loader from here
+from src.audio.whisper_config import load_whisper_config
 
-def load_whisper_config():
+BATCH_CLIP_MAX_SEC = 30  # Longest clip that fits a single batched encoder window
+
+# Warm model shared by every caller in the process, keyed by its construction parameters
+_model_lock = threading.Lock()
+_model_key = None
+_model = None
+
+def get_whisper_model(config):
     """
-    Load whisper configuration file
+    Get the warm Whisper model for a configuration, loading it on first use
+    
+    Only the most recently used model is kept, so switching settings does not
+    accumulate models in memory.
+    
+    Args:
+        config (dict): Whisper configuration
     
     Returns:
-        dict: Configuration dictionary
+        WhisperModel: Loaded model
     """
-    config_path = os.path.join("config", "whisper_config.json")
-    default_config = {
-        "device": "cpu",
-        "compute_type": "int8",
-        "model_size": "base",
-        "beam_size": 5,
-        "language": None,
-        "task": "transcribe",
-        "vad_filter": True,
-        "vad_parameters": {
-            "min_silence_duration_ms": 500
-        }
+    global _model_key, _model
+    cpu_threads, num_workers, affinity = plan_threads(config)
+    key = (config["model_size"], config["device"], config["compute_type"],
+           cpu_threads, num_workers, tuple(affinity or ()))
+    with _model_lock:
+        if _model is None or _model_key != key:
+            print(f"Loading Whisper model: {config['model_size']}")
+            print(f"Using device: {config['device']}")
+            print(f"Compute type: {config['compute_type']}")
+            print(f"CPU threads: {cpu_threads}, workers: {num_workers}"
+                  + (f", pinned to CPUs {affinity}" if affinity else ""))
+            # Loaded from the local model store only, never from the network;
+            # the compute pool is created here, so it inherits the pinned affinity
+            model_path = resolve_model(config)
+            with pinned_thread(affinity):
+                _model = WhisperModel(
+                    model_path,
+                    device=config["device"], 
+                    compute_type=config["compute_type"],
+                    cpu_threads=cpu_threads,
+                    num_workers=num_workers,
+                    local_files_only=True
+                )
+            _model_key = key
+        return _model
+
+def build_transcribe_kwargs(config, model=None, batched=False):
+    """
+    Assemble model.transcribe keyword arguments from configuration
+    
+    Args:
+        config (dict): Whisper configuration
+        model (WhisperModel): Loaded model, enables project vocabulary biasing
+        batched (bool): Arguments are for BatchedInferencePipeline
+    
+    Returns:
+        dict: Keyword arguments for WhisperModel.transcribe
+    """
+    transcribe_kwargs = {
+        "beam_size": config["beam_size"],
+        "task": config["task"]
     }
     
-    if os.path.exists(config_path):
-        try:
-            with open(config_path, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-                # Merge default config and user config
-                for key, value in default_config.items():
-                    if key not in config:
-                        config[key] = value
-                return config
-        except Exception as e:
-            print(f"Failed to read config file: {e}, using default config")
-            return default_config
-    else:
-        print("Config file not found, using default config")
-        return default_config
+    # If language is specified, add to parameters
+    if config["language"]:
+        transcribe_kwargs["language"] = config["language"]
+    
+    # If VAD filtering is enabled, add to parameters
+    if config["vad_filter"]:
+        transcribe_kwargs["vad_filter"] = True
+        transcribe_kwargs["vad_parameters"] = config["vad_parameters"]
+    
+    # Bias decoding towards identifiers and library names of the configured project
+    if model is not None:
+        transcribe_kwargs.update(vocabulary_bias.transcribe_kwargs(config, model, batched))
+    return transcribe_kwargs
 
-def transcribe_audio(audio_path, model_size=None):
+class TranscriptionStream:
     """
-    Transcribe audio file using faster-whisper
+    Segments of a transcription, yielded as faster-whisper decodes them
+    
+    Each segment is a dict with start/end (seconds), text, avg_logprob,
+    confidence (exp(avg_logprob)) and no_speech_prob. The UI and LLM stages
+    can start on the first segments while later ones are still decoding;
+    `text()` drains the rest and assembles the transcript in one join.
+    """
+    
+    def __init__(self, segments, info, on_complete=None, time_map=None):
+        self._segments = iter(segments)
+        self.info = info
+        self._on_complete = on_complete
+        # Maps times of compacted audio back to the original recording
+        self.time_map = time_map
+        self._texts = []
+        self._avg_logprobs = []
+        self.done = False
+    
+    @property
+    def language(self):
+        return self.info.language
+    
+    @property
+    def language_probability(self):
+        return self.info.language_probability
+    
+    def __iter__(self):
+        if self.done:
+            return
+        for segment in self._segments:
+            text = segment.text.strip()
+            self._avg_logprobs.append(segment.avg_logprob)
+            if text:
+                self._texts.append(text)
+            start, end = segment.start, segment.end
+            if self.time_map is not None:
+                start, end = self.time_map.to_original(start), self.time_map.to_original(end)
+            yield {
+                "start": start,
+                "end": end,
+                "text": text,
+                "avg_logprob": segment.avg_logprob,
+                "confidence": float(min(1.0, np.exp(segment.avg_logprob))),
+                "no_speech_prob": segment.no_speech_prob,
+            }
+        self.done = True
+        if self._on_complete:
+            self._on_complete(self._avg_logprobs)
+    
+    def partial_text(self):
+        """Text of the segments decoded so far"""
+        return " ".join(self._texts)
+    
+    def text(self):
+        """Decode any remaining segments and return the full transcript"""
+        for _ in self:
+            pass
+        return " ".join(self._texts)
+
+def stream_transcription(audio_path, model_size=None, session="default"):
+    """
+    Start transcribing and return a stream of segments as they are decoded
     
     Args:
-        audio_path (str): Audio file path
+        audio_path (str | np.ndarray): Audio file path, or 16 kHz mono float32 samples
         model_size (str): Model size ("tiny", "base", "small", "medium", "large")
+        session (str | None): Language pinning session, None to detect on every call
     
     Returns:
-        tuple: (Transcribed text, detected language)
+        TranscriptionStream: Iterable of segment dicts, with the detected language
     """
     # Load configuration
     config = load_whisper_config()
@@ -57,46 +171,155 @@ def transcribe_audio(audio_path, model_size=None):
     if model_size:
         config["model_size"] = model_size
     
-    print(f"Loading Whisper model: {config['model_size']}")
-    print(f"Using device: {config['device']}")
-    print(f"Compute type: {config['compute_type']}")
+    model = get_whisper_model(config)
     
-    # Load model (will download on first run)
-    model = WhisperModel(
-        config["model_size"], 
-        device=config["device"], 
-        compute_type=config["compute_type"]
-    )
+    if isinstance(audio_path, str):
+        print(f"Starting transcription of audio file: {audio_path}")
     
-    print(f"Starting transcription of audio file: {audio_path}")
+    # Shorten long thinking pauses in in-memory clips, decode cost scales with length
+    time_map = None
+    compaction_settings = compaction.settings(config)
+    if not isinstance(audio_path, str) and compaction_settings["enabled"]:
+        audio_path, time_map = compaction.compact_silence(
+            audio_path, WHISPER_SAMPLE_RATE, compaction_settings["min_pause_ms"], compaction_settings["keep_gap_ms"],
+            compaction_settings["frame_ms"], compaction_settings["threshold"], compaction_settings["noise_ratio"]
+        )
+        if time_map.removed_seconds > 0:
+            print(f"Removed {time_map.removed_seconds:.1f} s of pauses before decoding")
+            metrics.incr("whisper.silence_removed_seconds", time_map.removed_seconds)
     
-    # Prepare transcription parameters
-    transcribe_kwargs = {
-        "beam_size": config["beam_size"],
-        "task": config["task"]
-    }
+    # Reuse the session's pinned language to skip language detection
+    kwargs = build_transcribe_kwargs(config, model)
+    language = language_manager.decode_language(session, config)
+    if language:
+        kwargs["language"] = language
     
-    # If language is specified, add to parameters
-    if config["language"]:
-        transcribe_kwargs["language"] = config["language"]
+    # Segments are decoded lazily while the stream is iterated
+    segments, info = None, None
+    longform_settings = longform.settings(config)
+    if isinstance(audio_path, str) and longform_settings["enabled"]:
+        duration = longform.file_duration(audio_path)
+        if duration is not None and duration >= longform_settings["min_duration_sec"]:
+            # Long recordings are memory-mapped and decoded in windows or parallel chunks
+            print(f"Long recording ({duration / 60:.1f} min)")
+            segments, info = longform.transcribe_file(
+                audio_path, model, kwargs, longform_settings, plan_threads(config)[1]
+            )
+    if segments is None:
+        segments, info = model.transcribe(audio_path, **kwargs)
     
-    # If VAD filtering is enabled, add to parameters
-    if config["vad_filter"]:
-        transcribe_kwargs["vad_filter"] = True
-        transcribe_kwargs["vad_parameters"] = config["vad_parameters"]
+    def on_complete(avg_logprobs):
+        language_manager.observe(session, config, info.language, info.language_probability, avg_logprobs)
     
-    # Transcribe audio
-    segments, info = model.transcribe(audio_path, **transcribe_kwargs)
+    return TranscriptionStream(segments, info, on_complete, time_map)
+
+def transcribe_audio(audio_path, model_size=None, session="default"):
+    """
+    Transcribe audio file using faster-whisper
     
-    # Collect transcription results
-    transcript = ""
-    for segment in segments:
-        transcript += segment.text + " "
+    Args:
+        audio_path (str | np.ndarray): Audio file path, or 16 kHz mono float32 samples
+        model_size (str): Model size ("tiny", "base", "small", "medium", "large")
+        session (str | None): Language pinning session, None to detect on every call
+    
+    Returns:
+        tuple: (Transcribed text, detected language)
+    """
+    stream = stream_transcription(audio_path, model_size, session)
+    transcript = stream.text()
     
     print(f"Transcription completed!")
-    print(f"Detected language: {info.language} (confidence: {info.language_probability:.2f})")
+    print(f"Detected language: {stream.language} (confidence: {stream.language_probability:.2f})")
+    
+    return transcript, stream.language
+
+def transcribe_batch(audios, config=None, sessions=None):
+    """
+    Transcribe several short clips with batched encoder/decoder passes
+    
+    The clips are laid out back to back and handed to faster-whisper's batched
+    pipeline with one clip_timestamps entry per clip, so each clip is one batch
+    element. Falls back to sequential decoding for a single clip or when a clip
+    is longer than 30 seconds.
+    
+    Args:
+        audios (list[np.ndarray]): 16 kHz mono float32 clips
+        config (dict): Whisper configuration, loaded from file if None
+        sessions (list[str | None]): Language pinning session per clip
+    
+    Returns:
+        list[tuple]: (Transcribed text, detected language) per clip, in input order;
+            the language is None for unpinned clips of a mixed-language batch
+    """
+    if config is None:
+        config = load_whisper_config()
+    if sessions is None:
+        sessions = [None] * len(audios)
+    model = get_whisper_model(config)
+    sample_rate = model.feature_extractor.sampling_rate
+    languages = [language_manager.decode_language(session, config) for session in sessions]
+    
+    if (len(audios) < 2
+            or any(len(a) > BATCH_CLIP_MAX_SEC * sample_rate for a in audios)):
+        results = []
+        for audio, session, language in zip(audios, sessions, languages):
+            kwargs = build_transcribe_kwargs(config, model)
+            if language:
+                kwargs["language"] = language
+            segments, info = model.transcribe(audio, **kwargs)
+            segments = list(segments)
+            language_manager.observe(session, config, info.language, info.language_probability,
+                                     [s.avg_logprob for s in segments])
+            results.append((" ".join(s.text.strip() for s in segments).strip(), info.language))
+        return results
     
-    return transcript.strip(), info.language
+    # segment.seek is the clip offset truncated to whole feature frames, and float
+    # rounding can put it one frame early. Padding every clip to at least two whole
+    # frames keeps clip starts on frame boundaries two or more frames apart, so a
+    # segment belongs to the last clip starting at or before seek + 1.
+    hop = model.feature_extractor.hop_length
+    start_frames, clip_timestamps, padded, offset = [], [], [], 0
+    for audio in audios:
+        start_frames.append(offset // hop)
+        clip_timestamps.append({"start": offset / sample_rate, "end": (offset + len(audio)) / sample_rate})
+        padding = max(2 * hop - len(audio), -len(audio) % hop)
+        padded.append(np.pad(audio.astype(np.float32, copy=False), (0, padding)))
+        offset += len(padded[-1])
+    
+    kwargs = build_transcribe_kwargs(config, model, batched=True)
+    kwargs.pop("vad_filter", None)
+    kwargs.pop("vad_parameters", None)
+    if languages[0] and all(language == languages[0] for language in languages):
+        # Every clip is pinned to the same language, skip detection for the batch
+        kwargs["language"] = languages[0]
+    if "language" not in kwargs:
+        # Detect the language per batch element instead of once for the whole batch
+        kwargs["multilingual"] = True
+    pipeline = BatchedInferencePipeline(model)
+    segments, info = pipeline.transcribe(
+        np.concatenate(padded),
+        clip_timestamps=clip_timestamps,
+        vad_filter=False,
+        batch_size=len(audios),
+        **kwargs
+    )
+    
+    texts = [[] for _ in audios]
+    logprobs = [[] for _ in audios]
+    for segment in segments:
+        index = max(0, bisect.bisect_right(start_frames, segment.seek + 1) - 1)
+        texts[index].append(segment.text.strip())
+        logprobs[index].append(segment.avg_logprob)
+    for session, language, clip_logprobs in zip(sessions, languages, logprobs):
+        # Per-clip language probabilities are not reported by the batched pipeline,
+        # so batches only re-check existing pins; new pins come from single decodes
+        if language:
+            language_manager.observe(session, config, language, 1.0, clip_logprobs)
+    if kwargs.get("multilingual"):
+        # info.language is detected once for the whole batch and says nothing about
+        # a particular clip, report unpinned clips as unknown instead
+        return [(" ".join(parts).strip(), language) for parts, language in zip(texts, languages)]
+    return [(" ".join(parts).strip(), language or info.language) for parts, language in zip(texts, languages)]
 
 def main():
     print("=== Talkie-Codie Speech Transcription Tool ===")
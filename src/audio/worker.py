@@ -0,0 +1,370 @@
+import itertools
+import multiprocessing
+import queue
+import threading
+from multiprocessing import shared_memory
+import numpy as np
+from src.audio.pcm import WHISPER_SAMPLE_RATE
+from src.metrics import metrics
+
+WORKER_DEFAULTS = {
+    "enabled": True,
+    "slots": 2,            # Clips that can be queued in shared memory at once
+    "slot_seconds": 120,   # Longest in-memory clip, longer audio must be passed as a file path
+    "hang_timeout": 300    # Seconds without a free slot or any progress on a job before the worker is restarted
+}
+
+
+def settings(config):
+    merged = dict(WORKER_DEFAULTS)
+    merged.update(config.get("worker") or {})
+    return merged
+
+
+def _worker_main(conn, shm_name, slots, slot_samples):
+    """
+    Entry point of the worker process
+
+    Attaches to the parent's shared-memory ring, warms the model and then
+    serves ("transcribe", job, payload) requests one at a time, answering with
+    info/segment/done/error messages on the same pipe.
+    """
+    # Imported here so the parent process never loads CTranslate2 through this module
+    from src.audio.whisper_transcriber import get_whisper_model, load_whisper_config, stream_transcription
+
+    shm = shared_memory.SharedMemory(name=shm_name)
+    ring = np.ndarray((slots, slot_samples), dtype=np.float32, buffer=shm.buf)
+    try:
+        get_whisper_model(load_whisper_config())
+        conn.send(("ready", None, None))
+    except Exception as e:
+        conn.send(("fatal", None, f"{type(e).__name__}: {e}"))
+        return
+
+    while True:
+        try:
+            kind, job, payload = conn.recv()
+        except (EOFError, OSError):
+            break
+        if kind == "stop":
+            break
+        if kind != "transcribe":
+            continue
+        # Decode straight from the shared slot, the parent keeps it reserved until "done"
+        source = payload["path"] or ring[payload["slot"], :payload["samples"]]
+        try:
+            stream = stream_transcription(source, payload["model_size"], payload["session"])
+            conn.send(("info", job, (stream.language, stream.language_probability)))
+            for segment in stream:
+                conn.send(("segment", job, segment))
+            conn.send(("done", job, None))
+        except Exception as e:
+            conn.send(("error", job, f"{type(e).__name__}: {e}"))
+        finally:
+            source = stream = None
+    conn.close()
+
+
+class RemoteTranscription:
+    """
+    Client side of one transcription running in the worker process
+
+    Mirrors TranscriptionStream: iterating yields segment dicts as the worker
+    decodes them, `partial_text()`/`text()` assemble the transcript and
+    `language` waits for the worker's language detection. No message arriving
+    within `timeout` seconds means the worker hung on this job: `on_hang` is
+    called to restart it and a TimeoutError is raised.
+    """
+
+    def __init__(self, job_id, slot=None, process=None, timeout=None, on_hang=None):
+        self.job_id = job_id
+        self.slot = slot
+        self.process = process  # Worker process the job was sent to
+        self.timeout = timeout
+        self.on_hang = on_hang
+        self._messages = queue.Queue()
+        self._info = threading.Event()
+        self._language = None
+        self._language_probability = 0.0
+        self._texts = []
+        self.done = False
+
+    def _set_info(self, language, probability):
+        self._language, self._language_probability = language, probability
+        self._info.set()
+
+    def _put(self, kind, payload):
+        self._messages.put((kind, payload))
+        if kind in ("done", "error"):
+            # Unblock language waiters if the job ended before reporting info
+            self._info.set()
+
+    def _hung(self):
+        self.done = True
+        if self.on_hang is not None:
+            self.on_hang(self.process, self.timeout)
+        raise TimeoutError(f"ASR worker made no progress on the transcription for {self.timeout:.0f} s")
+
+    def _wait_info(self):
+        if not self._info.wait(self.timeout):
+            self._hung()
+
+    @property
+    def language(self):
+        self._wait_info()
+        return self._language
+
+    @property
+    def language_probability(self):
+        self._wait_info()
+        return self._language_probability
+
+    def __iter__(self):
+        while not self.done:
+            try:
+                kind, payload = self._messages.get(timeout=self.timeout)
+            except queue.Empty:
+                self._hung()
+            if kind == "segment":
+                if payload["text"]:
+                    self._texts.append(payload["text"])
+                yield payload
+            elif kind == "done":
+                self.done = True
+            else:
+                self.done = True
+                raise RuntimeError(f"ASR worker failed: {payload}")
+
+    def partial_text(self):
+        """Text of the segments received so far"""
+        return " ".join(self._texts)
+
+    def text(self):
+        """Wait for the remaining segments and return the full transcript"""
+        for _ in self:
+            pass
+        return " ".join(self._texts)
+
+
+class ASRWorker:
+    """
+    Long-lived Whisper worker process
+
+    Decoding runs outside the caller's process, so it neither competes with the
+    GUI thread for the GIL nor takes the app down if CTranslate2 crashes.
+    Audio is written into a ring of fixed-size shared-memory slots and only the
+    slot index crosses the pipe; segments come back as small dicts. A reader
+    thread routes replies to their RemoteTranscription, and a dead worker is
+    restarted on the next request after failing the jobs it was running. A
+    worker that cannot load the model is not restarted, every later request
+    fails with the load error until stop() is called (e.g. after the settings
+    changed).
+    """
+
+    def __init__(self, slots=2, slot_seconds=120, hang_timeout=300):
+        """
+        Args:
+            slots (int): Shared-memory slots, i.e. clips that can be queued at once
+            slot_seconds (float): Capacity of one slot in seconds of 16 kHz audio
+            hang_timeout (float): Seconds to wait for a free slot, or for the next message of a
+                running job, before restarting a hung worker
+        """
+        self.slots = slots
+        self.slot_samples = int(slot_seconds * WHISPER_SAMPLE_RATE)
+        self.hang_timeout = hang_timeout
+        self.ready = threading.Event()
+        self.restarts = 0
+        self.load_error = None
+        self._ctx = multiprocessing.get_context("spawn")  # Forking a Qt process is unsafe
+        self._shm = None
+        self._ring = None
+        self._free_slots = queue.Queue()
+        self._process = None
+        self._conn = None
+        self._jobs = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._started = False
+
+    def alive(self):
+        return self._process is not None and self._process.is_alive()
+
+    def start(self):
+        """Start (or restart) the worker process; the model loads in the background"""
+        with self._lock:
+            if self.alive():
+                return
+            if self.load_error is not None:
+                # Respawning would fail the same way on every request
+                raise RuntimeError(f"ASR worker cannot load the model: {self.load_error}")
+            if self._shm is None:
+                self._shm = shared_memory.SharedMemory(create=True, size=self.slots * self.slot_samples * 4)
+                self._ring = np.ndarray((self.slots, self.slot_samples), dtype=np.float32, buffer=self._shm.buf)
+                for slot in range(self.slots):
+                    self._free_slots.put(slot)
+            if self._started:
+                self.restarts += 1
+                metrics.incr("asr_worker.restarts")
+                print("Restarting ASR worker process")
+            self._started = True
+            self.ready.clear()
+            parent_conn, child_conn = self._ctx.Pipe()
+            self._process = self._ctx.Process(
+                target=_worker_main, args=(child_conn, self._shm.name, self.slots, self.slot_samples),
+                name="asr-worker", daemon=True
+            )
+            self._process.start()
+            child_conn.close()
+            self._conn = parent_conn
+            threading.Thread(target=self._read, args=(parent_conn, self._process), daemon=True).start()
+
+    def _read(self, conn, process):
+        while True:
+            try:
+                kind, job_id, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+            if kind == "ready":
+                self.ready.set()
+                continue
+            if kind == "fatal":
+                print(f"ASR worker failed to start: {payload}")
+                self.load_error = payload
+                metrics.incr("asr_worker.load_failures")
+                break
+            with self._lock:
+                job = self._jobs.get(job_id)
+                if kind in ("done", "error"):
+                    self._finish(job_id)
+            if job is None:
+                continue
+            if kind == "info":
+                job._set_info(*payload)
+            else:
+                job._put(kind, payload)
+        # Worker exited: fail whatever it was still working on
+        process.join(timeout=1)
+        with self._lock:
+            if self._process is process:
+                self._process = None
+            # Jobs already sent to a restarted worker are not affected
+            jobs = [job for job in self._jobs.values() if job.process is process]
+            for job in jobs:
+                self._finish(job.job_id)
+        reason = self.load_error or f"worker exited with code {process.exitcode}"
+        if jobs:
+            metrics.incr("asr_worker.crashes")
+            print(f"ASR worker stopped ({reason}), {len(jobs)} job(s) failed")
+        for job in jobs:
+            job._put("error", reason)
+
+    def _finish(self, job_id):
+        """Forget a job and return its slot (caller holds the lock)"""
+        job = self._jobs.pop(job_id, None)
+        if job is not None and job.slot is not None:
+            self._free_slots.put(job.slot)
+
+    def stream(self, audio, session="default", model_size=None, timeout=None):
+        """
+        Queue a transcription in the worker process
+
+        Args:
+            audio (str | np.ndarray): Audio file path, or 16 kHz mono float32 samples
+            session (str | None): Language pinning session
+            model_size (str): Override model_size from the config
+            timeout (float): Seconds to wait for a free shared-memory slot, defaults to hang_timeout
+
+        Returns:
+            RemoteTranscription: Iterable of segment dicts, with the detected language
+        """
+        self.start()
+        slot, samples, path = None, 0, None
+        if isinstance(audio, str):
+            path = audio
+        else:
+            samples = len(audio)
+            if samples > self.slot_samples:
+                raise ValueError(f"Clip of {samples / WHISPER_SAMPLE_RATE:.0f} s exceeds the worker slot size, "
+                                 f"pass a file path instead")
+            slot = self._acquire_slot(self.hang_timeout if timeout is None else timeout)
+            self._ring[slot, :samples] = audio
+
+        payload = {"slot": slot, "samples": samples, "path": path, "session": session, "model_size": model_size}
+        with self._lock:
+            job = RemoteTranscription(next(self._ids), slot, self._process, self.hang_timeout, self._restart_hung)
+            self._jobs[job.job_id] = job
+            try:
+                self._conn.send(("transcribe", job.job_id, payload))
+            except (OSError, ValueError) as e:
+                self._finish(job.job_id)
+                raise RuntimeError(f"ASR worker unavailable: {e}")
+        metrics.incr("asr_worker.jobs")
+        return job
+
+    def _acquire_slot(self, timeout):
+        """
+        Reserve a shared-memory slot
+
+        Slots stay reserved until their job is done, so none freeing up within
+        the timeout means the worker is stuck: it is killed, which fails the
+        jobs holding slots and releases them, and a fresh worker is started.
+        """
+        try:
+            return self._free_slots.get(timeout=timeout)
+        except queue.Empty:
+            pass
+        with self._lock:
+            process = self._process
+        if process is None:
+            raise TimeoutError("No free ASR worker slot")
+        self._kill_hung(process, timeout)
+        try:
+            # The reader thread frees the slots once it sees the process exit
+            slot = self._free_slots.get(timeout=5)
+        except queue.Empty:
+            raise TimeoutError("No free ASR worker slot")
+        self.start()
+        return slot
+
+    def _kill_hung(self, process, timeout):
+        """Kill a stuck worker; the reader thread fails its jobs and frees their slots"""
+        metrics.incr("asr_worker.hangs")
+        print(f"ASR worker made no progress for {timeout:.0f} s, restarting it")
+        process.kill()
+        process.join(5)
+
+    def _restart_hung(self, process, timeout):
+        """Called by a job that stopped receiving messages"""
+        with self._lock:
+            if process is None or process is not self._process:
+                return  # Already replaced, e.g. by another job that timed out
+        self._kill_hung(process, timeout)
+        try:
+            self.start()
+        except RuntimeError as e:
+            print(f"ASR worker restart failed: {e}")
+
+    def stop(self, timeout=5):
+        """Stop the worker process and release the shared memory"""
+        with self._lock:
+            process, conn = self._process, self._conn
+            self._process = None
+        if process is not None:
+            try:
+                conn.send(("stop", None, None))
+            except (OSError, ValueError):
+                pass
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+                process.join(1)
+        if conn is not None:
+            conn.close()
+        if self._shm is not None:
+            self._ring = None
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+            self._free_slots = queue.Queue()
+            self._started = False
+        self.load_error = None
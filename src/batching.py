@@ -0,0 +1,117 @@
+"""
+Request queue with dynamic micro-batching
+
+Callers submit single items and get a Future back; a worker thread groups
+pending items into batches of up to `max_batch_size`, waiting at most
+`max_wait_ms` after the first item so latency stays bounded, and hands each
+batch to a user supplied function.
+"""
+
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, List, Optional
+from src.metrics import metrics
+
+
+class QueueFullError(Exception):
+    """Raised when the request queue has reached its maximum size"""
+
+
+class MicroBatcher:
+    """Collect concurrently submitted items into batches processed by worker threads"""
+
+    def __init__(self, name: str, process_batch: Callable[[List[Any]], List[Any]],
+                 max_batch_size: int = 8, max_wait_ms: float = 20.0, max_queue: int = 64,
+                 workers: int = 1, can_batch: Optional[Callable[[Any, Any], bool]] = None):
+        """
+        Args:
+            name: Name used as metric label
+            process_batch: Function mapping a list of items to a list of results (same order).
+                It may return an Exception instance in place of a result to fail a single item.
+            max_batch_size: Maximum number of items per batch
+            max_wait_ms: Maximum time to wait for more items after the first one arrives
+            max_queue: Maximum number of pending items, submit() raises QueueFullError beyond it
+            workers: Number of worker threads processing batches
+            can_batch: Optional predicate (first_item, item) telling whether two items may share a batch
+        """
+        self.name = name
+        self.process_batch = process_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000.0
+        self.can_batch = can_batch
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._held: deque = deque()  # Items taken from the queue that did not fit the previous batch
+        self._stopped = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._run, name=f"{name}-batcher-{i}", daemon=True)
+            for i in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, item: Any) -> Future:
+        """Queue an item, returning a Future resolved with its result"""
+        future: Future = Future()
+        try:
+            self._queue.put_nowait((item, future, time.perf_counter()))
+        except queue.Full:
+            metrics.incr("batch.rejected", name=self.name)
+            raise QueueFullError(f"{self.name} queue is full")
+        metrics.observe("batch.queue_depth", self._queue.qsize(), name=self.name)
+        return future
+
+    def qsize(self) -> int:
+        return self._queue.qsize() + len(self._held)
+
+    def _next(self, timeout: Optional[float]):
+        try:
+            return self._held.popleft()
+        except IndexError:
+            pass
+        return self._queue.get(timeout=timeout) if timeout is None or timeout > 0 else self._queue.get_nowait()
+
+    def _collect(self) -> List[tuple]:
+        first = self._next(timeout=0.5)
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._next(timeout=remaining) if remaining > 0 else self._next(timeout=0)
+            except queue.Empty:
+                break
+            if self.can_batch and not self.can_batch(first[0], entry[0]):
+                self._held.append(entry)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                batch = self._collect()
+            except queue.Empty:
+                continue
+            started = time.perf_counter()
+            for _, _, queued_at in batch:
+                metrics.observe("batch.queue_wait", started - queued_at, name=self.name)
+            metrics.observe("batch.size", len(batch), name=self.name)
+            items = [entry[0] for entry in batch]
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                results = [e] * len(batch)
+            elapsed = time.perf_counter() - started
+            metrics.observe("batch.process_time", elapsed, name=self.name)
+            metrics.incr("batch.items", len(batch), name=self.name)
+            for (_, future, _), result in zip(batch, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stop(self):
+        self._stopped.set()
@@ -1,10 +1,55 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 import json
+import re
+import threading
+import time
+from src.llm.budget import TokenBudgetModel, estimate_tokens
+from src.llm.normalize import normalize_output
+from src.llm.prompts import PromptTemplate, templates
+from src.metrics import metrics
+
+_PACKED_REPHRASE_RE = re.compile(r'<REPHRASE\s+id\s*=\s*["\']?(\d+)["\']?\s*>(.*?)</REPHRASE>', re.IGNORECASE | re.DOTALL)
+# Body of the <SUMMARY> block, also when the closing tag was cut off
+_SUMMARY_RE = re.compile(r'<SUMMARY\s*>(.*?)(?:</SUMMARY\s*>|$)', re.IGNORECASE | re.DOTALL)
+
+class LLMRequestError(Exception):
+    """LLM request failure carrying enough detail to decide whether to retry"""
+    
+    def __init__(self, message: str, status_code: Optional[int] = None, retry_after: Optional[float] = None, retryable: Optional[bool] = None):
+        """
+        Args:
+            message: Error message
+            status_code: HTTP status code, None for network errors and timeouts
+            retry_after: Seconds the server asked us to wait (Retry-After header)
+            retryable: Override the default retry decision (network errors, 429 and 5xx are retryable)
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        if retryable is None:
+            retryable = status_code is None or status_code == 429 or status_code >= 500
+        self.retryable = retryable
+    
+    @classmethod
+    def from_request_exception(cls, message: str, error: Exception) -> "LLMRequestError":
+        """Build from a requests exception, keeping status code and Retry-After"""
+        response = getattr(error, "response", None)
+        if response is None:
+            return cls(message)
+        retry_after = None
+        try:
+            retry_after = float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+        return cls(message, status_code=response.status_code, retry_after=retry_after)
 
 class LLMProvider(ABC):
     """Base abstract class for LLM providers"""
     
+    # Whether generate() accepts a separate `system_prompt` kwarg
+    supports_system_prompt = False
+    
     def __init__(self, config: Dict[str, Any]):
         """
         Initialize LLM provider
@@ -14,6 +59,7 @@ class LLMProvider(ABC):
         """
         self.config = config
         self.name = self.__class__.__name__
+        self._local = threading.local()
     
     @abstractmethod
     def generate(self, prompt: str, **kwargs) -> str:
@@ -39,6 +85,51 @@ class LLMProvider(ABC):
         """
         pass
     
+    def health_check(self, timeout: Tuple[float, float] = (3.05, 5.0)) -> None:
+        """
+        Cheap reachability/authentication check, raises LLMRequestError on failure
+        
+        Providers override this with a model listing call; the default sends a
+        one-token completion.
+        
+        Args:
+            timeout: (connect, read) timeout in seconds
+        """
+        self.generate("ping", max_tokens=1, temperature=0, timeout=timeout)
+    
+    def _record_usage(self, result: Dict[str, Any]):
+        """Remember token usage of the last response on the calling thread (OpenAI or Ollama style)"""
+        usage = result.get("usage") or {}
+        choices = result.get("choices") or [{}]
+        self._local.usage = {
+            "prompt_tokens": usage.get("prompt_tokens", result.get("prompt_eval_count")),
+            "completion_tokens": usage.get("completion_tokens", result.get("eval_count")),
+            "finish_reason": choices[0].get("finish_reason", result.get("done_reason")),
+            "cached_tokens": self._cached_prompt_tokens(result, usage),
+        }
+
+    @staticmethod
+    def _cached_prompt_tokens(result: Dict[str, Any], usage: Dict[str, Any]) -> Optional[int]:
+        """Extract prompt tokens served from the provider's prefix cache, if reported"""
+        if "prompt_cache_hit_tokens" in usage:  # DeepSeek context caching
+            return usage["prompt_cache_hit_tokens"]
+        details = usage.get("prompt_tokens_details") or {}
+        if "cached_tokens" in details:  # OpenAI / vLLM
+            return details["cached_tokens"]
+        timings = result.get("timings") or {}
+        if "cache_n" in timings:  # llama.cpp server
+            return timings["cache_n"]
+        if "tokens_cached" in result:  # llama.cpp /completion
+            return result["tokens_cached"]
+        return None
+
+    def pop_last_usage(self) -> Dict[str, Any]:
+        """Get and clear token usage of the last response generated on the calling thread"""
+        local = self.__dict__.setdefault("_local", threading.local())
+        usage = getattr(local, "usage", {})
+        local.usage = {}
+        return usage
+
     def get_provider_info(self) -> Dict[str, Any]:
         """Get provider information"""
         return {
@@ -49,8 +140,9 @@ class LLMProvider(ABC):
 class PromptOptimizer:
     """Prompt optimizer for processing transcribed text"""
     
-    def __init__(self, llm_provider: LLMProvider):
+    def __init__(self, llm_provider: LLMProvider, budget_model: Optional[TokenBudgetModel] = None):
         self.llm_provider = llm_provider
+        self.budget_model = budget_model or TokenBudgetModel()
 
     def _calculate_max_tokens(self, input_text: str, level: str) -> int:
         """Calculate maximum token count based on input text length and level"""
@@ -62,81 +154,130 @@ class PromptOptimizer:
         else:
             return 500
 
-    def optimize_prompt(self, transcript: str, task_type: str = "general", level: str = "default", language: Optional[str] = None) -> str:
+    def _generate(self, template: PromptTemplate, user_content: str, input_text: str, budget_key: str, fallback_max_tokens: int, temperature: float) -> str:
+        """
+        Call the provider with a learned max_tokens/timeout budget and record the observed output length.
+        The template's system message is sent as a separate, stable prefix when the provider supports it.
+        """
+        input_tokens = estimate_tokens(input_text)
+        max_tokens, timeout = self.budget_model.plan(budget_key, input_tokens, fallback_max_tokens)
+        self.llm_provider.pop_last_usage()
+        start = time.perf_counter()
+        if self.llm_provider.supports_system_prompt:
+            output = self.llm_provider.generate(user_content, system_prompt=template.system, temperature=temperature, max_tokens=max_tokens, timeout=timeout)
+        else:
+            output = self.llm_provider.generate(template.combined(user_content), temperature=temperature, max_tokens=max_tokens, timeout=timeout)
+        latency = time.perf_counter() - start
+        usage = self.llm_provider.pop_last_usage()
+        completion_tokens = usage.get("completion_tokens") or estimate_tokens(output)
+        finish_reason = usage.get("finish_reason")
+        truncated = finish_reason == "length" if finish_reason else None
+        self.budget_model.record(budget_key, input_tokens, completion_tokens, max_tokens, latency, truncated)
+        self._record_prompt_cache(usage)
+        return output
+
+    def _record_prompt_cache(self, usage: Dict[str, Any]):
+        """Report how many prompt tokens the provider served from its prefix cache"""
+        prompt_tokens = usage.get("prompt_tokens")
+        cached_tokens = usage.get("cached_tokens")
+        if prompt_tokens is None or cached_tokens is None:
+            return
+        provider = self.llm_provider.name
+        metrics.incr("llm.prompt_tokens", prompt_tokens, provider=provider)
+        metrics.incr("llm.cached_prompt_tokens", cached_tokens, provider=provider)
+        metrics.observe("llm.prompt_cache_hit_ratio", cached_tokens / max(prompt_tokens, 1), provider=provider)
+
+    def optimize_prompt(self, transcript: str, task_type: str = "general", level: str = "default", language: Optional[str] = None, context: Optional[str] = None) -> str:
         """
         Optimize transcript into a better prompt. Output is wrapped in <REPHRASE> tags. All instructions in English and specify 'Rewrite in the same language.'
+        The instruction lives in a precompiled system message so the transcript is the only variable part of the request.
+        A session context (summary and recent requests) is prepended to the user content when given.
+        Falls back to the unchanged transcript when the request fails.
         """
-        max_tokens = self._calculate_max_tokens(transcript, level)
-        task_instructions = {
-            "general": "Rewrite the following in a more professional and concise way. Rewrite in the same language.",
-            "coding": "Rewrite the following as a clear programming requirement. Rewrite in the same language.",
-            "writing": "Rewrite the following as a fluent writing guide. Rewrite in the same language.",
-            "analysis": "Rewrite the following as a concise analysis requirement. Rewrite in the same language."
-        }
-        instruction = task_instructions.get(task_type, task_instructions["general"])
-        
-        # If language is detected, specify the language in the instruction
-        if language:
-            # Convert language code to language name
-            language_names = {
-                "zh": "Chinese",
-                "en": "English", 
-                "ja": "Japanese",
-                "ko": "Korean",
-                "fr": "French",
-                "de": "German",
-                "es": "Spanish",
-                "it": "Italian",
-                "pt": "Portuguese",
-                "ru": "Russian",
-                "ar": "Arabic",
-                "hi": "Hindi"
-            }
-            language_name = language_names.get(language, language.upper())
-            instruction = instruction.replace("Rewrite in the same language.", f"Rewrite in {language_name}.")
-        
-        prompt = f"{instruction}\n{transcript}\nOutput in the following format:\n<REPHRASE>\n[Your rewritten content here]\n</REPHRASE>"
         try:
-            optimized_text = self.llm_provider.generate(prompt, temperature=0.3, max_tokens=max_tokens)
-            return self._extract_rephrase_content(optimized_text).strip()
+            return self.rephrase(transcript, task_type, level, language, context)
         except Exception as e:
             print(f"Error during optimization: {e}")
             return transcript
 
+    def rephrase(self, transcript: str, task_type: str = "general", level: str = "default", language: Optional[str] = None, context: Optional[str] = None) -> str:
+        """
+        Same as optimize_prompt, but request errors propagate instead of returning the transcript.
+        Used where a failure must be told apart from a rewrite, e.g. speculative requests.
+        """
+        max_tokens = self._calculate_max_tokens(transcript, level)
+        budget_key = TokenBudgetModel.make_key(task_type, level, language)
+        template = templates.rephrase(task_type, language, level)
+        content = templates.context_content(context, transcript) if context else transcript
+        optimized_text = self._generate(template, content, transcript, budget_key, max_tokens, temperature=0.3)
+        return self._extract_rephrase_content(optimized_text).strip()
+
+    def extend_rephrase(self, previous_rephrase: str, continuation: str, task_type: str = "general", level: str = "default", language: Optional[str] = None) -> str:
+        """
+        Follow-up rewrite when the speaker kept talking after a speculative rephrase.
+        The already rewritten beginning is sent together with the new transcript tail,
+        which is much shorter than rewriting the full transcript from scratch.
+        """
+        max_tokens = self._calculate_max_tokens(previous_rephrase + continuation, level)
+        budget_key = TokenBudgetModel.make_key(task_type, level, language)
+        template = templates.rephrase(task_type, language, level)
+        content = templates.extension_content(previous_rephrase, continuation)
+        try:
+            optimized_text = self._generate(template, content, previous_rephrase + continuation, budget_key, max_tokens, temperature=0.3)
+            return self._extract_rephrase_content(optimized_text).strip()
+        except Exception as e:
+            print(f"Error during follow-up optimization: {e}")
+            return f"{previous_rephrase} {continuation}".strip()
+
+    def optimize_packed(self, items: List[Tuple[int, str]], task_type: str = "general", level: str = "default", language: Optional[str] = None) -> Dict[int, str]:
+        """
+        Optimize several short transcripts in a single request.
+        Outputs are delimited by <REPHRASE id=N> blocks; items missing from the response are left out of the result.
+        """
+        joined = "\n".join(text for _, text in items)
+        max_tokens = sum(self._calculate_max_tokens(text, level) for _, text in items) + 16 * len(items)
+        budget_key = TokenBudgetModel.make_key(task_type, f"{level}:packed", language)
+        template = templates.rephrase_packed(task_type, language, level)
+        content = templates.packed_content(items)
+        optimized_text = self._generate(template, content, joined, budget_key, max_tokens, temperature=0.3)
+        wanted = {item_id for item_id, _ in items}
+        results = {}
+        for match in _PACKED_REPHRASE_RE.finditer(optimized_text):
+            item_id = int(match.group(1))
+            if item_id in wanted and item_id not in results:
+                results[item_id] = self._clean_output(match.group(2).strip()).strip()
+        return results
+
     def _extract_rephrase_content(self, text: str) -> str:
         """Directly return content, removing common polite phrases"""
         return self._clean_output(text)
 
     def _clean_output(self, text: str) -> str:
-        common_prefixes = [
-            "以下为", "以下是", "以下内容", "优化后的内容：", "优化结果：",
-            "转换后的内容：", "转换结果：", "输出结果：", "结果如下：",
-            "**优化后的 prompt：**", "**优化结果：**", "**输出：**"
-        ]
-        cleaned_text = text
-        for prefix in common_prefixes:
-            if cleaned_text.startswith(prefix):
-                cleaned_text = cleaned_text[len(prefix):].strip()
-        common_suffixes = [
-            "以上为优化结果。", "以上为转换结果。", "以上为输出内容。",
-            "这就是优化后的内容。", "这就是转换结果。"
-        ]
-        for suffix in common_suffixes:
-            if cleaned_text.endswith(suffix):
-                cleaned_text = cleaned_text[:-len(suffix)].strip()
-        return cleaned_text
+        """Extract the REPHRASE content and strip polite lead-in/closing phrases"""
+        return normalize_output(text)
 
     def summarize_text(self, transcript: str, max_length: int = 100) -> str:
         """
         Summarize transcript (English prompt, specify same language)
+        Falls back to the truncated transcript when the request fails.
         """
-        summary_prompt = f"Summarize the following in no more than {max_length} characters. Summarize in the same language.\n{transcript}\nOutput in the following format:\n<SUMMARY>\n[Your summary here]\n</SUMMARY>"
         try:
-            summary = self.llm_provider.generate(summary_prompt, temperature=0.2, max_tokens=200)
-            return self._extract_summary_content(summary).strip()
+            return self.summarize(transcript, max_length)
         except Exception as e:
             print(f"Error during summarization: {e}")
             return transcript[:max_length] + "..." if len(transcript) > max_length else transcript
 
+    def summarize(self, transcript: str, max_length: int = 100) -> str:
+        """
+        Same as summarize_text, but request errors propagate instead of returning the truncated transcript.
+        Used by session compaction, which keeps the old turns when a summary fails.
+        """
+        template = templates.summary(max_length)
+        budget_key = TokenBudgetModel.make_key("summary", "default", None)
+        summary = self._generate(template, transcript, transcript, budget_key, 200, temperature=0.2)
+        return self._extract_summary_content(summary).strip()
+
     def _extract_summary_content(self, text: str) -> str:
-        return self._clean_output(text) 
\ No newline at end of file
+        """Take the <SUMMARY> body, falling back to the raw text when the model left out the tags"""
+        match = _SUMMARY_RE.search(text)
+        return self._clean_output(match.group(1) if match else text) 
\ No newline at end of file
@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+from src.llm.base import PromptOptimizer
+from src.metrics import metrics
+
+# 单条输入：转录文本，或 (转录文本, 语言代码)
+BatchItem = Union[str, Tuple[str, Optional[str]]]
+
+
+class RateLimiter:
+    """令牌桶限速器，线程安全"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        """
+        Args:
+            rate: 每秒允许的请求数
+            burst: 允许的突发请求数
+        """
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """阻塞直到获得一个令牌"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self.rate
+            time.sleep(wait_time)
+
+
+class BatchOptimizer:
+    """
+    批量改写：并发执行（限制同时进行的请求数并限速），
+    并可将多条短转录打包进一个请求，用 <REPHRASE id=...> 分隔输出。
+    """
+
+    def __init__(self, prompt_optimizer: PromptOptimizer, max_in_flight: int = 4,
+                 requests_per_second: Optional[float] = None, pack_size: int = 1,
+                 pack_max_chars: int = 200):
+        """
+        Args:
+            prompt_optimizer: 用于发送请求的 prompt 优化器
+            max_in_flight: 同时进行的最大请求数
+            requests_per_second: 每秒最大请求数，为 None 时不限速
+            pack_size: 每个请求最多打包的转录条数，1 表示不打包
+            pack_max_chars: 可以被打包的转录的最大字符数
+        """
+        self.prompt_optimizer = prompt_optimizer
+        self.max_in_flight = max(1, max_in_flight)
+        self.rate_limiter = RateLimiter(requests_per_second, burst=self.max_in_flight) if requests_per_second else None
+        self.pack_size = max(1, pack_size)
+        self.pack_max_chars = pack_max_chars
+
+    def _jobs(self, transcripts: Iterable[BatchItem], language: Optional[str]) -> Iterator[Tuple[Optional[str], List[Tuple[int, str]]]]:
+        """把输入切分为请求：短转录按语言分组打包，其余单独发送"""
+        packs: Dict[Optional[str], List[Tuple[int, str]]] = {}
+        for index, item in enumerate(transcripts):
+            if isinstance(item, tuple):
+                text, item_language = item
+            else:
+                text, item_language = item, language
+            if self.pack_size > 1 and len(text) <= self.pack_max_chars:
+                pack = packs.setdefault(item_language, [])
+                pack.append((index, text))
+                if len(pack) >= self.pack_size:
+                    yield item_language, packs.pop(item_language)
+            else:
+                yield item_language, [(index, text)]
+        for item_language, pack in packs.items():
+            yield item_language, pack
+
+    def _run_job(self, job, task_type: str, level: str) -> List[Tuple[int, str]]:
+        item_language, items = job
+        if self.rate_limiter:
+            self.rate_limiter.acquire()
+        if len(items) == 1:
+            index, text = items[0]
+            metrics.incr("llm.batch.requests", mode="single")
+            return [(index, self.prompt_optimizer.optimize_prompt(text, task_type, level, item_language))]
+
+        metrics.incr("llm.batch.requests", mode="packed")
+        try:
+            packed = self.prompt_optimizer.optimize_packed(items, task_type, level, item_language)
+        except Exception as e:
+            print(f"Packed optimization failed, falling back to single requests: {e}")
+            packed = {}
+        results = []
+        for index, text in items:
+            if index in packed:
+                results.append((index, packed[index]))
+                continue
+            # 模型漏掉了该条目，单独重试
+            metrics.incr("llm.batch.pack_fallback")
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            results.append((index, self.prompt_optimizer.optimize_prompt(text, task_type, level, item_language)))
+        return results
+
+    def run(self, transcripts: Iterable[BatchItem], task_type: str = "general", level: str = "default",
+            language: Optional[str] = None, ordered: bool = True) -> Iterator[Tuple[int, str]]:
+        """
+        批量改写转录文本
+
+        Args:
+            transcripts: 转录文本的可迭代对象，可以是惰性的
+            task_type: 任务类型
+            level: 优化档位
+            language: 默认语言代码（条目为元组时使用条目自己的语言）
+            ordered: True 按输入顺序返回，False 按完成顺序返回
+
+        Yields:
+            (输入序号, 改写结果)
+        """
+        start = time.perf_counter()
+        completed = 0
+        buffer: Dict[int, str] = {}
+        next_index = 0
+        pending = set()
+
+        def drain(done):
+            nonlocal next_index, completed
+            for future in done:
+                for index, result in future.result():
+                    completed += 1
+                    if not ordered:
+                        yield index, result
+                        continue
+                    buffer[index] = result
+                while next_index in buffer:
+                    yield next_index, buffer.pop(next_index)
+                    next_index += 1
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="batch-optimize") as executor:
+            for job in self._jobs(transcripts, language):
+                while len(pending) >= self.max_in_flight:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    yield from drain(done)
+                pending.add(executor.submit(self._run_job, job, task_type, level))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from drain(done)
+
+        elapsed = time.perf_counter() - start
+        metrics.incr("llm.batch.items", completed)
+        if elapsed > 0:
+            metrics.observe("llm.batch.throughput", completed / elapsed)
@@ -0,0 +1,203 @@
+import json
+import math
+import os
+import re
+import tempfile
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, Tuple
+from src.metrics import metrics
+
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计 token 数：CJK 字符约 1 token/字，其余约 4 字符/token"""
+    cjk = len(_CJK_RE.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(math.ceil(q / 100.0 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class TokenBudgetModel:
+    """
+    根据实测输出长度学习 max_tokens 和超时时间
+
+    按 (task_type, level, language) 记录每次补全的实际输出 token 数与输入长度之比、
+    每个输出 token 的耗时，用观测到的分位数代替按字符数估算的固定规则。
+    样本不足时回退到调用方提供的静态估算。
+    """
+
+    def __init__(self, stats_path: Optional[str] = None, window: int = 200, min_samples: int = 8,
+                 percentile: float = 95.0, headroom: float = 1.25, min_tokens: int = 64,
+                 max_tokens: int = 4096, min_timeout: float = 10.0, max_timeout: float = 120.0):
+        """
+        Args:
+            stats_path: 统计数据持久化路径，为 None 时只保存在内存中
+            window: 每个键保留的最近样本数
+            min_samples: 使用学习结果前需要的最少样本数
+            percentile: 计算预算使用的分位数
+            headroom: 在分位数基础上额外预留的比例
+            min_tokens / max_tokens: max_tokens 的取值范围
+            min_timeout / max_timeout: 超时时间的取值范围（秒）
+        """
+        self.stats_path = stats_path
+        self.window = window
+        self.min_samples = min_samples
+        self.percentile = percentile
+        self.headroom = headroom
+        self.min_tokens = min_tokens
+        self.max_tokens = max_tokens
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        # key -> {"ratio": deque, "sec_per_token": deque, "calls": int, "truncated": int}
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._dirty = 0
+        self._load()
+
+    @staticmethod
+    def make_key(task_type: str, level: str, language: Optional[str]) -> str:
+        return f"{task_type}|{level}|{language or 'auto'}"
+
+    def _entry(self, key: str) -> Dict[str, Any]:
+        entry = self._stats.get(key)
+        if entry is None:
+            entry = self._stats[key] = {
+                "ratio": deque(maxlen=self.window),
+                "sec_per_token": deque(maxlen=self.window),
+                "calls": 0,
+                "truncated": 0,
+            }
+        return entry
+
+    def plan(self, key: str, input_tokens: int, fallback_max_tokens: int) -> Tuple[int, float]:
+        """
+        计算一次请求的 max_tokens 和超时时间
+
+        Args:
+            key: make_key 生成的统计键
+            input_tokens: 输入文本的（估计）token 数
+            fallback_max_tokens: 样本不足时使用的静态 max_tokens
+
+        Returns:
+            (max_tokens, timeout)
+        """
+        with self._lock:
+            entry = self._stats.get(key)
+            ratios = list(entry["ratio"]) if entry else []
+            speeds = list(entry["sec_per_token"]) if entry else []
+
+        if len(ratios) >= self.min_samples:
+            budget = _percentile(ratios, self.percentile) * max(input_tokens, 1) * self.headroom
+            max_tokens = int(min(self.max_tokens, max(self.min_tokens, math.ceil(budget))))
+            metrics.incr("llm.budget.plan", source="learned")
+        else:
+            max_tokens = fallback_max_tokens
+            metrics.incr("llm.budget.plan", source="fallback")
+
+        if len(speeds) >= self.min_samples:
+            # 生成满 max_tokens 所需时间的悲观估计，再加上固定的连接开销
+            timeout = _percentile(speeds, 99.0) * max_tokens * 1.5 + 5.0
+        else:
+            timeout = 60.0 if max_tokens > 1000 else 30.0
+        timeout = min(self.max_timeout, max(self.min_timeout, timeout))
+        return max_tokens, timeout
+
+    def record(self, key: str, input_tokens: int, completion_tokens: int, max_tokens: int,
+               latency: float, truncated: Optional[bool] = None):
+        """
+        记录一次补全的实际结果
+
+        Args:
+            key: make_key 生成的统计键
+            input_tokens: 输入文本的（估计）token 数
+            completion_tokens: 实际输出 token 数
+            max_tokens: 本次请求使用的 max_tokens
+            latency: 请求耗时（秒）
+            truncated: 是否因长度截断，为 None 时根据输出是否达到上限判断
+        """
+        if truncated is None:
+            truncated = completion_tokens >= max_tokens
+        ratio = completion_tokens / max(input_tokens, 1)
+        if truncated:
+            # 截断样本只是下限，放大后记录，使预算尽快上调
+            ratio *= 1.5
+        with self._lock:
+            entry = self._entry(key)
+            entry["ratio"].append(ratio)
+            if completion_tokens > 0:
+                entry["sec_per_token"].append(latency / completion_tokens)
+            entry["calls"] += 1
+            entry["truncated"] += int(truncated)
+            self._dirty += 1
+            should_save = self._dirty >= 10
+
+        task_type, level, language = key.split("|")
+        labels = {"task_type": task_type, "level": level, "language": language}
+        metrics.incr("llm.completions", **labels)
+        if truncated:
+            metrics.incr("llm.truncated", **labels)
+        metrics.observe("llm.latency", latency, **labels)
+        metrics.observe("llm.completion_tokens", completion_tokens, **labels)
+        metrics.observe("llm.budget_utilization", completion_tokens / max(max_tokens, 1), **labels)
+        if should_save:
+            self.save()
+
+    def truncation_rate(self, key: str) -> float:
+        with self._lock:
+            entry = self._stats.get(key)
+            if not entry or not entry["calls"]:
+                return 0.0
+            return entry["truncated"] / entry["calls"]
+
+    def _load(self):
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for key, value in data.items():
+                entry = self._entry(key)
+                entry["ratio"].extend(value.get("ratio", []))
+                entry["sec_per_token"].extend(value.get("sec_per_token", []))
+                entry["calls"] = value.get("calls", 0)
+                entry["truncated"] = value.get("truncated", 0)
+        except Exception as e:
+            print(f"Failed to load token budget stats: {e}")
+
+    def save(self):
+        """持久化统计数据（先写临时文件再替换，并发保存不会写坏文件）"""
+        if not self.stats_path:
+            return
+        # 快照和写入一起串行化，较旧的快照不会覆盖较新的
+        with self._save_lock:
+            with self._lock:
+                data = {
+                    key: {
+                        "ratio": list(entry["ratio"]),
+                        "sec_per_token": list(entry["sec_per_token"]),
+                        "calls": entry["calls"],
+                        "truncated": entry["truncated"],
+                    }
+                    for key, entry in self._stats.items()
+                }
+                self._dirty = 0
+            try:
+                directory = os.path.dirname(self.stats_path) or "."
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=directory, prefix=".llm_budget-", suffix=".json")
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        json.dump(data, f)
+                    os.replace(tmp, self.stats_path)
+                except Exception:
+                    os.unlink(tmp)
+                    raise
+            except Exception as e:
+                print(f"Failed to save token budget stats: {e}")
@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor
+from typing import Callable, Deque, List, Optional, Tuple
+from src.metrics import metrics
+
+Turn = Tuple[str, str]  # (转录文本, 改写结果)
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= limit else text[:max(0, limit - 3)].rstrip() + "..."
+
+
+class SessionContext:
+    """
+    多轮改写的会话上下文
+
+    最近 recent_turns 轮原样保留（每轮截断到 max_turn_chars）；更早的轮次移入待压缩队列，
+    在后台用 summarize_fn 和已有摘要合并成不超过 summary_chars 的摘要。改写请求只附带
+    摘要加最近几轮，总长度不超过 max_context_chars，所以 token 数和延迟不会随会话增长。
+    压缩完成前，待压缩的轮次仍按原文计入上下文（同样受总长度限制）。
+    超过 idle_reset_seconds 没有新轮次时视为新会话，丢弃旧上下文。
+    """
+
+    def __init__(self, summarize_fn: Callable[[str, int], str], executor: Executor,
+                 recent_turns: int = 3, max_turn_chars: int = 300, summary_chars: int = 400,
+                 max_context_chars: int = 1500, idle_reset_seconds: float = 600):
+        """
+        Args:
+            summarize_fn: 摘要函数 (text, max_length) -> str，在 executor 上调用；
+                失败时应抛出异常而不是返回原文，否则截断的原文会被当作摘要
+            executor: 后台执行压缩的线程池
+            recent_turns: 原样保留的最近轮数
+            max_turn_chars: 每轮保留的最大字符数
+            summary_chars: 摘要的最大字符数
+            max_context_chars: 附加到请求中的上下文总字符数上限
+            idle_reset_seconds: 空闲多久后开始新会话，<= 0 不自动重置
+        """
+        self.summarize_fn = summarize_fn
+        self.executor = executor
+        self.recent_turns = recent_turns
+        self.max_turn_chars = max_turn_chars
+        self.summary_chars = summary_chars
+        self.max_context_chars = max_context_chars
+        self.idle_reset_seconds = idle_reset_seconds
+        self._lock = threading.Lock()
+        self._turns: Deque[Turn] = deque()
+        self._pending: List[Turn] = []
+        self._summary = ""
+        self._generation = 0  # reset() 后丢弃进行中的压缩结果
+        self._compacting = False
+        self._last_turn = 0.0
+
+    def _expire(self):
+        """调用方持有锁"""
+        if (self.idle_reset_seconds > 0 and self._last_turn
+                and time.monotonic() - self._last_turn > self.idle_reset_seconds):
+            self._reset()
+            metrics.incr("llm.session.idle_resets")
+
+    def _reset(self):
+        self._turns.clear()
+        self._pending.clear()
+        self._summary = ""
+        self._generation += 1
+        self._last_turn = 0.0
+
+    def reset(self):
+        """开始新会话"""
+        with self._lock:
+            self._reset()
+
+    def record(self, transcript: str, rephrase: Optional[str]):
+        """记录完成的一轮，超出的旧轮次提交后台压缩"""
+        with self._lock:
+            self._expire()
+            self._turns.append((_clip(transcript, self.max_turn_chars), _clip(rephrase or transcript, self.max_turn_chars)))
+            self._last_turn = time.monotonic()
+            while len(self._turns) > self.recent_turns:
+                self._pending.append(self._turns.popleft())
+            self._schedule()
+
+    def _schedule(self):
+        """调用方持有锁；同一时间只有一个压缩任务"""
+        if self._compacting or not self._pending:
+            return
+        self._compacting = True
+        job = (self._generation, self._summary, list(self._pending))
+        self.executor.submit(self._compact, *job)
+
+    def _compact(self, generation: int, summary: str, turns: List[Turn]):
+        start = time.perf_counter()
+        lines = [f"Summary so far: {summary}"] if summary else []
+        lines += [f"- {rephrase}" for _, rephrase in turns]
+        try:
+            new_summary = _clip(self.summarize_fn("\n".join(lines), self.summary_chars), self.summary_chars)
+        except Exception as e:
+            print(f"Session summary failed: {e}")
+            new_summary = None
+        metrics.observe("llm.session.summary_seconds", time.perf_counter() - start)
+        with self._lock:
+            self._compacting = False
+            if generation != self._generation:
+                return
+            if new_summary:
+                self._summary = new_summary
+                del self._pending[:len(turns)]
+                metrics.incr("llm.session.compactions")
+            else:
+                # 摘要失败时丢弃最旧的轮次，保证待压缩队列有界
+                del self._pending[:max(0, len(self._pending) - self.recent_turns)]
+                return
+            self._schedule()
+
+    def render(self) -> str:
+        """附加到改写请求中的上下文，没有上下文时返回空字符串"""
+        with self._lock:
+            self._expire()
+            summary = self._summary
+            turns = list(self._pending) + list(self._turns)
+        parts: List[str] = []
+        budget = self.max_context_chars
+        if summary:
+            parts.append(f"Summary: {summary}")
+            budget -= len(parts[0])
+        recent: List[str] = []
+        # 从最新一轮往前取，直到用完字符预算
+        for _, rephrase in reversed(turns):
+            line = f"Earlier request: {rephrase}"
+            if len(line) > budget:
+                break
+            recent.append(line)
+            budget -= len(line)
+        parts.extend(reversed(recent))
+        context = "\n".join(parts)
+        if context:
+            metrics.observe("llm.session.context_chars", len(context))
+        return context
+
+    def stats(self):
+        with self._lock:
+            return {"turns": len(self._turns), "pending": len(self._pending),
+                    "summary_chars": len(self._summary), "compacting": self._compacting}
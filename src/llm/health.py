@@ -0,0 +1,92 @@
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from src.llm.factory import LLMFactory
+from src.metrics import metrics
+
+
+def _config_key(provider_type: str, config: Dict[str, Any]) -> str:
+    """缓存键：提供商类型 + 影响连通性的配置（API 密钥只取哈希）"""
+    api_key = config.get("api_key") or ""
+    parts = [provider_type, config.get("base_url") or "", config.get("model") or "",
+             hashlib.sha1(api_key.encode("utf-8")).hexdigest()[:12]]
+    return "|".join(parts)
+
+
+class HealthChecker:
+    """
+    LLM 提供商健康检查
+
+    直接用配置创建提供商实例并调用其 health_check（列出模型或 max_tokens=1 的请求），
+    连接超时很短，不经过 LLMManager，也不做真正的改写请求。多个提供商并发检查，
+    结果按配置缓存 ttl 秒，设置界面反复打开或保存时不会重复请求。
+    """
+
+    def __init__(self, ttl: float = 60.0, connect_timeout: float = 3.05, read_timeout: float = 5.0,
+                 max_workers: int = 4):
+        self.ttl = ttl
+        self.timeout = (connect_timeout, read_timeout)
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-health")
+
+    def cached(self, provider_type: str, config: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """未过期的检查结果，没有则返回 None"""
+        with self._lock:
+            status = self._cache.get(_config_key(provider_type, config))
+        if status and time.time() - status["checked_at"] < self.ttl:
+            return status
+        return None
+
+    def check(self, provider_type: str, config: Dict[str, Any], force: bool = False) -> Dict[str, Any]:
+        """
+        检查一个提供商
+
+        Returns:
+            dict: provider, ok, configured, latency_ms, error, checked_at
+        """
+        if not force:
+            status = self.cached(provider_type, config)
+            if status:
+                return status
+        status = {"provider": provider_type, "ok": False, "configured": True, "latency_ms": None, "error": ""}
+        start = time.perf_counter()
+        try:
+            provider = LLMFactory.create_provider(provider_type, config)
+        except ValueError as e:
+            # 缺少 API 密钥等，属于未配置而不是不可用
+            status.update(configured=False, error=str(e))
+        else:
+            try:
+                provider.health_check(self.timeout)
+                status["ok"] = True
+            except Exception as e:
+                status["error"] = str(e)
+            finally:
+                session = getattr(provider, "session", None)
+                if session is not None:
+                    session.close()
+            status["latency_ms"] = (time.perf_counter() - start) * 1000
+            metrics.observe("llm.health.latency_ms", status["latency_ms"], provider=provider_type)
+            metrics.incr("llm.health.checks", provider=provider_type, ok=status["ok"])
+        status["checked_at"] = time.time()
+        with self._lock:
+            self._cache[_config_key(provider_type, config)] = status
+        return status
+
+    def check_async(self, provider_type: str, config: Dict[str, Any],
+                    on_result: Callable[[Dict[str, Any]], None], force: bool = False):
+        """在后台检查，完成后在检查线程上调用 on_result(status)"""
+        def run():
+            on_result(self.check(provider_type, config, force))
+        return self._executor.submit(run)
+
+    def check_all(self, providers: Dict[str, Dict[str, Any]], on_result: Callable[[Dict[str, Any]], None],
+                  force: bool = False):
+        """并发检查所有已配置的提供商，每完成一个回调一次"""
+        return [self.check_async(name, config or {}, on_result, force) for name, config in providers.items()]
+
+
+health_checker = HealthChecker()
@@ -1,13 +1,17 @@
 import requests
 import json
 from typing import Dict, Any, Optional
-from .base import LLMProvider
+from .base import LLMProvider, LLMRequestError
 
 class LocalProvider(LLMProvider):
     """本地部署模型提供商实现"""
     
+    supports_system_prompt = True
+    
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
+        # 复用 HTTP 连接（keep-alive），避免每次请求重新握手
+        self.session = requests.Session()
         self.base_url = config.get("base_url", "http://localhost:8000")
         self.model = config.get("model", "default")
         self.api_key = config.get("api_key")  # 可选，用于本地 API 认证
@@ -21,7 +25,7 @@ class LocalProvider(LLMProvider):
         
         Args:
             prompt: 输入提示词
-            **kwargs: 其他参数
+            **kwargs: 其他参数（system_prompt 为固定的系统消息，llama.cpp/vLLM 可复用其前缀缓存）
         
         Returns:
             生成的文本响应
@@ -36,6 +40,15 @@ class LocalProvider(LLMProvider):
         
         temperature = kwargs.get("temperature", 0.7)
         max_tokens = kwargs.get("max_tokens", 1000)
+        timeout = kwargs.get("timeout", 60)
+        system_prompt = kwargs.get("system_prompt")
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        # 非 chat 格式没有系统消息，系统消息放在最前面，仍保持前缀不变
+        flat_prompt = f"{system_prompt}\n{prompt}" if system_prompt else prompt
         
         headers = {"Content-Type": "application/json"}
         if self.api_key:
@@ -46,19 +59,19 @@ class LocalProvider(LLMProvider):
             # OpenAI 兼容格式
             {
                 "model": self.model,
-                "messages": [{"role": "user", "content": prompt}],
+                "messages": messages,
                 "temperature": temperature,
                 "max_tokens": max_tokens
             },
             # 简化格式
             {
-                "prompt": prompt,
+                "prompt": flat_prompt,
                 "temperature": temperature,
                 "max_tokens": max_tokens
             },
             # 通用格式
             {
-                "input": prompt,
+                "input": flat_prompt,
                 "parameters": {
                     "temperature": temperature,
                     "max_new_tokens": max_tokens
@@ -69,15 +82,17 @@ class LocalProvider(LLMProvider):
         for endpoint in endpoints:
             for request_format in request_formats:
                 try:
-                    response = requests.post(
+                    response = self.session.post(
                         endpoint, 
                         headers=headers, 
                         json=request_format, 
-                        timeout=60
+                        timeout=timeout
                     )
                     response.raise_for_status()
                     
                     result = response.json()
+                    if isinstance(result, dict):
+                        self._record_usage(result)
                     
                     # 尝试不同的响应格式
                     if "choices" in result and len(result["choices"]) > 0:
@@ -96,7 +111,33 @@ class LocalProvider(LLMProvider):
                 except (requests.exceptions.RequestException, KeyError, ValueError):
                     continue
         
-        raise Exception("Unable to connect to local model or response format not supported")
+        # 已经遍历了所有端点和格式，不再整体重试
+        raise LLMRequestError("Unable to connect to local model or response format not supported", retryable=False)
+    
+    def health_check(self, timeout=(3.05, 5.0)) -> None:
+        """
+        依次尝试模型列表和健康检查端点（OpenAI 兼容、Ollama、TGI/llama.cpp），
+        都不存在时只发一个 max_tokens=1 的 chat 请求，而不是遍历所有端点和格式
+        """
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        for path in ("/v1/models", "/api/tags", "/health"):
+            try:
+                response = self.session.get(f"{self.base_url}{path}", headers=headers, timeout=timeout)
+            except requests.exceptions.RequestException as e:
+                # 连接失败时其他端点同样不可达
+                raise LLMRequestError.from_request_exception(f"Local model health check failed: {e}", e)
+            if response.ok:
+                return
+            if response.status_code in (401, 403):
+                raise LLMRequestError(f"Local model health check failed: HTTP {response.status_code}", status_code=response.status_code)
+        try:
+            response = self.session.post(
+                f"{self.base_url}/v1/chat/completions", headers=headers, timeout=timeout,
+                json={"model": self.model, "messages": [{"role": "user", "content": "ping"}], "max_tokens": 1}
+            )
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise LLMRequestError.from_request_exception(f"Local model health check failed: {e}", e)
     
     def test_connection(self) -> bool:
         """测试本地模型连接"""
@@ -111,7 +152,7 @@ class LocalProvider(LLMProvider):
     def get_available_models(self) -> list:
         """获取可用的本地模型列表"""
         try:
-            response = requests.get(f"{self.base_url}/v1/models", timeout=10)
+            response = self.session.get(f"{self.base_url}/v1/models", timeout=10)
             if response.status_code == 200:
                 result = response.json()
                 return [model["id"] for model in result.get("data", [])]
@@ -1,9 +1,16 @@
 import os
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Iterable, Iterator, Tuple
 from src.llm.factory import LLMFactory
 from src.llm.base import LLMProvider, PromptOptimizer
+from src.llm.speculative import SpeculativeRephraser
+from src.llm.budget import TokenBudgetModel
+from src.llm.batch import BatchOptimizer, BatchItem
+from src.llm.resilience import ResilientProvider
+from src.llm.context import SessionContext
 
 class LLMManager:
     """LLM 管理器，统一管理所有 LLM 相关功能"""
@@ -14,6 +21,12 @@ class LLMManager:
         self.config = self._load_config()
         self.current_provider = None
         self.prompt_optimizer = None
+        self.speculator = None
+        self.budget_model = self._create_budget_model()
+        # 多轮会话上下文，旧轮次在单独的线程上压缩成摘要
+        self.sessions: Dict[str, SessionContext] = {}
+        self._sessions_lock = threading.Lock()
+        self._summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-summary")
         self._initialize_provider()
         
         # 确保缓存目录存在
@@ -45,10 +58,23 @@ class LLMManager:
             print(f"加载配置文件失败: {e}")
             return {}
     
+    def _create_budget_model(self) -> TokenBudgetModel:
+        """创建 max_tokens/超时学习模型，统计数据默认保存在配置文件旁"""
+        budget_config = self.config.get("prompt_optimization", {}).get("budget", {})
+        default_path = os.path.join(os.path.dirname(self.config_path) or ".", "token_budget_stats.json")
+        return TokenBudgetModel(
+            stats_path=budget_config.get("stats_path", default_path),
+            min_samples=budget_config.get("min_samples", 8),
+            percentile=budget_config.get("percentile", 95.0),
+            headroom=budget_config.get("headroom", 1.25),
+            max_tokens=budget_config.get("max_tokens", 4096),
+        )
+    
     def _initialize_provider(self):
         """初始化默认提供商"""
         self.current_provider = None  # 确保初始化前为 None
         self.prompt_optimizer = None
+        self._reset_speculator()
         if not self.config:
             return
         
@@ -81,14 +107,94 @@ class LLMManager:
         
         try:
             provider_config = self.config["providers"][provider_type]
-            self.current_provider = LLMFactory.create_provider(provider_type, provider_config)
-            self.prompt_optimizer = PromptOptimizer(self.current_provider)
+            self.current_provider = self._wrap_resilient(provider_type, LLMFactory.create_provider(provider_type, provider_config))
+            self.prompt_optimizer = PromptOptimizer(self.current_provider, self.budget_model)
+            self._reset_speculator()
             print(f"Successfully set LLM provider: {provider_type}")
             return True
         except Exception as e:
             print(f"Failed to set LLM provider: {e}")
             return False
     
+    def _wrap_resilient(self, provider_type: str, provider: LLMProvider) -> LLMProvider:
+        """按配置为提供商加上重试、熔断、对冲请求和备用提供商切换"""
+        resilience_config = self.config.get("resilience", {})
+        if not resilience_config.get("enabled", True):
+            return provider
+        
+        fallbacks = []
+        for fallback_type in resilience_config.get("fallback_providers", []):
+            if fallback_type == provider_type or fallback_type not in self.config.get("providers", {}):
+                continue
+            try:
+                fallbacks.append(LLMFactory.create_provider(fallback_type, self.config["providers"][fallback_type]))
+            except Exception as e:
+                print(f"Skipping fallback LLM provider {fallback_type}: {e}")
+        return ResilientProvider(provider, fallbacks, resilience_config)
+    
+    def _reset_speculator(self):
+        """根据当前 prompt 优化器重建推测式改写器"""
+        if self.speculator is not None:
+            self.speculator.shutdown()
+            self.speculator = None
+        if not self.prompt_optimizer:
+            return
+        spec_config = self.config.get("prompt_optimization", {}).get("speculative", {})
+        self.speculator = SpeculativeRephraser(
+            self.prompt_optimizer.rephrase,
+            self.prompt_optimizer.extend_rephrase,
+            min_growth_chars=spec_config.get("min_growth_chars", 12),
+            max_extension_ratio=spec_config.get("max_extension_ratio", 0.5),
+        )
+    
+    def session_context(self, session: Optional[str] = "default") -> Optional[SessionContext]:
+        """
+        会话的上下文，session 为 None 或配置中关闭时返回 None（无状态改写）
+        """
+        session_config = self.config.get("prompt_optimization", {}).get("session", {})
+        if session is None or not session_config.get("enabled", True):
+            return None
+        with self._sessions_lock:
+            context = self.sessions.get(session)
+            if context is None:
+                context = self.sessions[session] = SessionContext(
+                    self._summarize_session,
+                    self._summary_executor,
+                    recent_turns=session_config.get("recent_turns", 3),
+                    max_turn_chars=session_config.get("max_turn_chars", 300),
+                    summary_chars=session_config.get("summary_chars", 400),
+                    max_context_chars=session_config.get("max_context_chars", 1500),
+                    idle_reset_seconds=session_config.get("idle_reset_seconds", 600),
+                )
+            return context
+    
+    def reset_session(self, session: str = "default"):
+        """丢弃会话上下文，下一次改写不再参考之前的内容"""
+        with self._sessions_lock:
+            context = self.sessions.pop(session, None)
+        if context is not None:
+            context.reset()
+    
+    def _render_context(self, session: Optional[str]) -> Tuple[Optional[SessionContext], Optional[str]]:
+        context = self.session_context(session)
+        return context, (context.render() or None) if context else None
+    
+    def _resolve_task_type(self, task_type: Optional[str]) -> str:
+        """未指定任务类型时使用配置中的默认值"""
+        if task_type is None:
+            default_task_type = self.config.get("prompt_optimization", {}).get("default_task_type", "general")
+            task_type = default_task_type if isinstance(default_task_type, str) else "general"
+        return task_type
+    
+    def _save_optimized(self, optimized_prompt: str) -> str:
+        """保存优化结果到缓存，返回文件路径"""
+        optimized_filename = self._generate_filename("optimized", ".txt")
+        optimized_path = os.path.join(self.cache_dir, "optimized", optimized_filename)
+        with open(optimized_path, "w", encoding="utf-8") as f:
+            f.write(optimized_prompt)
+        print(f"优化结果已保存到: {optimized_path}")
+        return optimized_path
+    
     def test_connection(self) -> bool:
         """测试当前 LLM 提供商连接"""
         if not self.current_provider:
@@ -97,7 +203,7 @@ class LLMManager:
         
         return self.current_provider.test_connection()
     
-    def optimize_prompt(self, transcript: str, task_type: Optional[str] = None, level: str = "default", save_result: bool = True, language: Optional[str] = None):
+    def optimize_prompt(self, transcript: str, task_type: Optional[str] = None, level: str = "default", save_result: bool = True, language: Optional[str] = None, session: Optional[str] = "default"):
         """
         优化转录文本为更好的 prompt
         
@@ -107,6 +213,7 @@ class LLMManager:
             level: 优化档位 ("default", "pro")
             save_result: 是否保存结果到缓存
             language: 检测到的语言代码
+            session: 会话名，请求附带该会话之前的上下文；None 为无状态改写
         
         Returns:
             优化后的 prompt
@@ -115,27 +222,116 @@ class LLMManager:
             print("LLM 提供商未初始化，无法优化 prompt")
             return transcript
         
-        if task_type is None:
-            default_task_type = self.config.get("prompt_optimization", {}).get("default_task_type", "general")
-            task_type = default_task_type if isinstance(default_task_type, str) else "general"
+        task_type = self._resolve_task_type(task_type)
         
         try:
-            optimized_prompt = self.prompt_optimizer.optimize_prompt(transcript, task_type, level, language)
+            context, context_text = self._render_context(session)
+            try:
+                optimized_prompt = self.prompt_optimizer.rephrase(transcript, task_type, level, language, context_text)
+            except Exception as e:
+                # 改写失败时返回原文，但不把原文当作改写结果记入会话上下文
+                print(f"Error during optimization: {e}")
+                optimized_prompt = transcript
+            else:
+                if context:
+                    context.record(transcript, optimized_prompt)
             
             # 保存优化结果到缓存
             if save_result:
-                optimized_filename = self._generate_filename("optimized", ".txt")
-                optimized_path = os.path.join(self.cache_dir, "optimized", optimized_filename)
-                with open(optimized_path, "w", encoding="utf-8") as f:
-                    f.write(optimized_prompt)
-                print(f"优化结果已保存到: {optimized_path}")
-                return optimized_prompt, optimized_path
+                return optimized_prompt, self._save_optimized(optimized_prompt)
             
             return optimized_prompt
         except Exception as e:
             print(f"优化 prompt 失败: {e}")
             return transcript
     
+    def optimize_batch(self, transcripts: Iterable[BatchItem], task_type: Optional[str] = None, level: str = "default", language: Optional[str] = None, ordered: bool = True, **options) -> Iterator[Tuple[int, str]]:
+        """
+        批量优化转录文本（如批处理流水线或历史记录），结果不写入缓存
+        
+        Args:
+            transcripts: 转录文本（或 (文本, 语言代码) 元组）的可迭代对象
+            task_type: 任务类型
+            level: 优化档位 ("default", "pro")
+            language: 默认语言代码
+            ordered: True 按输入顺序返回，False 按完成顺序返回
+            **options: 覆盖配置中的 max_in_flight / requests_per_second / pack_size / pack_max_chars
+        
+        Yields:
+            (输入序号, 优化后的 prompt)
+        """
+        if not self.prompt_optimizer:
+            print("LLM 提供商未初始化，无法优化 prompt")
+            for index, item in enumerate(transcripts):
+                yield index, item[0] if isinstance(item, tuple) else item
+            return
+        
+        batch_config = dict(self.config.get("prompt_optimization", {}).get("batch", {}))
+        batch_config.update(options)
+        batch_optimizer = BatchOptimizer(
+            self.prompt_optimizer,
+            max_in_flight=batch_config.get("max_in_flight", 4),
+            requests_per_second=batch_config.get("requests_per_second"),
+            pack_size=batch_config.get("pack_size", 1),
+            pack_max_chars=batch_config.get("pack_max_chars", 200),
+        )
+        yield from batch_optimizer.run(transcripts, self._resolve_task_type(task_type), level, language, ordered)
+    
+    def speculate(self, partial_transcript: str, task_type: Optional[str] = None, level: str = "default", language: Optional[str] = None, session: Optional[str] = "default") -> bool:
+        """
+        用流式转录中稳定的部分结果提前发起改写
+        
+        Args:
+            partial_transcript: 稳定的部分转录文本
+            task_type: 任务类型
+            level: 优化档位 ("default", "pro")
+            language: 检测到的语言代码
+            session: 会话名，同 optimize_prompt
+        
+        Returns:
+            是否发起了新的推测请求
+        """
+        if not self.speculator:
+            return False
+        _, context_text = self._render_context(session)
+        return self.speculator.update(partial_transcript, self._resolve_task_type(task_type), level, language, context_text)
+    
+    def resolve_speculation(self, transcript: str, task_type: Optional[str] = None, level: str = "default", save_result: bool = True, language: Optional[str] = None, session: Optional[str] = "default"):
+        """
+        用最终转录结束推测式改写，参数与返回值同 optimize_prompt
+        """
+        if not self.speculator:
+            return self.optimize_prompt(transcript, task_type, level, save_result, language, session)
+        
+        task_type = self._resolve_task_type(task_type)
+        try:
+            context, context_text = self._render_context(session)
+            try:
+                optimized_prompt = self.speculator.resolve(transcript, task_type, level, language, context_text)
+            except Exception as e:
+                print(f"Rephrase failed, keeping the transcript: {e}")
+                optimized_prompt = transcript
+            else:
+                if context:
+                    context.record(transcript, optimized_prompt)
+            if save_result:
+                return optimized_prompt, self._save_optimized(optimized_prompt)
+            return optimized_prompt
+        except Exception as e:
+            print(f"优化 prompt 失败: {e}")
+            return transcript
+    
+    def cancel_speculation(self):
+        """放弃正在进行的推测式改写"""
+        if self.speculator:
+            self.speculator.cancel()
+    
+    def _summarize_session(self, text: str, max_length: int) -> str:
+        """会话压缩使用的摘要函数，失败时抛出异常，由 SessionContext 保留旧轮次"""
+        if not self.prompt_optimizer:
+            raise RuntimeError("LLM 提供商未初始化")
+        return self.prompt_optimizer.summarize(text, max_length)
+    
     def summarize_text(self, transcript: str, max_length: int = 100) -> str:
         """
         总结转录文本
@@ -191,5 +387,10 @@ class LLMManager:
     def reload_config(self):
         """重新加载配置文件并重新初始化提供商"""
         self.config = self._load_config()
+        self.budget_model.save()
+        self.budget_model = self._create_budget_model()
+        # 会话参数可能已改变，之后的改写重新开始会话
+        with self._sessions_lock:
+            self.sessions.clear()
         self._initialize_provider()
         print("LLM配置已重新加载") 
\ No newline at end of file
@@ -0,0 +1,196 @@
+import re
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+POLITE_PREFIXES = [
+    "以下为", "以下是", "以下内容", "优化后的内容：", "优化结果：",
+    "转换后的内容：", "转换结果：", "输出结果：", "结果如下：",
+    "**优化后的 prompt：**", "**优化结果：**", "**输出：**"
+]
+POLITE_SUFFIXES = [
+    "以上为优化结果。", "以上为转换结果。", "以上为输出内容。",
+    "这就是优化后的内容。", "这就是转换结果。"
+]
+
+# Tag names the model produces for its wrapper, including truncated ones: REP, REPH, ..., REPHRASE
+_NAME = r'REP(?:H(?:R(?:A(?:S(?:E)?)?)?)?)?'
+# Complete wrapper-like tag, e.g. <REPHRASE>, </REPHRAS>, <REPHRASE id=1>; <repo_url> is not one
+_TAG_RE = re.compile(r'</?' + _NAME + r'(?:\s[^<>]*)?>', re.IGNORECASE)
+# Wrapper tags and unterminated wrapper fragments, removed when there is no complete block
+_FALLBACK_RE = re.compile(r'</?' + _NAME + r'(?:(?:\s[^<>]*)?>|\s*$|(?=\s))', re.IGNORECASE)
+# Trailing text that could still grow into a wrapper tag once more output arrives
+_PARTIAL_TAG_RE = re.compile(r'</?(?:R(?:E(?:P(?:H(?:R(?:A(?:S(?:E(?:\s[^<>]*)?)?)?)?)?)?)?)?)?', re.IGNORECASE)
+_PARTIAL_CLOSE_RE = re.compile(r'<(?:/(?:R(?:E(?:P(?:H(?:R(?:A(?:S(?:E\s*)?)?)?)?)?)?)?)?)?', re.IGNORECASE)
+_OPEN_RE = re.compile(r'<REPHRASE(?:\s[^<>]*)?>', re.IGNORECASE)
+_CLOSE_RE = re.compile(r'</REPHRASE\s*>', re.IGNORECASE)
+
+_BEFORE, _INSIDE, _AFTER = 0, 1, 2
+
+
+class PhraseMatcher:
+    """
+    Aho–Corasick automaton over a fixed phrase list
+
+    All phrases are matched in one pass over the text instead of one
+    startswith/endswith call per phrase. `anchored_match` only walks the first
+    `max_length` characters, so checking a prefix (or, with reverse=True, a
+    suffix) costs the same however long the text and however many phrases.
+    """
+
+    def __init__(self, phrases: Iterable[str], reverse: bool = False):
+        self.reverse = reverse
+        self.phrases = [p[::-1] if reverse else p for p in phrases if p]
+        self.max_length = max((len(p) for p in self.phrases), default=0)
+        self._first_chars = frozenset(p[0] for p in self.phrases)
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        for index, phrase in enumerate(self.phrases):
+            state = 0
+            for char in phrase:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append(index)
+        # Breadth-first failure links; outputs inherit those of their failure state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, target in self._goto[state].items():
+                queue.append(target)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[target] = self._goto[fail].get(char, 0)
+                self._out[target] = self._out[target] + self._out[self._fail[target]]
+
+    def iter_matches(self, text: str) -> Iterable[Tuple[int, int]]:
+        """Yield (start, phrase index) for every occurrence in text"""
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for index in self._out[state]:
+                yield position + 1 - len(self.phrases[index]), index
+
+    def anchored_match(self, text: str) -> int:
+        """Length of the longest phrase the text starts with (ends with, if reverse), 0 if none"""
+        if not text or (text[-1] if self.reverse else text[0]) not in self._first_chars:
+            return 0
+        window = text[-self.max_length:][::-1] if self.reverse else text[:self.max_length]
+        return max((len(self.phrases[index]) for start, index in self.iter_matches(window) if start == 0), default=0)
+
+
+_DEFAULT_PREFIXES = PhraseMatcher(POLITE_PREFIXES)
+_DEFAULT_SUFFIXES = PhraseMatcher(POLITE_SUFFIXES, reverse=True)
+
+
+class OutputNormalizer:
+    """
+    Incremental cleanup of LLM rewrite output
+
+    Feed the response chunk by chunk (or whole); each chunk is scanned once.
+    Content of the first complete <REPHRASE>…</REPHRASE> block wins and is kept
+    verbatim, so placeholders such as <repo_url> survive; only the exact closing
+    tag ends the block. Without a complete block the text is kept with the
+    wrapper tags and their truncated fragments (<REPH, </REPHRAS>) removed. A
+    tag split across chunks is held back until it can be classified. Polite
+    lead-in/closing phrases are stripped from the current text with the
+    Aho–Corasick matchers, touching only its ends, so `text()` stays cheap
+    while a response streams in.
+    """
+
+    def __init__(self, prefixes: Optional[PhraseMatcher] = None, suffixes: Optional[PhraseMatcher] = None):
+        self.prefixes = prefixes or _DEFAULT_PREFIXES
+        self.suffixes = suffixes or _DEFAULT_SUFFIXES
+        self._state = _BEFORE
+        self._preamble = ""
+        self._content = ""
+        self._pending = ""
+
+    @property
+    def closed(self) -> bool:
+        """True once a complete REPHRASE block was read, later chunks are ignored"""
+        return self._state == _AFTER
+
+    def feed(self, chunk: str) -> str:
+        """Add a chunk of model output and return the normalized text so far"""
+        if self._state != _AFTER and chunk:
+            self._pending = self._scan(self._pending + chunk)
+        return self.text()
+
+    def finish(self) -> str:
+        """End of output: held-back text is kept, an unterminated wrapper fragment is removed by text()"""
+        if self._state != _AFTER:
+            self._append(self._pending)
+        self._pending = ""
+        return self.text()
+
+    def _scan(self, data: str) -> str:
+        """Route data to preamble/content, returning an unresolved trailing tag fragment"""
+        position = 0
+        while self._state == _BEFORE:
+            lt = data.find("<", position)
+            if lt < 0:
+                self._append(data[position:])
+                return ""
+            self._append(data[position:lt])
+            tag = _TAG_RE.match(data, lt)
+            if tag:
+                if _OPEN_RE.fullmatch(tag.group(0)):
+                    self._state = _INSIDE
+                # Any other wrapper tag before the block is a fragment and is dropped
+                position = tag.end()
+            elif _PARTIAL_TAG_RE.fullmatch(data, lt):
+                return data[lt:]
+            else:
+                self._append("<")
+                position = lt + 1
+        if self._state == _INSIDE:
+            # Inside the block only the closing tag matters, everything else is content
+            close = _CLOSE_RE.search(data, position)
+            if close:
+                self._append(data[position:close.start()])
+                self._state = _AFTER
+                return ""
+            lt = data.rfind("<", position)
+            if lt >= 0 and _PARTIAL_CLOSE_RE.fullmatch(data, lt):
+                self._append(data[position:lt])
+                return data[lt:]
+            self._append(data[position:])
+        return ""
+
+    def _append(self, text: str):
+        if self._state == _BEFORE:
+            self._preamble += text
+        elif self._state == _INSIDE:
+            self._content += text
+
+    def text(self) -> str:
+        """Normalized text of everything fed so far"""
+        if self._state == _AFTER:
+            text = self._content.strip()
+        else:
+            text = _FALLBACK_RE.sub("", self._preamble + self._content).strip()
+        while True:
+            length = self.prefixes.anchored_match(text)
+            if not length:
+                break
+            text = text[length:].strip()
+        while True:
+            length = self.suffixes.anchored_match(text)
+            if not length:
+                break
+            text = text[:-length].strip()
+        return text
+
+
+def normalize_output(text: str) -> str:
+    """One-shot normalization of a complete model response"""
+    normalizer = OutputNormalizer()
+    normalizer.feed(text)
+    return normalizer.finish()
@@ -1,13 +1,17 @@
 import requests
 import json
 from typing import Dict, Any, Optional
-from .base import LLMProvider
+from .base import LLMProvider, LLMRequestError
 
 class OpenAIProvider(LLMProvider):
     """OpenAI API 提供商实现"""
     
+    supports_system_prompt = True
+    
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
+        # 复用 HTTP 连接（keep-alive），避免每次请求重新握手
+        self.session = requests.Session()
         self.api_key = config.get("api_key")
         self.base_url = config.get("base_url", "https://api.openai.com/v1")
         self.model = config.get("model", "gpt-3.5-turbo")
@@ -21,7 +25,7 @@ class OpenAIProvider(LLMProvider):
         
         Args:
             prompt: 输入提示词
-            **kwargs: 其他参数
+            **kwargs: 其他参数（system_prompt 为固定的系统消息，作为可被提供商缓存的前缀）
         
         Returns:
             生成的文本响应
@@ -37,28 +41,41 @@ class OpenAIProvider(LLMProvider):
             "Content-Type": "application/json"
         }
         
+        messages = []
+        if kwargs.get("system_prompt"):
+            messages.append({"role": "system", "content": kwargs["system_prompt"]})
+        messages.append({"role": "user", "content": prompt})
+        
         data = {
             "model": self.model,
-            "messages": [
-                {"role": "user", "content": prompt}
-            ],
+            "messages": messages,
             "temperature": temperature,
             "max_tokens": max_tokens
         }
         
         try:
-            response = requests.post(url, headers=headers, json=data, timeout=30)
+            timeout = kwargs.get("timeout", 30)
+            response = self.session.post(url, headers=headers, json=data, timeout=timeout)
             response.raise_for_status()
             
             result = response.json()
+            self._record_usage(result)
             return result["choices"][0]["message"]["content"]
             
         except requests.exceptions.RequestException as e:
-            raise Exception(f"OpenAI API request failed: {e}")
-        except KeyError as e:
-            raise Exception(f"OpenAI API response format error: {e}")
+            raise LLMRequestError.from_request_exception(f"OpenAI API request failed: {e}", e)
+        except (KeyError, IndexError, ValueError) as e:
+            raise LLMRequestError(f"OpenAI API response format error: {e}", retryable=False)
         except Exception as e:
-            raise Exception(f"OpenAI API call failed: {e}")
+            raise LLMRequestError(f"OpenAI API call failed: {e}", retryable=False)
+    
+    def health_check(self, timeout=(3.05, 5.0)) -> None:
+        """列出模型检查连通性和 API 密钥，不消耗 token"""
+        try:
+            response = self.session.get(f"{self.base_url}/models", headers={"Authorization": f"Bearer {self.api_key}"}, timeout=timeout)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            raise LLMRequestError.from_request_exception(f"OpenAI API health check failed: {e}", e)
     
     def test_connection(self) -> bool:
         """测试 OpenAI API 连接"""
@@ -0,0 +1,131 @@
+from typing import Dict, List, Optional, Tuple
+
+TASK_INSTRUCTIONS = {
+    "general": "Rewrite the following in a more professional and concise way.",
+    "coding": "Rewrite the following as a clear programming requirement.",
+    "writing": "Rewrite the following as a fluent writing guide.",
+    "analysis": "Rewrite the following as a concise analysis requirement."
+}
+
+LANGUAGE_NAMES = {
+    "zh": "Chinese",
+    "en": "English",
+    "ja": "Japanese",
+    "ko": "Korean",
+    "fr": "French",
+    "de": "German",
+    "es": "Spanish",
+    "it": "Italian",
+    "pt": "Portuguese",
+    "ru": "Russian",
+    "ar": "Arabic",
+    "hi": "Hindi"
+}
+
+REPHRASE_FORMAT = "Output in the following format:\n<REPHRASE>\n[Your rewritten content here]\n</REPHRASE>"
+PACKED_REPHRASE_FORMAT = (
+    "Each input item is wrapped in <ITEM id=N>...</ITEM>. Rewrite every item independently "
+    "and output one block per item, keeping its id:\n<REPHRASE id=N>\n[Your rewritten content here]\n</REPHRASE>"
+)
+SUMMARY_FORMAT = "Output in the following format:\n<SUMMARY>\n[Your summary here]\n</SUMMARY>"
+
+
+def language_name(language: Optional[str]) -> Optional[str]:
+    """Convert a language code to the name used in instructions"""
+    if not language:
+        return None
+    return LANGUAGE_NAMES.get(language, language.upper())
+
+
+class PromptTemplate:
+    """
+    A compiled prompt: a fixed system message plus the variable user content.
+
+    The system message only depends on the template key, so consecutive requests
+    share a byte-identical prefix that providers can serve from their prompt cache.
+    """
+
+    def __init__(self, key: Tuple, system: str):
+        self.key = key
+        self.system = system
+
+    def combined(self, user_content: str) -> str:
+        """Single-message form for providers without system message support"""
+        return f"{self.system}\n{user_content}"
+
+
+class PromptTemplates:
+    """Registry of precompiled prompt templates, built once per key"""
+
+    def __init__(self):
+        self._cache: Dict[Tuple, PromptTemplate] = {}
+
+    def rephrase(self, task_type: str, language: Optional[str] = None, level: str = "default") -> PromptTemplate:
+        """Template for rewriting a transcript; the transcript is the only user content"""
+        key = ("rephrase", task_type if task_type in TASK_INSTRUCTIONS else "general", language, level)
+        template = self._cache.get(key)
+        if template is None:
+            name = language_name(language)
+            target = f"Rewrite in {name}." if name else "Rewrite in the same language."
+            system = (
+                f"{TASK_INSTRUCTIONS[key[1]]} {target}\n"
+                "The text to rewrite follows.\n"
+                f"{REPHRASE_FORMAT}"
+            )
+            template = self._cache[key] = PromptTemplate(key, system)
+        return template
+
+    def rephrase_packed(self, task_type: str, language: Optional[str] = None, level: str = "default") -> PromptTemplate:
+        """Template for rewriting several short transcripts in one request"""
+        key = ("rephrase_packed", task_type if task_type in TASK_INSTRUCTIONS else "general", language, level)
+        template = self._cache.get(key)
+        if template is None:
+            name = language_name(language)
+            target = f"Rewrite in {name}." if name else "Rewrite each item in its own language."
+            system = (
+                f"{TASK_INSTRUCTIONS[key[1]].replace('the following', 'each of the following texts')} {target}\n"
+                f"{PACKED_REPHRASE_FORMAT}"
+            )
+            template = self._cache[key] = PromptTemplate(key, system)
+        return template
+
+    @staticmethod
+    def packed_content(items: List[Tuple[int, str]]) -> str:
+        """User content for a packed request"""
+        return "\n".join(f"<ITEM id={item_id}>\n{text}\n</ITEM>" for item_id, text in items)
+
+    def summary(self, max_length: int) -> PromptTemplate:
+        """Template for summarizing a transcript"""
+        key = ("summary", max_length)
+        template = self._cache.get(key)
+        if template is None:
+            system = (
+                f"Summarize the following in no more than {max_length} characters. Summarize in the same language.\n"
+                "The text to summarize follows.\n"
+                f"{SUMMARY_FORMAT}"
+            )
+            template = self._cache[key] = PromptTemplate(key, system)
+        return template
+
+    @staticmethod
+    def extension_content(previous_rephrase: str, continuation: str) -> str:
+        """User content for a follow-up rewrite that integrates a transcript continuation"""
+        return (
+            f"The beginning of the text has already been rewritten as:\n{previous_rephrase}\n"
+            f"The speaker then continued with:\n{continuation}\n"
+            "Produce the complete rewrite, integrating the continuation into the existing rewrite."
+        )
+
+    @staticmethod
+    def context_content(context: str, transcript: str) -> str:
+        """User content for a rewrite that may refer back to earlier requests of the session"""
+        return (
+            "Earlier in this session (context only, do not rewrite it):\n"
+            f"<CONTEXT>\n{context}\n</CONTEXT>\n"
+            "Rewrite only the following new text, resolving references such as \"it\" or \"also\" from the context:\n"
+            f"{transcript}"
+        )
+
+
+# Process-wide registry
+templates = PromptTemplates()
@@ -0,0 +1,246 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional, Tuple
+from src.llm.base import LLMProvider, LLMRequestError
+from src.metrics import metrics
+
+
+def _timeout_seconds(timeout) -> Optional[float]:
+    """requests 风格的超时（秒数或 (connect, read) 元组）对应的最长耗时"""
+    if isinstance(timeout, (tuple, list)):
+        return sum(timeout)
+    return timeout
+
+
+def _clip_timeout(timeout, limit: float):
+    """把超时限制在 limit 秒以内，保留元组形式"""
+    if isinstance(timeout, (tuple, list)):
+        return tuple(min(part, limit) for part in timeout)
+    return min(timeout, limit) if timeout else limit
+
+
+class CircuitBreaker:
+    """
+    单个提供商的熔断器
+
+    连续失败达到阈值后打开，在 reset_timeout 内直接拒绝请求；
+    之后进入半开状态，放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """当前是否允许发送请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def release(self):
+        """请求结束但不说明提供商是否健康（如 4xx 客户端错误），只释放半开状态的探测名额"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+                if self.state != self.OPEN:
+                    self._set_state(self.OPEN)
+
+    def _set_state(self, state: str):
+        self.state = state
+        metrics.incr("llm.resilience.breaker", provider=self.name, state=state)
+
+
+class ResilientProvider(LLMProvider):
+    """
+    在 LLMProvider.generate 外包一层容错：
+    - 429/5xx/网络错误按带抖动的指数退避重试；Retry-After 超过 backoff_max 时不等待，直接切换
+    - 同一提供商的所有尝试（含退避等待）共用一个截止时间，重试的超时不超过剩余时间
+    - 每个提供商一个熔断器，不可重试的 4xx 错误不计入
+    - 请求耗时超过当前 p95 时发送一个对冲请求，取先返回的结果
+    - 主提供商失败后依次切换到备用提供商
+    每个决策都记录为指标。
+    """
+
+    supports_system_prompt = True
+
+    def __init__(self, primary: LLMProvider, fallbacks: Optional[List[LLMProvider]] = None,
+                 config: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            primary: 主提供商
+            fallbacks: 按顺序尝试的备用提供商
+            config: 容错参数（max_retries, backoff_base, backoff_max, deadline, min_retry_timeout,
+                    failure_threshold, reset_timeout, hedge, hedge_percentile, hedge_min_samples）；
+                    deadline 为空时以第一次请求的超时作为所有尝试的总时限
+        """
+        super().__init__(primary.config)
+        config = config or {}
+        self.primary = primary
+        self.fallbacks = fallbacks or []
+        self.name = primary.name
+        self.max_retries = config.get("max_retries", 2)
+        self.backoff_base = config.get("backoff_base", 0.5)
+        self.backoff_max = config.get("backoff_max", 8.0)
+        self.deadline = config.get("deadline")
+        self.min_retry_timeout = config.get("min_retry_timeout", 5.0)
+        self.hedge = config.get("hedge", True)
+        self.hedge_percentile = config.get("hedge_percentile", 95.0)
+        self.hedge_min_samples = config.get("hedge_min_samples", 20)
+        self.breakers = {
+            provider.name: CircuitBreaker(
+                provider.name,
+                failure_threshold=config.get("failure_threshold", 5),
+                reset_timeout=config.get("reset_timeout", 30.0),
+            )
+            for provider in [primary] + self.fallbacks
+        }
+        self._executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-request")
+
+    def generate(self, prompt: str, **kwargs) -> str:
+        last_error: Optional[Exception] = None
+        for position, provider in enumerate([self.primary] + self.fallbacks):
+            breaker = self.breakers[provider.name]
+            if not breaker.allow():
+                metrics.incr("llm.resilience.short_circuit", provider=provider.name)
+                continue
+            if position > 0:
+                metrics.incr("llm.resilience.failover", provider=provider.name)
+                print(f"Failing over to LLM provider: {provider.name}")
+            try:
+                text, usage = self._call_with_retries(provider, breaker, prompt, kwargs)
+            except Exception as e:
+                last_error = e
+                continue
+            self._local.usage = usage
+            return text
+        metrics.incr("llm.resilience.exhausted", provider=self.name)
+        if last_error is None:
+            raise LLMRequestError("All LLM providers are temporarily unavailable (circuit open)")
+        raise last_error
+
+    def _call_with_retries(self, provider: LLMProvider, breaker: CircuitBreaker, prompt: str,
+                           kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        deadline = time.monotonic() + (self.deadline or _timeout_seconds(kwargs.get("timeout")) or 60.0)
+        attempt_kwargs = kwargs
+        for attempt in range(self.max_retries + 1):
+            try:
+                result = self._call_hedged(provider, prompt, attempt_kwargs)
+                breaker.record_success()
+                return result
+            except Exception as e:
+                retryable = getattr(e, "retryable", False)
+                status_code = getattr(e, "status_code", None)
+                if not retryable and status_code is not None and 400 <= status_code < 500:
+                    # 401/403/400 等是请求本身的问题（如 API key 错误），不代表提供商故障，不计入熔断
+                    breaker.release()
+                    raise
+                breaker.record_failure()
+                if not retryable or attempt >= self.max_retries or not breaker.allow():
+                    raise
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after and retry_after > self.backoff_max:
+                    # 不为服务端要求的长时间等待阻塞调用方（可能是 GUI 的改写路径），直接切换到备用提供商
+                    metrics.incr("llm.resilience.retry_after_exceeded", provider=provider.name)
+                    raise
+                # Full jitter 指数退避，服务端给出 Retry-After 时以其为准（不超过 backoff_max）
+                delay = retry_after if retry_after else random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+                remaining = deadline - time.monotonic() - delay
+                if remaining < self.min_retry_timeout:
+                    # 读超时等慢失败已经用掉了时限，再重试只会让调用方多等一个完整的超时
+                    metrics.incr("llm.resilience.deadline_exceeded", provider=provider.name)
+                    raise
+                attempt_kwargs = dict(kwargs, timeout=_clip_timeout(kwargs.get("timeout"), remaining))
+                metrics.incr("llm.resilience.retry", provider=provider.name, status=getattr(e, "status_code", None))
+                print(f"LLM request failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+        raise LLMRequestError("unreachable")
+
+    def _hedge_delay(self, provider: LLMProvider) -> Optional[float]:
+        if not self.hedge or metrics.count("llm.provider.latency", provider=provider.name) < self.hedge_min_samples:
+            return None
+        return metrics.percentile("llm.provider.latency", self.hedge_percentile, provider=provider.name)
+
+    def _call_hedged(self, provider: LLMProvider, prompt: str, kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """发送请求，超过 p95 延迟仍未返回时再发送一个相同的请求"""
+        delay = self._hedge_delay(provider)
+        if delay is None:
+            return self._call_once(provider, prompt, kwargs)
+
+        first = self._executor.submit(self._call_once, provider, prompt, kwargs)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        metrics.incr("llm.resilience.hedge", provider=provider.name, event="sent")
+        second = self._executor.submit(self._call_once, provider, prompt, kwargs)
+        labels = {first: "primary", second: "hedge"}
+        pending = {first, second}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    metrics.incr("llm.resilience.hedge", provider=provider.name, event=f"{labels[future]}_won")
+                    for other in pending:
+                        other.cancel()
+                    return future.result()
+        raise error
+
+    def _call_once(self, provider: LLMProvider, prompt: str, kwargs: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """在当前线程调用一次提供商，返回文本和该次请求的用量"""
+        if not provider.supports_system_prompt and kwargs.get("system_prompt"):
+            kwargs = dict(kwargs)
+            prompt = f"{kwargs.pop('system_prompt')}\n{prompt}"
+        start = time.perf_counter()
+        try:
+            text = provider.generate(prompt, **kwargs)
+        except Exception:
+            metrics.incr("llm.provider.errors", provider=provider.name)
+            raise
+        metrics.observe("llm.provider.latency", time.perf_counter() - start, provider=provider.name)
+        return text, provider.pop_last_usage()
+
+    def test_connection(self) -> bool:
+        return self.primary.test_connection()
+
+    def health_check(self, timeout=(3.05, 5.0)) -> None:
+        self.primary.health_check(timeout)
+
+    def get_provider_info(self) -> Dict[str, Any]:
+        info = self.primary.get_provider_info()
+        if self.fallbacks:
+            info["fallbacks"] = [provider.name for provider in self.fallbacks]
+        info["circuit"] = {name: breaker.state for name, breaker in self.breakers.items()}
+        return info
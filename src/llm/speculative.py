@@ -0,0 +1,128 @@
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Optional
+from src.metrics import metrics
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    return _WHITESPACE_RE.sub(" ", text or "").strip()
+
+
+class SpeculativeRephraser:
+    """
+    推测式改写：在流式转录产生稳定的部分结果时提前发起改写请求，
+    让 LLM 延迟与用户说话、ASR 收尾阶段重叠。
+
+    最终转录到达后：
+    - 与推测前缀一致：直接复用推测结果
+    - 只是在前缀后追加：基于推测结果发起一次较短的续写请求
+    - 前缀被修改：丢弃推测结果并重新改写
+    """
+
+    def __init__(self, optimize_fn: Callable[..., str], extend_fn: Callable[..., str],
+                 min_growth_chars: int = 12, max_extension_ratio: float = 0.5,
+                 result_timeout: float = 60.0):
+        """
+        Args:
+            optimize_fn: 完整改写函数 (transcript, task_type, level, language, context) -> str，
+                失败时应抛出异常而不是返回原文，否则失败的推测会被当作改写结果复用
+            extend_fn: 续写函数 (previous_rephrase, continuation, task_type, level, language) -> str
+            min_growth_chars: 部分转录至少增长多少字符才重新推测
+            max_extension_ratio: 追加部分占最终转录的最大比例，超过则直接重新改写
+            result_timeout: 等待推测结果的最长时间（秒）
+        """
+        self.optimize_fn = optimize_fn
+        self.extend_fn = extend_fn
+        self.min_growth_chars = min_growth_chars
+        self.max_extension_ratio = max_extension_ratio
+        self.result_timeout = result_timeout
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="speculative-rephrase")
+        self._lock = threading.Lock()
+        self._prefix = ""
+        self._params = None
+        self._future: Optional[Future] = None
+
+    def update(self, partial_transcript: str, task_type: str, level: str, language: Optional[str] = None,
+               context: Optional[str] = None) -> bool:
+        """
+        提交一个稳定的部分转录
+
+        context 是会话上下文，只随请求发送，不参与是否复用推测结果的判断
+        （后台压缩会改变上下文文本，但不改变其含义）
+
+        Returns:
+            是否发起了新的推测请求
+        """
+        partial = _normalize(partial_transcript)
+        if not partial:
+            return False
+        params = (task_type, level, language)
+        with self._lock:
+            if self._future is not None and self._params == params:
+                if partial == self._prefix:
+                    return False
+                if partial.startswith(self._prefix) and len(partial) - len(self._prefix) < self.min_growth_chars:
+                    return False
+                if partial.startswith(self._prefix) and self._future.running():
+                    # 正在进行的请求仍然可以通过续写复用，不打断它
+                    return False
+            if self._future is not None and not self._future.done():
+                # HTTP 请求无法中断，未开始的直接取消，已开始的结果将被丢弃
+                self._future.cancel()
+                metrics.incr("llm.speculation.discarded")
+            self._prefix = partial
+            self._params = params
+            self._future = self._executor.submit(self.optimize_fn, partial, task_type, level, language, context)
+        metrics.incr("llm.speculation.started")
+        return True
+
+    def resolve(self, final_transcript: str, task_type: str, level: str, language: Optional[str] = None,
+                context: Optional[str] = None) -> str:
+        """
+        用最终转录结束推测，返回改写结果
+
+        重新改写失败时抛出异常，由调用方决定是否退回原文
+        """
+        final = _normalize(final_transcript)
+        with self._lock:
+            future, prefix, params = self._future, self._prefix, self._params
+            self._future, self._prefix, self._params = None, "", None
+
+        outcome = "restart"
+        result = None
+        if future is not None and params == (task_type, level, language) and final.startswith(prefix):
+            continuation = final[len(prefix):].strip()
+            if not continuation or len(continuation) <= self.max_extension_ratio * len(final):
+                try:
+                    speculative_result = future.result(timeout=self.result_timeout)
+                    if not continuation:
+                        outcome = "hit"
+                        result = speculative_result
+                    else:
+                        outcome = "extend"
+                        result = self.extend_fn(speculative_result, continuation, task_type, level, language)
+                except Exception as e:
+                    print(f"Speculative rephrase failed, restarting: {e}")
+                    outcome = "error"
+
+        metrics.incr("llm.speculation.outcome", outcome=outcome)
+        if result is None:
+            if future is not None:
+                future.cancel()
+            result = self.optimize_fn(final, task_type, level, language, context)
+        return result
+
+    def cancel(self):
+        """放弃当前推测（例如录音被取消）"""
+        with self._lock:
+            if self._future is not None:
+                self._future.cancel()
+                metrics.incr("llm.speculation.discarded")
+            self._future, self._prefix, self._params = None, "", None
+
+    def shutdown(self):
+        self.cancel()
+        self._executor.shutdown(wait=False)
@@ -2,6 +2,16 @@
 """
 Talkie-Codie main program
 Complete speech-to-text workflow with LLM optimization
+
+The Whisper model and the LLM provider's HTTP connections are created once
+and stay warm for every utterance of the run.
+
+Examples:
+    python src/main.py                           # One utterance, ends after a pause
+    python src/main.py --continuous --json       # Dictation loop, JSON lines on stdout
+    python src/main.py --mode ptt --continuous   # Enter starts/stops each utterance
+    python src/main.py --file a.wav b.wav        # Transcribe files
+    cat clip.wav | python src/main.py --file -   # WAV or raw 16 kHz s16le PCM from stdin
 """
 
 import sys
@@ -10,155 +20,249 @@ import os
 # Add project root directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from src.audio.core import AudioProcessor
+import argparse
+import json
+import threading
+import time
+
+from src.audio import longform
+from src.audio.pcm import decode_pcm, decode_wav, duration_seconds, WHISPER_SAMPLE_RATE
+from src.audio.whisper_transcriber import load_whisper_config, get_whisper_model, stream_transcription
 from src.llm.manager import LLMManager
 
+TASK_TYPES = ["general", "coding", "writing", "analysis"]
+LANGUAGE_SESSION = "cli"  # Spoken language stays pinned across the utterances of a run
+
+
+class Output:
+    """Human-readable results, or one JSON object per line for editors and scripts"""
+
+    def __init__(self, json_mode, stream):
+        self.json_mode = json_mode
+        self.stream = stream
+
+    def _write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self.stream.flush()
+
+    def status(self, message):
+        if self.json_mode:
+            self._write({"type": "status", "message": message})
+        else:
+            print(message, file=sys.stderr, flush=True)
+
+    def segment(self, index, segment):
+        if self.json_mode:
+            self._write({"type": "segment", "utterance": index, **segment})
+
+    def result(self, index, source, transcript, prompt, language, timings):
+        if self.json_mode:
+            self._write({"type": "utterance", "utterance": index, "source": source, "transcript": transcript,
+                         "prompt": prompt, "language": language, "timings": timings})
+            return
+        print("\n=== Transcription Result ===", file=self.stream)
+        print(transcript, file=self.stream)
+        if prompt is not None:
+            print("\n=== Optimized Prompt ===", file=self.stream)
+            print(prompt, file=self.stream)
+        parts = [f"audio {timings['audio']:.1f} s"]
+        if timings.get("record") is not None:
+            parts.append(f"record {timings['record']:.1f} s")
+        parts.append(f"transcribe {timings['transcribe']:.2f} s (first segment {timings['first_segment']:.2f} s)")
+        if timings.get("llm") is not None:
+            parts.append(f"LLM {timings['llm']:.2f} s")
+        parts.append(f"total {timings['total']:.2f} s")
+        print(f"[{language}] " + " | ".join(parts), file=sys.stderr, flush=True)
+        self.stream.flush()
+
+
+def record_utterance(args, out):
+    """
+    Record one utterance from the microphone as 16 kHz mono float32
+
+    vad: starts on the first block above --threshold and ends after --silence-ms of silence
+    ptt: Enter starts and Enter stops the recording
+    fixed: records --duration seconds
+
+    Returns:
+        tuple: (samples or None if nothing was said, recording seconds)
+    """
+    from src.audio.capture import AudioCapture
+
+    speech = threading.Event()
+    ended = threading.Event()
+    silent_since = [None]
+
+    def on_level(rms):
+        now = time.monotonic()
+        if rms >= args.threshold:
+            speech.set()
+            silent_since[0] = None
+        elif speech.is_set():
+            if silent_since[0] is None:
+                silent_since[0] = now
+            elif (now - silent_since[0]) * 1000 >= args.silence_ms:
+                ended.set()
+
+    if args.mode == "ptt":
+        out.status("Press Enter to start recording")
+        if not sys.stdin.readline():
+            raise EOFError
+    capture = AudioCapture(WHISPER_SAMPLE_RATE, device=args.device, max_seconds=args.max_seconds,
+                           on_level=on_level if args.mode == "vad" else None)
+    capture.start()
+    start = time.perf_counter()
+    try:
+        if args.mode == "ptt":
+            out.status("Recording... press Enter to stop")
+            sys.stdin.readline()
+        elif args.mode == "fixed":
+            out.status(f"Recording {args.duration:g} s...")
+            time.sleep(args.duration)
+        else:
+            out.status("Listening...")
+            if not speech.wait(args.max_wait):
+                return None, time.perf_counter() - start
+            ended.wait(args.max_seconds)
+    finally:
+        frames = capture.stop()
+    return frames[:, 0], time.perf_counter() - start
+
+
+def read_input(path):
+    """Audio for --file: a path is transcribed in place, "-" reads WAV or raw PCM bytes from stdin"""
+    if path != "-":
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Audio file not found: {path}")
+        return path
+    data = sys.stdin.buffer.read()
+    return decode_wav(data) if data[:4] == b"RIFF" else decode_pcm(data)
+
+
+def process(index, audio, source, args, llm_manager, out, record_seconds=None):
+    """Transcribe one utterance, optimize it and report results with per-stage timings"""
+    start = time.perf_counter()
+    stream = stream_transcription(audio, args.model_size, session=LANGUAGE_SESSION)
+    first_segment = None
+    for segment in stream:
+        if first_segment is None:
+            first_segment = time.perf_counter() - start
+        out.segment(index, segment)
+        if llm_manager and segment["text"]:
+            # Start rewriting the finished sentences while later ones are still decoding
+            llm_manager.speculate(stream.partial_text(), args.task, args.level, language=stream.language)
+    transcript = stream.text()
+    transcribed = time.perf_counter()
+
+    prompt, llm_seconds = None, None
+    if llm_manager and transcript:
+        result = llm_manager.resolve_speculation(transcript, args.task, args.level, save_result=args.save,
+                                                 language=stream.language)
+        prompt = result[0] if isinstance(result, tuple) else result
+        llm_seconds = time.perf_counter() - transcribed
+    elif llm_manager:
+        llm_manager.cancel_speculation()
+
+    if isinstance(audio, str):
+        audio_seconds = longform.file_duration(audio) or getattr(stream.info, "duration", 0.0)
+    else:
+        audio_seconds = duration_seconds(audio)
+    timings = {
+        "record": record_seconds,
+        "audio": audio_seconds,
+        "first_segment": first_segment if first_segment is not None else transcribed - start,
+        "transcribe": transcribed - start,
+        "llm": llm_seconds,
+        "total": time.perf_counter() - start,
+    }
+    out.result(index, source, transcript, prompt, stream.language, timings)
+
+
+def list_devices():
+    import sounddevice as sd
+    for idx, dev in enumerate(sd.query_devices()):
+        if dev.get('max_input_channels', 0) > 0:
+            print(f"{idx}: {dev.get('name', f'Device{idx}')} (Input channels: {dev['max_input_channels']})")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Talkie-Codie speech-to-prompt command line")
+    source = parser.add_argument_group("input")
+    source.add_argument("--file", nargs="+", metavar="PATH", help='Transcribe audio files instead of the microphone ("-" = stdin)')
+    source.add_argument("--mode", choices=["vad", "ptt", "fixed"], default="vad",
+                        help="Microphone endpointing: vad (stop after a pause), ptt (Enter to start/stop), fixed (--duration)")
+    source.add_argument("--continuous", action="store_true", help="Keep dictating until Ctrl+C (or EOF in ptt mode)")
+    source.add_argument("--device", type=int, help="Input device id (see --list-devices)")
+    source.add_argument("--list-devices", action="store_true", help="List input devices and exit")
+    source.add_argument("--duration", type=float, default=5, help="Recording length in fixed mode (seconds)")
+    source.add_argument("--silence-ms", type=int, default=1200, help="Pause that ends an utterance in vad mode")
+    source.add_argument("--threshold", type=float, default=0.01, help="RMS level counted as speech in vad mode")
+    source.add_argument("--max-wait", type=float, default=30, help="Seconds to wait for speech in vad mode")
+    source.add_argument("--max-seconds", type=float, default=120, help="Longest utterance recorded")
+
+    processing = parser.add_argument_group("processing")
+    processing.add_argument("--model-size", help="Override model_size from whisper_config.json")
+    processing.add_argument("--task", choices=TASK_TYPES, help="Rewrite task type (default from llm_config.json)")
+    processing.add_argument("--level", choices=["default", "pro"], default="default", help="Rewrite level")
+    processing.add_argument("--no-llm", action="store_true", help="Only transcribe, skip prompt optimization")
+    processing.add_argument("--save", action="store_true", help="Keep optimized prompts in cache/optimized")
+    processing.add_argument("--no-warmup", action="store_true", help="Load the Whisper model on the first utterance")
+
+    parser.add_argument("--json", action="store_true",
+                        help="Write JSON lines (segments, per-utterance results with timings) to stdout, logs go to stderr")
+    return parser
+
+
 def main():
     """Main program entry point"""
-    print("=== Talkie-Codie Speech-to-Text Tool ===")
-    print("Convert your speech to text and optimize it to better prompt using LLM\n")
-    
-    # Initialize audio processor
-    processor = AudioProcessor()
-    
-    # Initialize LLM manager
-    llm_manager = LLMManager()
-    
-    # Check LLM configuration
-    if not llm_manager.current_provider:
-        print("LLM provider not configured, will skip prompt optimization step")
-        print("Please configure config/llm_config.json file")
-        use_llm = False
-    else:
-        print(f"Current LLM provider: {llm_manager.get_current_provider_info()}")
-        use_llm = True
-    
-    # List audio devices
-    devices = processor.list_audio_devices()
-    print()
-    
-    # Select audio device
-    device_idx = input("Please enter the input device number you want to use (default Enter for system default): ")
-    device = None
-    if device_idx.strip():
-        try:
-            device = int(device_idx)
-            if device < 0 or device >= len(devices):
-                print("Device number out of range, using default device.")
-                device = None
-        except ValueError:
-            print("Invalid input, using default device.")
-            device = None
-    
-    # Check audio input
-    if not processor.check_audio_levels(2, device=device):
-        print("Please check microphone connection and system permission settings")
-        return
-    
-    # Set recording parameters
-    duration = input("Please enter recording duration (seconds, default 5): ")
-    try:
-        duration = float(duration)
-    except ValueError:
-        duration = 5
-    duration = int(duration)
-    
-    # Select Whisper model
-    print("\nAvailable Whisper model sizes:")
-    print("tiny: Fastest, lower accuracy")
-    print("base: Balanced speed and accuracy (recommended)")
-    print("small: More accurate, slightly slower")
-    print("medium: High accuracy, slower")
-    print("large: Highest accuracy, slowest")
-    
-    model_size = input("Please select model size (default base): ").strip() or "base"
-    
-    # Ask whether to use custom filename
-    use_custom_name = input("Use custom filename? (y/n, default n): ").lower().strip() in ['y', 'yes']
-    output_path = None
-    if use_custom_name:
-        custom_name = input("Please enter custom filename (without extension): ").strip()
-        if custom_name:
-            output_path = f"cache/audio/{custom_name}.wav"
-    
+    args = build_parser().parse_args()
+    if args.list_devices:
+        list_devices()
+        return 0
+
+    out = Output(args.json, sys.stdout)
+    if args.json:
+        # Keep stdout machine-readable: library progress prints go to stderr
+        sys.stdout = sys.stderr
+
+    # Warm resources, reused by every utterance
+    llm_manager = None
+    if not args.no_llm:
+        llm_manager = LLMManager()
+        if not llm_manager.current_provider:
+            out.status("LLM provider not configured, skipping prompt optimization (see config/llm_config.json)")
+            llm_manager = None
+    if not args.no_warmup:
+        config = load_whisper_config()
+        if args.model_size:
+            config["model_size"] = args.model_size
+        get_whisper_model(config)
+
+    index = 0
     try:
-        # Execute complete recording and transcription workflow
-        transcript, audio_path, transcript_path, volume, detected_language = processor.record_and_transcribe(
-            duration=duration,
-            model_size=model_size,
-            device=device,
-            output_path=output_path
-        )
-        
-        print(f"\n=== Transcription Result ===")
-        print(transcript)
-        if detected_language:
-            print(f"Detected language: {detected_language}")
-        
-        # LLM optimization
-        if use_llm:
-            print(f"\n=== LLM Optimization ===")
-            
-            # Select task type
-            print("Please select task type:")
-            print("1. general - General optimization")
-            print("2. coding - Programming related")
-            print("3. writing - Writing related")
-            print("4. analysis - Analysis related")
-            
-            task_choice = input("Please select task type (1-4, default 1): ").strip() or "1"
-            task_types = {"1": "general", "2": "coding", "3": "writing", "4": "analysis"}
-            task_type = task_types.get(task_choice, "general")
-            
-            print(f"Using task type: {task_type}")
-            
-            # Select optimization level
-            print("\nPlease select optimization level:")
-            print("1. default - Concise optimization")
-            print("2. pro - Professional optimization")
-            
-            level_choice = input("Please select level (1-2, default 1): ").strip() or "1"
-            levels = {"1": "default", "2": "pro"}
-            level = levels.get(level_choice, "default")
-            
-            print(f"Using level: {level}")
-            print("Optimizing prompt...")
-            
-            result = llm_manager.optimize_prompt(transcript, task_type, level, language=detected_language)
-            
-            # Process return result
-            if isinstance(result, tuple):
-                optimized_prompt, optimized_path = result
-            else:
-                optimized_prompt = result
-                optimized_path = None
-            
-            print(f"\n=== Optimized Prompt ===")
-            print(optimized_prompt)
-        
-        print(f"\n=== Workflow Completed ===")
-        print("Audio file:", audio_path)
-        if transcript_path:
-            print("Transcription file:", transcript_path)
-        if use_llm and optimized_path:
-            print("Optimized file:", optimized_path)
-        
-        # Ask whether to continue
+        if args.file:
+            for path in args.file:
+                index += 1
+                process(index, read_input(path), "stdin" if path == "-" else path, args, llm_manager, out)
+            return 0
         while True:
-            choice = input("\nContinue recording and transcription? (y/n): ").lower().strip()
-            if choice in ['y', 'yes']:
-                print("\n" + "="*50 + "\n")
-                main()  # Recursive call, restart
-                break
-            elif choice in ['n', 'no']:
-                print("Thank you for using Talkie-Codie!")
-                break
-            else:
-                print("Please enter y or n")
-        
+            audio, record_seconds = record_utterance(args, out)
+            if audio is None or len(audio) == 0:
+                out.status("No speech detected")
+                if not args.continuous:
+                    return 1
+                continue
+            index += 1
+            process(index, audio, "microphone", args, llm_manager, out, record_seconds)
+            if not args.continuous:
+                return 0
+    except (KeyboardInterrupt, EOFError):
+        out.status("Stopped")
+        return 0
     except Exception as e:
-        print(f"Error occurred during program execution: {e}")
-        print("Please check if audio file exists, or run the program again.")
+        out.status(f"Error: {e}")
+        return 1
+
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    sys.exit(main())
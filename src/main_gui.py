@@ -15,6 +15,7 @@ class NewMainWindow(QMainWindow):
         self.setCentralWidget(self.main_widget)
 
     def closeEvent(self, event):
+        self.main_widget.shutdown()
         # Clear cache directory when closing window
         cache_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
         if os.path.exists(cache_dir):
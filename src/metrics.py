@@ -0,0 +1,114 @@
+"""
+Lightweight in-process metrics registry
+
+Counters and sample histograms shared by the audio and LLM pipelines, so
+that latency, throughput and decision points can be inspected at runtime
+(e.g. via `metrics.snapshot()`) without an external monitoring stack.
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+
+HISTOGRAM_WINDOW = 1024  # Number of recent samples kept per histogram
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple:
+    return (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+
+
+def _format_key(key: Tuple) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of counters and windowed histograms"""
+
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple, float] = {}
+        self._histograms: Dict[Tuple, deque] = {}
+
+    def incr(self, name: str, value: float = 1, /, **labels) -> None:
+        """Increase a counter"""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, /, **labels) -> None:
+        """Record a sample into a histogram"""
+        key = _key(name, labels)
+        with self._lock:
+            samples = self._histograms.get(key)
+            if samples is None:
+                samples = self._histograms[key] = deque(maxlen=self.window)
+            samples.append(float(value))
+
+    @contextmanager
+    def timer(self, name: str, /, **labels):
+        """Record the elapsed wall time of a block in seconds"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def counter(self, name: str, /, **labels) -> float:
+        with self._lock:
+            return self._counters.get(_key(name, labels), 0)
+
+    def count(self, name: str, /, **labels) -> int:
+        """Number of samples currently held by a histogram"""
+        with self._lock:
+            return len(self._histograms.get(_key(name, labels), ()))
+
+    def percentile(self, name: str, q: float, /, **labels) -> Optional[float]:
+        """
+        Get a percentile of the recent samples of a histogram
+
+        Args:
+            name: Histogram name
+            q: Percentile between 0 and 100
+
+        Returns:
+            Percentile value, or None if no samples were recorded
+        """
+        with self._lock:
+            samples = self._histograms.get(_key(name, labels))
+            if not samples:
+                return None
+            ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get a plain dict view of all metrics"""
+        with self._lock:
+            counters = {_format_key(k): v for k, v in self._counters.items()}
+            histograms = {k: sorted(v) for k, v in self._histograms.items() if v}
+        summary = {}
+        for key, ordered in histograms.items():
+            n = len(ordered)
+            summary[_format_key(key)] = {
+                "count": n,
+                "mean": sum(ordered) / n,
+                "p50": ordered[int(0.5 * (n - 1))],
+                "p95": ordered[int(round(0.95 * (n - 1)))],
+                "max": ordered[-1],
+            }
+        return {"counters": counters, "histograms": summary}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# Process-wide registry
+metrics = Metrics()
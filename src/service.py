@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Talkie-Codie headless service
+Exposes transcribe, optimize and transcribe+optimize over a local HTTP API,
+sharing one warm Whisper model and LLM connection pool across clients
+"""
+
+import sys
+import os
+
+# Add project root directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from src.audio.pcm import decode_pcm, decode_wav, duration_seconds, WHISPER_SAMPLE_RATE
+from src.audio.scheduler import TranscriptionScheduler
+from src.audio.whisper_transcriber import load_whisper_config, get_whisper_model
+from src.batching import MicroBatcher, QueueFullError
+from src.llm.manager import LLMManager
+from src.metrics import metrics
+
+STREAM_TTL_SEC = 300  # Unfinished streams are dropped after this many seconds of inactivity
+MAX_UPLOAD_MB = 64    # Largest request body or streamed upload, about 35 minutes of 16 kHz int16 audio
+
+
+class BadRequest(Exception):
+    """Invalid client input, answered with HTTP 400"""
+
+
+class NotFound(Exception):
+    """Unknown route or stream, answered with HTTP 404"""
+
+
+class PayloadTooLarge(Exception):
+    """Upload over the size limit, answered with HTTP 413"""
+
+
+class VoicePromptService:
+    """Shared pipeline state: warm model, LLM manager, request queues and open streams"""
+
+    def __init__(self, llm_config_path="config/llm_config.json", max_batch_size=8, max_wait_ms=20,
+                 max_queue=64, request_timeout=120, optimize_workers=4, max_upload_bytes=MAX_UPLOAD_MB << 20):
+        self.llm_manager = LLMManager(config_path=llm_config_path)
+        self.request_timeout = request_timeout
+        self.max_upload_bytes = max_upload_bytes
+        # One Whisper model decodes one batch at a time, so transcription has a single worker;
+        # LLM calls are network bound, several batches may be in flight for independent clients
+        self.transcribe_queue = TranscriptionScheduler(max_batch_size, max_wait_ms, max_queue)
+        self.optimize_queue = MicroBatcher(
+            "optimize", self._optimize_batch,
+            max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, max_queue=max_queue, workers=optimize_workers,
+            can_batch=lambda first, item: (first["task_type"], first["level"]) == (item["task_type"], item["level"])
+        )
+        self._streams = {}
+        self._streams_lock = threading.Lock()
+
+    def warm_up(self):
+        """Load the Whisper model before the first request arrives"""
+        get_whisper_model(load_whisper_config())
+
+    # ---- batch workers ----
+
+    def _optimize_batch(self, items):
+        if not self.llm_manager.prompt_optimizer:
+            return [{"optimized": item["transcript"], "llm": False} for item in items]
+        first = items[0]
+        if len(items) == 1:
+            # Clients are independent, requests carry no session context
+            optimized = self.llm_manager.optimize_prompt(
+                first["transcript"], first["task_type"], first["level"], save_result=False, language=first["language"],
+                session=None
+            )
+            return [{"optimized": optimized, "llm": True}]
+        # Concurrent requests arriving together are sent packed into a single LLM call
+        results = [None] * len(items)
+        batch = [(item["transcript"], item["language"]) for item in items]
+        for index, optimized in self.llm_manager.optimize_batch(
+            batch, first["task_type"], first["level"], pack_size=len(items), max_in_flight=len(items)
+        ):
+            results[index] = {"optimized": optimized, "llm": True}
+        return results
+
+    # ---- public operations ----
+
+    def transcribe(self, audio, user=None):
+        # Clients that send a user id get their spoken language pinned after the first confident detection
+        transcript, language = self.transcribe_queue.transcribe(audio, timeout=self.request_timeout, session=user)
+        audio_sec = duration_seconds(audio)
+        metrics.incr("service.audio_seconds", audio_sec)
+        return {"transcript": transcript, "language": language, "audio_seconds": audio_sec}
+
+    def optimize(self, transcript, task_type=None, level="default", language=None):
+        item = {
+            "transcript": transcript,
+            "task_type": task_type or self.llm_manager._resolve_task_type(None),
+            "level": level,
+            "language": language,
+        }
+        return self.optimize_queue.submit(item).result(timeout=self.request_timeout)
+
+    def transcribe_optimize(self, audio, task_type=None, level="default", user=None):
+        result = self.transcribe(audio, user)
+        result.update(self.optimize(result["transcript"], task_type, level, result["language"]))
+        return result
+
+    # ---- streamed uploads ----
+
+    def open_stream(self, audio_format):
+        self._drop_stale_streams()
+        stream_id = uuid.uuid4().hex
+        with self._streams_lock:
+            self._streams[stream_id] = {"format": audio_format, "chunks": [], "bytes": 0, "touched": time.monotonic()}
+        return stream_id
+
+    def append_stream(self, stream_id, data):
+        with self._streams_lock:
+            stream = self._streams.get(stream_id)
+            if stream is None:
+                raise NotFound(f"Unknown stream: {stream_id}")
+            if stream["bytes"] + len(data) > self.max_upload_bytes:
+                del self._streams[stream_id]
+                raise PayloadTooLarge(f"Stream exceeds {self.max_upload_bytes} bytes, dropped")
+            stream["chunks"].append(data)
+            stream["bytes"] += len(data)
+            stream["touched"] = time.monotonic()
+            return stream["bytes"]
+
+    def close_stream(self, stream_id):
+        with self._streams_lock:
+            stream = self._streams.pop(stream_id, None)
+        if stream is None:
+            raise NotFound(f"Unknown stream: {stream_id}")
+        return decode_audio(b"".join(stream["chunks"]), stream["format"])
+
+    def _drop_stale_streams(self):
+        now = time.monotonic()
+        with self._streams_lock:
+            for stream_id in [k for k, v in self._streams.items() if now - v["touched"] > STREAM_TTL_SEC]:
+                del self._streams[stream_id]
+
+
+def parse_audio_format(query, content_type=""):
+    """Read the upload format from query parameters, falling back to the Content-Type"""
+    audio_format = query.get("format")
+    if not audio_format:
+        audio_format = "wav" if "wav" in content_type else "pcm_s16le"
+    if audio_format not in ("wav", "pcm_s16le", "pcm_f32le"):
+        raise BadRequest(f"Unsupported audio format: {audio_format}")
+    try:
+        sample_rate = int(query.get("sample_rate", WHISPER_SAMPLE_RATE))
+        channels = int(query.get("channels", 1))
+    except ValueError:
+        raise BadRequest("sample_rate and channels must be integers")
+    return {"format": audio_format, "sample_rate": sample_rate, "channels": channels}
+
+
+def decode_audio(data, audio_format):
+    if not data:
+        raise BadRequest("Empty audio body")
+    try:
+        if audio_format["format"] == "wav":
+            return decode_wav(data)
+        dtype = "float32" if audio_format["format"] == "pcm_f32le" else "int16"
+        return decode_pcm(data, audio_format["sample_rate"], audio_format["channels"], dtype)
+    except BadRequest:
+        raise
+    except Exception as e:
+        raise BadRequest(f"Unable to decode audio: {e}")
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """HTTP routes of the voice-to-prompt service"""
+
+    service: VoicePromptService = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        # Whatever happens below, the body is no longer left unread on the connection
+        self._body_read = True
+        limit = self.service.max_upload_bytes
+        if "chunked" in self.headers.get("Transfer-Encoding", "").lower():
+            chunks, total = [], 0
+            while True:
+                try:
+                    size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                except ValueError:
+                    self.close_connection = True
+                    raise BadRequest("Invalid chunk size")
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                total += size
+                if total > limit:
+                    self.close_connection = True
+                    raise PayloadTooLarge(f"Body exceeds {limit} bytes")
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b"".join(chunks)
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+        except ValueError:
+            self.close_connection = True
+            raise BadRequest("Invalid Content-Length")
+        if length > limit:
+            self.close_connection = True
+            raise PayloadTooLarge(f"Body exceeds {limit} bytes")
+        return self.rfile.read(length) if length > 0 else b""
+
+    def _discard_body(self):
+        """Consume a body the route did not read, so keep-alive does not parse it as the next request"""
+        if self._body_read:
+            return
+        try:
+            self._read_body()
+        except (BadRequest, PayloadTooLarge):
+            pass
+
+    def _read_json(self):
+        body = self._read_body()
+        try:
+            request = json.loads(body or b"{}")
+        except ValueError:
+            raise BadRequest("Body must be JSON")
+        if not isinstance(request, dict):
+            raise BadRequest("Body must be a JSON object")
+        return request
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _dispatch(self, method):
+        url = urlparse(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+        endpoint = "/".join(parts[:2] + (["*"] + parts[3:] if len(parts) > 2 else []))
+        start = time.perf_counter()
+        status = 200
+        self._body_read = False
+        try:
+            payload = self._route(method, parts, query)
+        except BadRequest as e:
+            status, payload = 400, {"error": str(e)}
+        except NotFound as e:
+            status, payload = 404, {"error": str(e)}
+        except PayloadTooLarge as e:
+            status, payload = 413, {"error": str(e)}
+        except QueueFullError as e:
+            status, payload = 503, {"error": str(e)}
+        except (TimeoutError, FutureTimeoutError):
+            status, payload = 504, {"error": "Request timed out"}
+        except Exception as e:
+            status, payload = 500, {"error": str(e)}
+        elapsed = time.perf_counter() - start
+        if method == "POST" and status == 200:
+            payload.setdefault("timings", {})["total_ms"] = round(elapsed * 1000, 1)
+        metrics.incr("service.requests", endpoint=endpoint, status=status)
+        metrics.observe("service.latency", elapsed, endpoint=endpoint)
+        self._discard_body()
+        self._send_json(status, payload)
+
+    def _route(self, method, parts, query):
+        service = self.service
+        if method == "GET" and parts == ["v1", "health"]:
+            return {
+                "status": "ok",
+                "llm": bool(service.llm_manager.prompt_optimizer),
+                "queues": {"transcribe": service.transcribe_queue.qsize(), "optimize": service.optimize_queue.qsize()},
+            }
+        if method == "GET" and parts == ["v1", "metrics"]:
+            return metrics.snapshot()
+        if method != "POST":
+            raise NotFound(f"Not found: {method} {self.path}")
+        if parts == ["v1", "transcribe"]:
+            audio = decode_audio(self._read_body(), parse_audio_format(query, self.headers.get("Content-Type", "")))
+            return service.transcribe(audio, query.get("user"))
+        if parts == ["v1", "optimize"]:
+            request = self._read_json()
+            if not request.get("transcript"):
+                raise BadRequest("Missing 'transcript'")
+            result = service.optimize(request["transcript"], request.get("task_type"),
+                                      request.get("level", "default"), request.get("language"))
+            return dict(result)
+        if parts == ["v1", "transcribe_optimize"]:
+            audio = decode_audio(self._read_body(), parse_audio_format(query, self.headers.get("Content-Type", "")))
+            return service.transcribe_optimize(audio, query.get("task_type"), query.get("level", "default"),
+                                               query.get("user"))
+        if parts == ["v1", "streams"]:
+            self._read_body()
+            return {"stream_id": service.open_stream(parse_audio_format(query))}
+        if len(parts) == 4 and parts[:2] == ["v1", "streams"] and parts[3] == "chunks":
+            return {"stream_id": parts[2], "bytes": service.append_stream(parts[2], self._read_body())}
+        if len(parts) == 4 and parts[:2] == ["v1", "streams"] and parts[3] == "finish":
+            self._read_body()
+            audio = service.close_stream(parts[2])
+            if query.get("optimize", "1") in ("1", "true", "yes"):
+                return service.transcribe_optimize(audio, query.get("task_type"), query.get("level", "default"),
+                                                   query.get("user"))
+            return service.transcribe(audio, query.get("user"))
+        raise NotFound(f"Not found: {method} {self.path}")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Talkie-Codie local voice-to-prompt service")
+    parser.add_argument("--host", default="127.0.0.1", help="Bind address (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Port (default 8765)")
+    parser.add_argument("--llm-config", default="config/llm_config.json", help="LLM config file")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Maximum requests per micro-batch")
+    parser.add_argument("--max-wait-ms", type=float, default=20, help="Maximum time to wait for a micro-batch to fill")
+    parser.add_argument("--max-queue", type=int, default=64, help="Maximum queued requests per stage before answering 503")
+    parser.add_argument("--optimize-workers", type=int, default=4, help="LLM batches in flight at the same time")
+    parser.add_argument("--max-upload-mb", type=int, default=MAX_UPLOAD_MB, help="Largest request body or streamed upload before answering 413")
+    parser.add_argument("--no-warmup", action="store_true", help="Load the Whisper model on the first request")
+    args = parser.parse_args()
+
+    service = VoicePromptService(args.llm_config, args.max_batch_size, args.max_wait_ms, args.max_queue,
+                                 optimize_workers=args.optimize_workers, max_upload_bytes=args.max_upload_mb << 20)
+    if not args.no_warmup:
+        try:
+            service.warm_up()
+        except Exception as e:
+            print(f"Failed to preload Whisper model, will retry on first request: {e}")
+    ServiceHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), ServiceHandler)
+    print(f"Talkie-Codie service listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
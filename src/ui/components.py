@@ -6,14 +6,23 @@ from PyQt6.QtGui import QPainter, QColor, QPen, QBrush
 import sounddevice as sd
 import numpy as np
 import threading
+import queue
 import tempfile
 import scipy.io.wavfile as wavfile
-from src.audio.whisper_transcriber import transcribe_audio
+from src.audio.capture import AudioCapture
+from src.audio import listener as hands_free
+from src.audio.metering import LevelMeter
+from src.audio.pcm import to_model_input, WHISPER_SAMPLE_RATE
+from src.audio.whisper_config import load_whisper_config
+from src.audio import worker as asr_worker
 from src.llm.manager import LLMManager
+from src.llm.normalize import normalize_output
+from src.metrics import metrics
 from src.ui.settings_dialog import SettingsDialog
 import json
 import re
 import datetime
+import time
 import os
 
 RECORD_DURATION_MS = 60000  # 60秒
@@ -34,76 +43,45 @@ def get_selected_device():
     except Exception:
         return None
 
-def clean_rephrase_tags(text):
-    """清理REPHRASE标签，提取标签内的内容，忽略标签外的说明文字"""
-    import re
-    
-    # 首先尝试提取<REPHRASE>和</REPHRASE>之间的内容
-    rephrase_pattern = r'<REPHRASE[^>]*>(.*?)</REPHRASE>'
-    match = re.search(rephrase_pattern, text, flags=re.IGNORECASE | re.DOTALL)
-    
-    if match:
-        # 找到完整的REPHRASE标签，提取其中的内容
-        content = match.group(1).strip()
-        return content
-    
-    # 如果没有找到完整的标签，尝试提取不完整的标签内容
-    # 移除所有REPHRASE相关标签
-    text = re.sub(r'</?REPHRASE>', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'</?REP[^>]*>', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'</?REPHRASE?[^>]*$', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'^</?REPHRASE?[^>]*', '', text, flags=re.IGNORECASE)
-    text = re.sub(r'</?REP[^>]*', '', text, flags=re.IGNORECASE)
-    
-    # 移除行首行尾的空白字符
-    text = text.strip()
-    
-    # 如果文本为空或只包含空白字符，返回空字符串
-    if not text or text.isspace():
-        return ""
-    
-    return text
-
 class VolumeWaveformWidget(QWidget):
+    PHASE_SPEED = 6.0  # 正弦波相位每秒前进的弧度
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
         self.setFixedHeight(36)
         self.setMinimumWidth(120)
-        self.amplitude = 0.0
-        self._display_amplitude = 0.0
+        self._display_amplitude = 0.01
         self.phase = 0.0
-        self.timer = QTimer(self)
-        self.timer.setInterval(30)
-        self.timer.timeout.connect(self._on_timer)
+        self._last_level_time = None
+        self.repaints = 0
         self.setVisible(False)
         self._color = QColor(76, 175, 80)  # 初始绿色
         self._display_color = QColor(76, 175, 80)
 
     def start(self):
+        self._last_level_time = None
         self.setVisible(True)
-        self.timer.start()
 
     def stop(self):
         self.setVisible(False)
-        self.timer.stop()
 
-    def set_amplitude(self, amp):
-        self.amplitude = max(0.01, min(amp, 1.0))
-
-    def _on_timer(self):
-        # 平滑过渡振幅
-        alpha = 0.18  # 越小越平滑
-        self._display_amplitude += (self.amplitude - self._display_amplitude) * alpha
-        # 平滑过渡颜色
+    def set_level(self, envelope):
+        """设置已平滑的振幅（0-1）并请求一次重绘；由音量变化驱动，无需定时器"""
+        now = time.monotonic()
+        if self._last_level_time is not None:
+            self.phase += self.PHASE_SPEED * min(now - self._last_level_time, 0.1)
+        self._last_level_time = now
+        self._display_amplitude = max(0.01, min(envelope, 1.0))
+        # 振幅越大颜色越红
         r = int(76 + (244 - 76) * self._display_amplitude)
         g = int(175 + (67 - 175) * self._display_amplitude)
         b = int(80 + (54 - 80) * self._display_amplitude)
         self._display_color = QColor(r, g, b)
-        self.phase += 0.18
         self.update()
 
     def paintEvent(self, event):
+        self.repaints += 1
         painter = QPainter(self)
         painter.setRenderHint(QPainter.RenderHint.Antialiasing)
         w = self.width()
@@ -135,26 +113,37 @@ class PromptTextEdit(QTextEdit):
 
 class MainWidget(QWidget):
     prompt_ready = pyqtSignal(str)  # 新增信号
+    auto_stop_requested = pyqtSignal()  # 采集线程检测到静音超时，排队到 GUI 线程停止录音
+    level_changed = pyqtSignal()  # 有新的音量包络待显示（多次变化合并为一次）
 
     def __init__(self):
         super().__init__()
         self.init_ui()
         # 录音相关
         self.is_recording = False
-        self.stream = None
-        self.volume_level = 0
-        self.timer = QTimer()
-        self.timer.setInterval(50)  # 20fps 刷新音量
-        self.timer.timeout.connect(self.update_volume_bar)
+        # 音量包络在采集线程计算，变化明显时才通知 GUI 线程重绘一次
+        self.level_meter = LevelMeter(notify=self.level_changed.emit)
+        self.level_changed.connect(self._apply_level)
         self.record_btn.clicked.connect(self.start_recording)
-        # 新增：高质量录音相关
-        self.rec_thread = None
-        self.rec_stop_flag = threading.Event()
+        # 录音采集（回调只写环形缓冲区，计量和静音检测在采集线程）
+        self.capture = None
         self.high_quality_audio = None
-        self.silence_duration_ms = 0
         self.silence_threshold = 0.01  # 音量阈值
         self.silence_max_ms = self._load_silence_max_ms()  # 静音超过N毫秒自动停止
-        self.last_callback_time = None
+        self.auto_stop_requested.connect(self.stop_recording)
+        # 免手动模式：输入流常开，VAD 切出的每句话排队，由一个线程依次转录和改写
+        self.listener = None
+        self.utterance_queue = queue.Queue()
+        self._utterance_thread = None
+        self.last_prompt = ''
+        self.handsfree_btn.toggled.connect(self.toggle_hands_free)
+        # Whisper 在独立进程中解码，不和界面线程、音频回调争用 GIL；进程崩溃也不会带走整个应用
+        worker_settings = asr_worker.settings(load_whisper_config())
+        self.asr_worker = None
+        if worker_settings["enabled"]:
+            self.asr_worker = asr_worker.ASRWorker(worker_settings["slots"], worker_settings["slot_seconds"],
+                                                   worker_settings["hang_timeout"])
+            self.asr_worker.start()
         # LLM 管理器
         self.llm_manager = LLMManager()
         # 信号连接
@@ -247,6 +236,14 @@ class MainWidget(QWidget):
         self.record_btn.setStyleSheet('font-size: 16px;')
         btn_layout.addWidget(self.record_btn, alignment=Qt.AlignmentFlag.AlignLeft)
 
+        # 免手动模式开关：说完一句自动转录，无需点击
+        self.handsfree_btn = QPushButton('🎧 Hands-free')
+        self.handsfree_btn.setCheckable(True)
+        self.handsfree_btn.setToolTip('持续监听，每句话说完后自动转录和改写')
+        self.handsfree_btn.setFixedHeight(40)
+        self.handsfree_btn.setStyleSheet('font-size: 16px;')
+        btn_layout.addWidget(self.handsfree_btn, alignment=Qt.AlignmentFlag.AlignLeft)
+
         btn_layout.addStretch(1)
 
         # 右侧：设置按钮
@@ -263,108 +260,149 @@ class MainWidget(QWidget):
         if self.is_recording:
             return
         self.is_recording = True
+        self.handsfree_btn.setEnabled(False)
         self.record_btn.setText('■ Stop Recording')
         self.record_btn.setEnabled(True)
         self.record_btn.clicked.disconnect()
         self.record_btn.clicked.connect(self.stop_recording)
-        self.volume_level = 0
-        self.timer.start()
+        self.level_meter.reset()
         self.waveform.start()  # 显示波形
-        self.silence_duration_ms = 0
-        self.last_callback_time = None
-        self.rec_stop_flag.clear()
         self.high_quality_audio = None
-        self.recording_start_time = datetime.datetime.now()  # 记录录音开始时间
-        self.recording_stop_time = None  # 录音终止时间
-        # 启动 InputStream 线程（只做音量/静音检测）
-        threading.Thread(target=self._monitor_stream, daemon=True).start()
-        # 启动高质量录音线程
-        self.rec_thread = threading.Thread(target=self._record_high_quality, daemon=True)
-        self.rec_thread.start()
+        # 单个输入流同时负责录音、音量和静音检测
+        self.capture = AudioCapture(
+            SAMPLE_RATE, CHANNELS, device=get_selected_device(), max_seconds=RECORD_DURATION_MS / 1000,
+            silence_threshold=self.silence_threshold, silence_max_ms=self.silence_max_ms,
+            on_silence=self.auto_stop_requested.emit, meter=self.level_meter
+        )
+        try:
+            self.capture.start()
+        except Exception as e:
+            self.capture = None
+            self.stop_recording()
+            self.update_prompt_box(f'Failed to open input device: {e}')
+            return
         # 60秒后自动停止
         self._auto_stop_timer = QTimer(self)
         self._auto_stop_timer.setSingleShot(True)
         self._auto_stop_timer.timeout.connect(self.stop_recording)
         self._auto_stop_timer.start(RECORD_DURATION_MS)
 
-    def _monitor_stream(self):
-        device_id = get_selected_device()
-        def callback(indata, frames, time, status):
-            # 只做音量和静音检测
-            vol = float(np.sqrt(np.mean(indata**2)))
-            self.volume_level = vol
-            now = datetime.datetime.now()
-            if self.last_callback_time is None:
-                self.last_callback_time = now
-            # 静音检测
-            if vol < self.silence_threshold:
-                delta = (now - self.last_callback_time).total_seconds() * 1000
-                self.silence_duration_ms += delta
-            else:
-                self.silence_duration_ms = 0
-            self.last_callback_time = now
-            # 静音超时自动停止
-            if self.silence_max_ms <= 0:
-                # 不要grace period，首次静音立即停止
-                if vol < self.silence_threshold:
-                    QTimer.singleShot(0, self.stop_recording)
-            else:
-                if self.silence_duration_ms >= self.silence_max_ms:
-                    QTimer.singleShot(0, self.stop_recording)
-        self.stream = sd.InputStream(
-            channels=CHANNELS, samplerate=SAMPLE_RATE, dtype=DTYPE, callback=callback,
-            device=device_id
-        )
-        with self.stream:
-            while self.is_recording and not self.rec_stop_flag.is_set():
-                sd.sleep(50)  # 50ms 检查一次
-
-    def _record_high_quality(self):
-        device_id = get_selected_device()
-        duration_sec = RECORD_DURATION_MS / 1000
-        self.high_quality_audio = sd.rec(int(duration_sec * SAMPLE_RATE), samplerate=SAMPLE_RATE, channels=CHANNELS, dtype=DTYPE, device=device_id)
-        # 等待录音结束或被 stop_recording 提前终止
-        elapsed = 0
-        interval = 0.05
-        while self.is_recording and not self.rec_stop_flag.is_set() and elapsed < duration_sec:
-            sd.sleep(int(interval * 1000))
-            elapsed += interval
-        sd.stop()
+    def _apply_level(self):
+        # GUI 线程：取最新的音量包络，一次重绘
+        level = self.level_meter.consume()
+        if level is not None and (self.is_recording or self.listener is not None):
+            self.waveform.set_level(level['envelope'])
 
     def stop_recording(self):
         if not self.is_recording:
             return
         self.is_recording = False
-        self.rec_stop_flag.set()
-        self.recording_stop_time = datetime.datetime.now()  # 记录录音终止时间
         if self._auto_stop_timer:
             self._auto_stop_timer.stop()
             self._auto_stop_timer = None
         self.record_btn.setText('🎤 Start Recording')
         self.record_btn.setEnabled(True)
+        self.handsfree_btn.setEnabled(True)
         self.record_btn.clicked.disconnect()
         self.record_btn.clicked.connect(self.start_recording)
-        self.timer.stop()
-        self.volume_level = 0
         self.waveform.stop()  # 隐藏波形
-        self.update_volume_bar()
-        # 等待高质量录音线程结束
-        if self.rec_thread is not None:
-            self.rec_thread.join(timeout=1)
+        if self.capture is None:
+            return
+        # 停止采集并取出实际录到的音频
+        self.high_quality_audio = self.capture.stop()
+        stats = self.capture.stats()
+        if stats['input_overflows'] or stats['dropped_frames']:
+            print(f"Audio capture: {stats['input_overflows']} overflows, {stats['dropped_frames']} dropped frames")
+        metrics.incr('ui.level_updates', self.level_meter.published)
+        metrics.incr('ui.waveform_repaints', self.waveform.repaints)
+        self.waveform.repaints = 0
+        self.capture = None
         threading.Thread(target=self.process_audio_to_prompt, daemon=True).start()
 
-    def process_audio_to_prompt(self):
+    def toggle_hands_free(self, checked):
+        if checked:
+            self.start_hands_free()
+        else:
+            self.stop_hands_free()
+
+    def start_hands_free(self):
+        if self.listener is not None or self.is_recording:
+            return
+        config = hands_free.settings(load_whisper_config())
+        # 16 kHz 采集，句子切出后无需重采样即可送入 Whisper
+        self.listener = hands_free.HandsFreeListener(
+            WHISPER_SAMPLE_RATE, device=get_selected_device(), on_utterance=self._on_utterance,
+            meter=self.level_meter, **config
+        )
+        try:
+            self.listener.start()
+        except Exception as e:
+            self.listener = None
+            self.handsfree_btn.setChecked(False)
+            self.update_prompt_box(f'Failed to open input device: {e}')
+            return
+        # 每次开启用新队列，上一轮未处理完的句子由旧线程收尾
+        self.utterance_queue = queue.Queue()
+        self._utterance_thread = threading.Thread(target=self._process_utterances, args=(self.utterance_queue,),
+                                                  daemon=True)
+        self._utterance_thread.start()
+        self.record_btn.setEnabled(False)
+        self.level_meter.reset()
+        self.waveform.start()
+        self.update_prompt_box('Listening... speak, each pause sends the sentence')
+
+    def stop_hands_free(self):
+        if self.listener is None:
+            return
+        stats = self.listener.stop()
+        self.listener = None
+        # 已排队的句子照常处理完，之后线程退出
+        self.utterance_queue.put(None)
+        self._utterance_thread = None
+        self.record_btn.setEnabled(True)
+        self.waveform.stop()
+        if stats['cpu_percent'] is not None:
+            print(f"Hands-free: {stats['utterances']} utterances, {stats['cpu_percent']:.1f}% CPU on average, "
+                  f"{stats['input_overflows']} overflows, {stats['dropped_frames']} dropped frames")
+        metrics.incr('ui.level_updates', self.level_meter.published)
+        metrics.incr('ui.waveform_repaints', self.waveform.repaints)
+        self.waveform.repaints = 0
+        if self.handsfree_btn.isChecked():
+            self.handsfree_btn.setChecked(False)
+
+    def _on_utterance(self, audio, info):
+        # 采集线程：只入队，转录在处理线程进行
+        self.utterance_queue.put((audio, info))
+        metrics.observe('handsfree.queue_depth', self.utterance_queue.qsize())
+
+    def _process_utterances(self, utterances):
+        while True:
+            item = utterances.get()
+            if item is None:
+                return
+            audio, info = item
+            self.process_audio_to_prompt(audio, WHISPER_SAMPLE_RATE, speech_end=info['speech_end'])
+
+    def _status(self, text):
+        # 免手动模式下在状态文本后显示排队的句子数
+        pending = self.utterance_queue.qsize()
+        return f'{text} ({pending} queued)' if self.listener is not None and pending else text
+
+    def process_audio_to_prompt(self, audio=None, sample_rate=SAMPLE_RATE, speech_end=None):
+        """
+        转录一段录音并改写为 prompt
+
+        Args:
+            audio: 单声道录音，None 时使用手动录音的 high_quality_audio
+            sample_rate: audio 的采样率
+            speech_end: 免手动模式下说话结束的 time.monotonic()，用于统计说完到出结果的延迟
+        """
         # 用高质量录音数据
-        if self.high_quality_audio is None:
+        if audio is None:
+            audio = self.high_quality_audio
+        if audio is None:
             self.update_prompt_box('No audio data detected.')
             return
-        audio = self.high_quality_audio
-        # 裁剪音频到实际录音时长
-        if self.recording_start_time and self.recording_stop_time:
-            duration_sec = (self.recording_stop_time - self.recording_start_time).total_seconds()
-            max_samples = int(duration_sec * SAMPLE_RATE)
-            if max_samples < len(audio):
-                audio = audio[:max_samples]
         # 音频质量检查
         if len(audio) == 0:
             self.update_prompt_box('No audio data detected.')
@@ -383,33 +421,60 @@ class MainWidget(QWidget):
         audio_path = os.path.join(audio_dir, f'audio_{ts}.wav')
         # 转换为int16格式保存（Whisper兼容）
         audio_int16 = (audio * 32767).astype(np.int16)
-        wavfile.write(audio_path, SAMPLE_RATE, audio_int16)
+        wavfile.write(audio_path, sample_rate, audio_int16)
         # Whisper 语音转文本
         try:
-            self.update_prompt_box('Transcribing audio...')
-            transcript, detected_language = transcribe_audio(audio_path)
+            self.update_prompt_box(self._status('Transcribing audio...'))
+            # 直接转录内存中的音频，句间长停顿会在解码前被压缩
+            model_input = to_model_input(audio, sample_rate)
+            if self.asr_worker is not None:
+                stream = self.asr_worker.stream(model_input)
+            else:
+                # 只有关闭工作进程时才在界面进程里加载 faster-whisper / CTranslate2
+                from src.audio.whisper_transcriber import stream_transcription
+                stream = stream_transcription(model_input)
+            for segment in stream:
+                if not segment['text']:
+                    continue
+                # 边解码边显示，并用已完成的片段提前发起改写
+                self.update_prompt_box(self._status(f'Transcribing audio... {stream.partial_text()}'))
+                self.llm_manager.speculate(stream.partial_text(), language=stream.language)
+            transcript, detected_language = stream.text(), stream.language
+            if speech_end is not None and not transcript.strip():
+                # 免手动模式下的咳嗽、键盘声等没有转录出文字：不改写，恢复上一条结果
+                self.llm_manager.cancel_speculation()
+                self.update_prompt_box(self.last_prompt or 'Listening...')
+                return
+            if speech_end is not None:
+                metrics.observe('handsfree.wake_to_text_ms', (time.monotonic() - speech_end) * 1000)
             # 保存转录文本
             transcript_path = os.path.join(transcript_dir, f'transcript_{ts}.txt')
             with open(transcript_path, 'w', encoding='utf-8') as f:
                 f.write(transcript)
         except Exception as e:
+            self.llm_manager.cancel_speculation()
             self.update_prompt_box(f'Transcription failed: {e}')
             return
         
-        # LLM 改写 prompt
+        # LLM 改写 prompt（复用推测结果）
         try:
-            self.update_prompt_box('Rephrasing prompt...')
-            result = self.llm_manager.optimize_prompt(transcript, language=detected_language)
+            self.update_prompt_box(self._status('Rephrasing prompt...'))
+            result = self.llm_manager.resolve_speculation(transcript, language=detected_language)
             if isinstance(result, tuple):
                 prompt = result[0]
             else:
                 prompt = result
+            self.last_prompt = prompt
             self.update_prompt_box(prompt)
+            if speech_end is not None:
+                latency = (time.monotonic() - speech_end) * 1000
+                metrics.observe('handsfree.wake_to_prompt_ms', latency)
+                print(f"Hands-free: prompt ready {latency:.0f} ms after speech ended")
         except Exception as e:
             self.update_prompt_box(f'AI rephrase failed: {e}')
 
     def update_prompt_box(self, text):
-        text = clean_rephrase_tags(text)
+        text = normalize_output(text)
         self._reset_copy_btn()  # 新文本时重置按钮
         self.prompt_ready.emit(text)
 
@@ -429,15 +494,15 @@ class MainWidget(QWidget):
             }
         ''')
 
-    def update_volume_bar(self):
-        # 控制波形显示/隐藏和动画
-        if self.is_recording:
-            self.waveform.set_amplitude(min(self.volume_level * 8, 1.0))
-            if not self.waveform.isVisible():
-                self.waveform.start()
-        else:
-            self.waveform.stop()
-        # 保留原有音量条逻辑（可移除）
+    def shutdown(self):
+        """窗口关闭时停止录音、免手动监听和 Whisper 工作进程"""
+        self.stop_hands_free()
+        if self.capture is not None:
+            self.capture.stop()
+            self.capture = None
+        if self.asr_worker is not None:
+            self.asr_worker.stop()
+            self.asr_worker = None
 
     def open_settings(self):
         dlg = SettingsDialog(self)
@@ -449,6 +514,10 @@ class MainWidget(QWidget):
         """重新加载所有配置"""
         # 重新加载LLM管理器配置
         self.llm_manager.reload_config()
+        if self.asr_worker is not None and self.asr_worker.load_error is not None:
+            # 模型加载失败后工作进程不再自动重启，设置修改后再试一次
+            self.asr_worker.stop()
+            self.asr_worker.start()
         print("所有配置已重新加载")
 
     def copy_prompt_text(self):
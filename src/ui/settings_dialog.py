@@ -3,45 +3,31 @@ from PyQt6.QtCore import QThread, pyqtSignal
 from PyQt6.QtCore import Qt
 import json
 import os
-import sounddevice as sd
-from src.llm.manager import LLMManager
+from src.audio.capabilities import capability_probe
+from src.audio import model_store
+from src.llm.health import health_checker
 
 class APITestThread(QThread):
     """API connection test thread"""
     test_completed = pyqtSignal(bool, str)  # success status, error message
     
-    def __init__(self, provider_type, api_key):
+    def __init__(self, provider_type, provider_config):
         super().__init__()
         self.provider_type = provider_type
-        self.api_key = api_key
+        self.provider_config = provider_config
     
     def run(self):
-        try:
-            # Create temporary config for testing
-            temp_config = {
-                "default_provider": self.provider_type,
-                "providers": {
-                    self.provider_type: {
-                        "api_key": self.api_key
-                    }
-                }
-            }
-            
-            # Create temporary LLM manager for testing
-            llm_manager = LLMManager()
-            llm_manager.config = temp_config
-            llm_manager._initialize_provider()
-            
-            # Test connection
-            if llm_manager.test_connection():
-                self.test_completed.emit(True, "")
-            else:
-                self.test_completed.emit(False, "Connection test failed, please check API key and network connection")
-                
-        except Exception as e:
-            self.test_completed.emit(False, f"Connection test error: {str(e)}")
+        # Cheap health check (model listing / 1-token request, short timeouts), reused within its TTL
+        status = health_checker.check(self.provider_type, self.provider_config)
+        if status["ok"]:
+            self.test_completed.emit(True, "")
+        else:
+            self.test_completed.emit(False, status["error"] or "Connection test failed, please check API key and network connection")
 
 class SettingsDialog(QDialog):
+    capabilities_changed = pyqtSignal(dict)  # Background probe found different hardware/devices
+    health_updated = pyqtSignal(dict)  # A provider health check finished
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setWindowTitle('Settings')
@@ -49,20 +35,68 @@ class SettingsDialog(QDialog):
         self.llm_config_path = os.path.join('config', 'llm_config.json')
         self.whisper_config_path = os.path.join('config', 'whisper_config.json')
         self.api_test_thread = None
+        # Stored probe results open the dialog instantly; a background probe catches changes
+        self.capabilities = capability_probe.get()
         self.init_ui()
         self.load_config()
+        self.capabilities_changed.connect(self.apply_capabilities)
+        capability_probe.refresh(on_change=self.capabilities_changed.emit)
+        # Live provider status, all configured providers are checked concurrently
+        self.provider_health = {}
+        self.health_updated.connect(self.on_health_updated)
+        self.model_combo.currentTextChanged.connect(self.on_provider_changed)
+        self.api_key_edit.editingFinished.connect(self.check_current_provider)
+        self.refresh_provider_health()
 
     def get_infer_devices(self):
-        devices = ['cpu']
-        try:
-            import torch
-            if torch.cuda.is_available():
-                devices.append('cuda')
-            if hasattr(torch.backends, 'mps') and torch.backends.mps.is_available():
-                devices.append('mps')
-        except Exception:
-            pass
-        return devices
+        return list(self.capabilities['compute_types']) or ['cpu']
+
+    def add_stored_models(self, store_settings):
+        """Offer converted/imported models from the local model store, with their measured RTF/WER"""
+        for name, entry in sorted(model_store.ModelStore(store_settings["directory"]).models().items()):
+            index = self.model_size_combo.findText(name)
+            if index < 0:
+                self.model_size_combo.addItem(name)
+                index = self.model_size_combo.count() - 1
+            evaluation = entry.get("evaluation")
+            if evaluation:
+                self.model_size_combo.setItemData(
+                    index, f"RTF {evaluation['rtf']:.3f}, WER {evaluation['wer']:.1%} ({evaluation['compute_type']})",
+                    Qt.ItemDataRole.ToolTipRole
+                )
+
+    def update_compute_types(self, device=None, preferred=None):
+        """Offer only the compute types the backend supports natively on the device"""
+        device = device or self.infer_device_combo.currentText()
+        current = preferred or self.compute_type_combo.currentText()
+        supported = self.capabilities['compute_types'].get(device) or ['int8', 'float32']
+        self.compute_type_combo.blockSignals(True)
+        self.compute_type_combo.clear()
+        self.compute_type_combo.addItems(supported)
+        if current in supported:
+            self.compute_type_combo.setCurrentText(current)
+        else:
+            self.compute_type_combo.setCurrentText(capability_probe.recommended_compute_type(device))
+        self.compute_type_combo.blockSignals(False)
+
+    def apply_capabilities(self, capabilities):
+        """Refresh device lists after a background probe, keeping the current selections"""
+        self.capabilities = capabilities
+        device = self.infer_device_combo.currentText()
+        input_device = self.device_combo.currentText()
+        self.infer_device_list = self.get_infer_devices()
+        self.infer_device_combo.blockSignals(True)
+        self.infer_device_combo.clear()
+        self.infer_device_combo.addItems(self.infer_device_list)
+        if device in self.infer_device_list:
+            self.infer_device_combo.setCurrentText(device)
+        self.infer_device_combo.blockSignals(False)
+        self.update_compute_types()
+        self.device_list = self.get_input_devices()
+        self.device_combo.clear()
+        self.device_combo.addItems(self.device_list)
+        if input_device in self.device_list:
+            self.device_combo.setCurrentText(input_device)
 
     def init_ui(self):
         layout = QVBoxLayout()
@@ -77,6 +111,9 @@ class SettingsDialog(QDialog):
         self.model_combo = QComboBox()
         self.model_combo.addItems(['openai', 'deepseek'])
         layout.addWidget(self.model_combo)
+        self.provider_status_label = QLabel()
+        self.provider_status_label.setStyleSheet('color: #888;')
+        layout.addWidget(self.provider_status_label)
 
         # Whisper inference device
         layout.addWidget(QLabel('Device'))
@@ -88,13 +125,15 @@ class SettingsDialog(QDialog):
         # Whisper compute type
         layout.addWidget(QLabel('Compute Type'))
         self.compute_type_combo = QComboBox()
-        self.compute_type_combo.addItems(['int8', 'int16', 'float16', 'float32'])
+        self.update_compute_types()
+        self.infer_device_combo.currentTextChanged.connect(self.update_compute_types)
         layout.addWidget(self.compute_type_combo)
 
         # Whisper parameters
         layout.addWidget(QLabel('Model Size'))
         self.model_size_combo = QComboBox()
         self.model_size_combo.addItems(['tiny', 'base', 'small', 'medium', 'large'])
+        self.add_stored_models(model_store.settings({}))
         layout.addWidget(self.model_size_combo)
 
         layout.addWidget(QLabel('Beam Size'))
@@ -120,16 +159,7 @@ class SettingsDialog(QDialog):
         self.setLayout(layout)
 
     def get_input_devices(self):
-        devices = []
-        for idx, dev in enumerate(sd.query_devices()):
-            if isinstance(dev, dict):
-                max_input = int(dev.get('max_input_channels', 0))
-                name = dev.get('name', str(idx))
-            else:
-                max_input = int(getattr(dev, 'max_input_channels', 0))
-                name = getattr(dev, 'name', str(idx))
-            if max_input > 0:
-                devices.append(f"{name} (id={idx})")
+        devices = self.capabilities.get('input_devices') or []
         return devices if devices else ['Default']
 
     def load_config(self):
@@ -151,9 +181,9 @@ class SettingsDialog(QDialog):
             device = whisper_cfg.get('device', 'cpu')
             if device in self.infer_device_list:
                 self.infer_device_combo.setCurrentText(device)
-            # Inference precision
-            compute_type = whisper_cfg.get('compute_type', 'int8')
-            self.compute_type_combo.setCurrentText(compute_type)
+            # Inference precision, unsupported types fall back to the recommended one
+            self.update_compute_types(preferred=whisper_cfg.get('compute_type', 'int8'))
+            self.add_stored_models(model_store.settings(whisper_cfg))
             self.model_size_combo.setCurrentText(whisper_cfg.get('model_size', 'base'))
             self.beam_size_spin.setValue(whisper_cfg.get('beam_size', 5))
             # Input device
@@ -161,6 +191,59 @@ class SettingsDialog(QDialog):
             if input_device and input_device in self.device_list:
                 self.device_combo.setCurrentText(input_device)
 
+    def _load_llm_config(self):
+        if not os.path.exists(self.llm_config_path):
+            return {}
+        try:
+            with open(self.llm_config_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _provider_config(self, provider_type, api_key=None):
+        """Stored provider config (base_url, model, ...) with the key entered in the dialog"""
+        config = dict(self._load_llm_config().get('providers', {}).get(provider_type, {}))
+        if api_key is not None:
+            config['api_key'] = api_key
+        return config
+
+    def refresh_provider_health(self):
+        providers = {name: self._provider_config(name) for name in self._load_llm_config().get('providers', {})}
+        current = self.model_combo.currentText()
+        providers[current] = self._provider_config(current, self.api_key_edit.text().strip())
+        self.provider_status_label.setText('Checking providers...')
+        health_checker.check_all(providers, self.health_updated.emit)
+
+    def check_current_provider(self):
+        provider = self.model_combo.currentText()
+        config = self._provider_config(provider, self.api_key_edit.text().strip())
+        self.provider_health.pop(provider, None)
+        self.show_provider_status()
+        health_checker.check_async(provider, config, self.health_updated.emit)
+
+    def on_provider_changed(self, provider):
+        if provider in self.provider_health:
+            self.show_provider_status()
+        else:
+            self.check_current_provider()
+
+    def on_health_updated(self, status):
+        self.provider_health[status['provider']] = status
+        self.show_provider_status()
+
+    def show_provider_status(self, *_):
+        status = self.provider_health.get(self.model_combo.currentText())
+        if status is None:
+            text, color = 'Checking...', '#888'
+        elif status['ok']:
+            text, color = f"● Connected ({status['latency_ms']:.0f} ms)", '#2e7d32'
+        elif not status['configured']:
+            text, color = '○ Not configured', '#888'
+        else:
+            text, color = f"● Unreachable: {status['error'][:80]}", '#c62828'
+        self.provider_status_label.setText(text)
+        self.provider_status_label.setStyleSheet(f'color: {color};')
+
     def test_api_connection(self, provider_type, api_key):
         """Test API connection"""
         if not api_key.strip():
@@ -173,7 +256,7 @@ class SettingsDialog(QDialog):
         progress.show()
         
         # Create and start test thread
-        self.api_test_thread = APITestThread(provider_type, api_key)
+        self.api_test_thread = APITestThread(provider_type, self._provider_config(provider_type, api_key))
         self.api_test_thread.test_completed.connect(self.on_api_test_completed)
         self.api_test_thread.test_completed.connect(progress.close)
         self.api_test_thread.start()
@@ -185,8 +268,12 @@ class SettingsDialog(QDialog):
         provider = self.model_combo.currentText()
         api_key = self.api_key_edit.text().strip()
         
-        # If API key exists, test connection first
+        # If API key exists, test connection first (a fresh cached check result is enough)
         if api_key:
+            status = health_checker.cached(provider, self._provider_config(provider, api_key))
+            if status is not None:
+                self.on_api_test_completed(status['ok'], status['error'], pending_save=True)
+                return
             self.save_btn.setEnabled(False)
             self.api_test_pending_save = True  # Mark waiting for save
             self.test_api_connection(provider, api_key)
@@ -225,14 +312,14 @@ class SettingsDialog(QDialog):
         QMessageBox.information(self, 'Info', 'Settings saved!')
         self.accept()
 
-    def on_api_test_completed(self, success, error_message):
+    def on_api_test_completed(self, success, error_message, pending_save=False):
         self.save_btn.setEnabled(True)
         if not success:
             QMessageBox.critical(self, 'API Connection Test Failed', 
                                f'Unable to connect to {self.model_combo.currentText()} API:\n{error_message}\n\nPlease check:\n1. API key is correct\n2. Network connection is normal\n3. API service is available')
             return False
         # Only save if test passes
-        if hasattr(self, 'api_test_pending_save') and self.api_test_pending_save:
+        if pending_save or getattr(self, 'api_test_pending_save', False):
             self.api_test_pending_save = False
             self._do_save_config()
         return True 
\ No newline at end of file
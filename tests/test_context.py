@@ -0,0 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.llm.context import SessionContext
+
+
+def failing_summary(text, max_length):
+    raise ConnectionError("provider unavailable")
+
+
+def test_failed_summary_keeps_turns_instead_of_truncated_transcript():
+    executor = ThreadPoolExecutor(max_workers=1)
+    context = SessionContext(failing_summary, executor, recent_turns=1)
+    context.record("first request", "First rephrase")
+    context.record("second request", "Second rephrase")
+    executor.shutdown(wait=True)
+    rendered = context.render()
+    assert "Summary:" not in rendered
+    assert "Earlier request: First rephrase" in rendered
+    assert "Earlier request: Second rephrase" in rendered
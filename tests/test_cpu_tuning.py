@@ -0,0 +1,21 @@
+from src.audio.cpu_tuning import plan_threads, resolve_affinity
+
+
+def topology(cores):
+    return {"logical": cores * 2, "physical": cores, "usable": cores,
+            "numa_nodes": [list(range(cores * 2))], "available": None}
+
+
+def test_small_machine_keeps_default_thread_count():
+    assert plan_threads({}, topology(4)) == (4, 1, None)
+    assert plan_threads({}, topology(2)) == (2, 1, None)
+
+
+def test_large_machine_reserves_cores():
+    assert plan_threads({}, topology(16)) == (14, 1, None)
+
+
+def test_invalid_affinity_disables_pinning():
+    assert resolve_affinity("0-3", topology(4)) is None
+    assert resolve_affinity([0, "x"], topology(4)) is None
+    assert resolve_affinity([0, 1], topology(4)) == [0, 1]
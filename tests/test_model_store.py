@@ -0,0 +1,42 @@
+import os
+import tarfile
+
+import pytest
+
+from src.audio import model_store
+
+
+def make_archive(tmp_path, arcname):
+    model = tmp_path / "model"
+    model.mkdir()
+    (model / "model.bin").write_bytes(b"weights")
+    (model / "config.json").write_text("{}")
+    archive = tmp_path / "model.tar"
+    with tarfile.open(archive, "w") as tf:
+        tf.add(model, arcname=arcname)
+    return archive
+
+
+@pytest.mark.parametrize("data_filter", [True, False])
+def test_extract_archive_with_root_member(tmp_path, monkeypatch, data_filter):
+    if not data_filter:
+        # Older Pythons without extraction filters go through the manual member check
+        monkeypatch.delattr(tarfile, "data_filter", raising=False)
+    elif not hasattr(tarfile, "data_filter"):
+        pytest.skip("tarfile has no extraction filters")
+    archive = make_archive(tmp_path, ".")
+    dest = tmp_path / "out"
+    dest.mkdir()
+    model_store._extract(str(archive), str(dest))
+    assert (dest / "model.bin").read_bytes() == b"weights"
+    assert (dest / "config.json").exists()
+
+
+def test_extract_rejects_member_outside_dest(tmp_path, monkeypatch):
+    monkeypatch.delattr(tarfile, "data_filter", raising=False)
+    archive = make_archive(tmp_path, "../escape")
+    dest = tmp_path / "out"
+    dest.mkdir()
+    with pytest.raises(ValueError):
+        model_store._extract(str(archive), str(dest))
+    assert not os.path.exists(tmp_path / "escape" / "model.bin")
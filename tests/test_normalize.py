@@ -0,0 +1,25 @@
+from src.llm.normalize import OutputNormalizer, normalize_output
+
+
+def streamed(text):
+    normalizer = OutputNormalizer()
+    for char in text:
+        normalizer.feed(char)
+    return normalizer.finish()
+
+
+def test_placeholder_inside_block_is_kept():
+    text = "<REPHRASE>\nClone <repo_url> and run tests\n</REPHRASE>"
+    assert normalize_output(text) == "Clone <repo_url> and run tests"
+    assert streamed(text) == "Clone <repo_url> and run tests"
+
+
+def test_unterminated_angle_bracket_does_not_swallow_closing_tag():
+    text = "<REPHRASE>\nSet x <replace me\n</REPHRASE> trailing note"
+    assert normalize_output(text) == "Set x <replace me"
+    assert streamed(text) == "Set x <replace me"
+
+
+def test_wrapper_fragments_removed_without_complete_block():
+    assert normalize_output("<REPHRASE>partial text <REPH") == "partial text"
+    assert normalize_output("<REPHRAS>abc</REPHRAS>") == "abc"